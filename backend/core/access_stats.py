@@ -0,0 +1,173 @@
+"""
+Estadísticas de acceso a entradas del baúl acumuladas en memoria.
+
+Leer una entrada no escribe en la base de datos: los accesos se agrupan por
+entrada y un hilo en segundo plano los vuelca periódicamente con un único
+bulk_update (access_count = access_count + n) para todas las entradas pendientes.
+"""
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, models
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class AccessStatsBuffer:
+    """
+    Buffer por proceso de accesos pendientes: item_id -> [accesos, último acceso].
+
+    Los contadores se suman con expresiones F, así que varios procesos pueden
+    volcar sus buffers sin pisarse. Si el volcado falla, los accesos vuelven al
+    buffer y se reintentan en el siguiente ciclo.
+    """
+
+    def __init__(self, flush_interval: float = None, max_pending: int = None,
+                 batch_size: int = 500):
+        self.flush_interval = flush_interval or getattr(settings, 'VAULT_ACCESS_FLUSH_INTERVAL', 30)
+        self.max_pending = max_pending or getattr(settings, 'VAULT_ACCESS_MAX_PENDING', 1000)
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'VAULT_ACCESS_STATS_BUFFER', True)
+
+    def record(self, item_id, when=None):
+        """
+        Registra un acceso a una entrada.
+
+        Args:
+            item_id: Identificador de la entrada
+            when (datetime, optional): Momento del acceso (por defecto ahora)
+
+        Returns:
+            datetime: Momento registrado
+        """
+        when = when or timezone.now()
+        if not self.enabled:
+            self._write({item_id: [1, when]})
+            return when
+
+        self._ensure_worker()
+        with self._lock:
+            entry = self._pending.get(item_id)
+            if entry is None:
+                self._pending[item_id] = [1, when]
+            else:
+                entry[0] += 1
+                if when > entry[1]:
+                    entry[1] = when
+            self.recorded += 1
+            full = len(self._pending) >= self.max_pending
+
+        # Demasiadas entradas distintas pendientes: se adelanta el volcado
+        if full:
+            self._wakeup.set()
+        return when
+
+    def pending(self, item_id) -> int:
+        """Accesos de una entrada que aún no se han volcado."""
+        with self._lock:
+            entry = self._pending.get(item_id)
+            return entry[0] if entry else 0
+
+    def flush(self) -> int:
+        """
+        Vuelca los accesos pendientes a la base de datos.
+
+        Returns:
+            int: Número de entradas actualizadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                self._write(pending)
+            except Exception as e:
+                self._restore(pending)
+                self.errors += 1
+                logger.error(f'Error flushing vault access stats: {str(e)}')
+                return 0
+
+            self.flushes += 1
+            self.flushed += len(pending)
+            return len(pending)
+
+    def _write(self, pending: dict):
+        """Un bulk_update con access_count = access_count + n por entrada."""
+        from .models import VaultItem
+
+        staged = []
+        for item_id, (count, last_accessed) in pending.items():
+            item = VaultItem(pk=item_id)
+            item.access_count = models.F('access_count') + count
+            item.last_accessed = last_accessed
+            staged.append(item)
+
+        # Las entradas borradas mientras tanto no coinciden con ninguna fila
+        VaultItem.objects.bulk_update(
+            staged, ['access_count', 'last_accessed'], batch_size=self.batch_size
+        )
+
+    def _restore(self, pending: dict):
+        """Devuelve al buffer los accesos de un volcado fallido."""
+        with self._lock:
+            for item_id, (count, last_accessed) in pending.items():
+                entry = self._pending.get(item_id)
+                if entry is None:
+                    self._pending[item_id] = [count, last_accessed]
+                else:
+                    entry[0] += count
+                    entry[1] = max(entry[1], last_accessed)
+
+    def _ensure_worker(self):
+        """Arranca el hilo de volcado la primera vez que se necesita."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='vault-access-stats', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def stats(self) -> dict:
+        """Contadores del buffer para monitoreo."""
+        with self._lock:
+            return {
+                'pending_items': len(self._pending),
+                'pending_accesses': sum(entry[0] for entry in self._pending.values()),
+                'recorded': self.recorded,
+                'flushed_items': self.flushed,
+                'flushes': self.flushes,
+                'errors': self.errors,
+            }
+
+
+access_stats = AccessStatsBuffer()
+
+# Los workers que se reciclan no pierden los accesos pendientes
+atexit.register(access_stats.flush)
@@ -0,0 +1,403 @@
+"""
+Particionado, retención y resúmenes diarios de la auditoría del baúl.
+
+En PostgreSQL la tabla de VaultActivity se particiona por rango mensual de
+timestamp: las particiones se crean por adelantado y la retención elimina
+particiones completas (DETACH + DROP) en lugar de borrar filas; las filas
+que caen en la partición por defecto se trasladan a la partición de su mes
+cuando ésta se crea, y las que superan la retención se borran. Antes de
+eliminar un mes se consolidan sus días en VaultActivityDaily, que es lo que
+consultan el centro de seguridad y el admin para periodos largos.
+
+En otros motores (SQLite en desarrollo) la retención borra por lotes.
+"""
+
+import logging
+import re
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import VaultActivity, VaultActivityDaily
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def partitioning_supported() -> bool:
+    """El particionado declarativo solo se usa con PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _local_midnight(value: date) -> datetime:
+    """Inicio del día en la zona horaria del proyecto, para alinear meses y días."""
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def _table() -> str:
+    return VaultActivity._meta.db_table
+
+
+def partition_name(month: date) -> str:
+    return f'{_table()}_p{month.year}{month.month:02d}'
+
+
+def is_partitioned() -> bool:
+    """True si la tabla de actividad ya es una tabla particionada."""
+    if not partitioning_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [_table()])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions() -> list:
+    """
+    Particiones mensuales existentes.
+
+    Returns:
+        list: Tuplas (primer día del mes, nombre de la partición) ordenadas
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.oid = to_regclass(%s)',
+            [_table()]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def default_partition_name() -> str:
+    return f'{_table()}_default'
+
+
+def _has_default_partition(cursor) -> bool:
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [default_partition_name()])
+    return cursor.fetchone()[0]
+
+
+def _create_partition(cursor, month: date):
+    """
+    Crea la partición de un mes.
+
+    Si existe la partición por defecto, se separa mientras se crea la nueva y
+    sus filas de ese mes se trasladan a ella (PostgreSQL rechaza crear una
+    partición cuyo rango ya tiene filas en la partición por defecto).
+    """
+    quote = connection.ops.quote_name
+    table = _table()
+    default = default_partition_name()
+    bounds = [_local_midnight(month), _local_midnight(_add_months(month, 1))]
+
+    with transaction.atomic():
+        has_default = _has_default_partition(cursor)
+        if has_default:
+            cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(default)}')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote(partition_name(month))} '
+            f'PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+        if has_default:
+            in_range = f'{quote("timestamp")} >= %s AND {quote("timestamp")} < %s'
+            cursor.execute(
+                f'INSERT INTO {quote(partition_name(month))} '
+                f'SELECT * FROM {quote(default)} WHERE {in_range}',
+                bounds
+            )
+            if cursor.rowcount:
+                logger.info(
+                    f'Moved {cursor.rowcount} rows from {default} to {partition_name(month)}'
+                )
+            cursor.execute(f'DELETE FROM {quote(default)} WHERE {in_range}', bounds)
+            cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(default)} DEFAULT')
+
+
+def ensure_partitions(months_ahead: int = None) -> list:
+    """
+    Crea las particiones del mes actual y de los siguientes meses.
+
+    Args:
+        months_ahead (int, optional): Meses a crear por adelantado
+            (VAULT_ACTIVITY_PARTITIONS_AHEAD)
+
+    Returns:
+        list: Nombres de las particiones creadas
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'VAULT_ACTIVITY_PARTITIONS_AHEAD', 3)
+
+    existing = {month for month, _ in list_partitions()}
+    current = _month_start(timezone.localdate())
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = _add_months(current, offset)
+            if month in existing:
+                continue
+            _create_partition(cursor, month)
+            created.append(partition_name(month))
+            logger.info(f'Created vault activity partition {partition_name(month)}')
+    return created
+
+
+@transaction.atomic
+def convert_to_partitioned(months_ahead: int = None) -> int:
+    """
+    Convierte la tabla de actividad creada por migrate en una tabla particionada.
+
+    Copia las filas existentes a particiones mensuales, añade la partición por
+    defecto (recoge filas fuera de rango) y recrea clave primaria (id, timestamp),
+    claves foráneas e índices del modelo. Bloquea la tabla durante la copia.
+
+    Returns:
+        int: Filas copiadas
+    """
+    if not partitioning_supported():
+        raise RuntimeError('Partitioning requires PostgreSQL')
+    if is_partitioned():
+        return 0
+
+    quote = connection.ops.quote_name
+    table = _table()
+    legacy = f'{table}_unpartitioned'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ({quote("timestamp")})'
+        )
+        cursor.execute(
+            f'CREATE TABLE {quote(default_partition_name())} PARTITION OF {quote(table)} DEFAULT'
+        )
+
+        # Particiones de los meses con datos y de los próximos meses
+        cursor.execute(f'SELECT min({quote("timestamp")}) FROM {quote(legacy)}')
+        oldest = cursor.fetchone()[0]
+        month = _month_start(timezone.localtime(oldest).date() if oldest else timezone.localdate())
+        last = _add_months(_month_start(timezone.localdate()), months_ahead or 0)
+        while month <= last:
+            _create_partition(cursor, month)
+            month = _add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}')
+        copied = cursor.rowcount
+        cursor.execute(f'DROP TABLE {quote(legacy)}')
+
+        # La clave primaria de una tabla particionada debe incluir la columna de partición
+        cursor.execute(
+            f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote("id")}, {quote("timestamp")})'
+        )
+        for field in ('user', 'vault_item'):
+            model_field = VaultActivity._meta.get_field(field)
+            target = model_field.related_model._meta
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ADD FOREIGN KEY ({quote(model_field.column)}) '
+                f'REFERENCES {quote(target.db_table)} ({quote(target.pk.column)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+
+    with connection.schema_editor(atomic=False) as editor:
+        for index in VaultActivity._meta.indexes:
+            editor.add_index(VaultActivity, index)
+
+    ensure_partitions(months_ahead)
+    logger.info(f'Converted {table} to monthly partitions ({copied} rows)')
+    return copied
+
+
+def rollup_activity(start: date, end: date = None) -> int:
+    """
+    Recalcula VaultActivityDaily para los días [start, end].
+
+    Es idempotente: los recuentos se sobrescriben, de modo que puede repetirse
+    para incluir eventos que llegaron tarde (escritor por lotes, spool).
+
+    Returns:
+        int: Filas de resumen escritas
+    """
+    end = end or start
+    counts = (
+        VaultActivity.objects
+        .filter(
+            timestamp__gte=_local_midnight(start),
+            timestamp__lt=_local_midnight(end + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate('timestamp'))
+        .order_by()
+        .values('user_id', 'day', 'action')
+        .annotate(total=Count('id'))
+    )
+    rows = [
+        VaultActivityDaily(
+            user_id=row['user_id'], day=row['day'], action=row['action'], count=row['total']
+        )
+        for row in counts
+    ]
+    if rows:
+        VaultActivityDaily.objects.bulk_create(
+            rows, batch_size=1000, update_conflicts=True,
+            unique_fields=['user', 'day', 'action'], update_fields=['count'],
+        )
+    return len(rows)
+
+
+def retention_cutoff(retention_months: int = None) -> date:
+    """Primer mes que se conserva (VAULT_ACTIVITY_RETENTION_MONTHS)."""
+    if retention_months is None:
+        retention_months = getattr(settings, 'VAULT_ACTIVITY_RETENTION_MONTHS', 12)
+    return _add_months(_month_start(timezone.localdate()), -retention_months)
+
+
+def drop_expired_partitions(retention_months: int = None) -> list:
+    """
+    Elimina las particiones anteriores a la retención, tras consolidar sus días.
+
+    Returns:
+        list: Nombres de las particiones eliminadas
+    """
+    quote = connection.ops.quote_name
+    cutoff = retention_cutoff(retention_months)
+    dropped = []
+
+    for month, name in list_partitions():
+        if month >= cutoff:
+            continue
+        with transaction.atomic():
+            rollup_activity(month, _add_months(month, 1) - timedelta(days=1))
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {quote(_table())} DETACH PARTITION {quote(name)}')
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        dropped.append(name)
+        logger.info(f'Dropped expired vault activity partition {name}')
+
+    purge_expired_default_rows(retention_months)
+    return dropped
+
+
+def purge_expired_default_rows(retention_months: int = None) -> int:
+    """
+    Consolida y borra las filas anteriores a la retención que quedaron en la
+    partición por defecto (meses sin partición propia).
+
+    Returns:
+        int: Filas borradas
+    """
+    quote = connection.ops.quote_name
+    default = default_partition_name()
+    cutoff_month = retention_cutoff(retention_months)
+    cutoff = _local_midnight(cutoff_month)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not _has_default_partition(cursor):
+            return 0
+        cursor.execute(
+            f'SELECT min({quote("timestamp")}) FROM {quote(default)} '
+            f'WHERE {quote("timestamp")} < %s',
+            [cutoff]
+        )
+        oldest = cursor.fetchone()[0]
+        if oldest is None:
+            return 0
+        rollup_activity(timezone.localtime(oldest).date(), cutoff_month - timedelta(days=1))
+        cursor.execute(
+            f'DELETE FROM {quote(default)} WHERE {quote("timestamp")} < %s', [cutoff]
+        )
+        deleted = cursor.rowcount
+
+    logger.info(f'Purged {deleted} expired rows from {default}')
+    return deleted
+
+
+def purge_expired_rows(retention_months: int = None, batch_size: int = 5000) -> int:
+    """
+    Retención sin particiones: consolida y borra filas antiguas por lotes.
+
+    Returns:
+        int: Filas borradas
+    """
+    cutoff = retention_cutoff(retention_months)
+    oldest = VaultActivity.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if oldest is None or oldest >= _local_midnight(cutoff):
+        return 0
+
+    rollup_activity(timezone.localtime(oldest).date(), cutoff - timedelta(days=1))
+
+    deleted = 0
+    expired = VaultActivity.objects.filter(timestamp__lt=_local_midnight(cutoff))
+    while True:
+        batch = list(expired.values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += VaultActivity.objects.filter(id__in=batch).delete()[0]
+
+
+def apply_retention(retention_months: int = None) -> dict:
+    """Aplica la retención con el mecanismo disponible en el motor actual."""
+    if is_partitioned():
+        return {'partitions_dropped': drop_expired_partitions(retention_months)}
+    return {'rows_deleted': purge_expired_rows(retention_months)}
+
+
+def activity_summary(user, days: int = 90) -> dict:
+    """
+    Actividad del usuario en los últimos días a partir de los resúmenes diarios.
+
+    Los días cerrados salen de VaultActivityDaily; solo el día en curso, que aún
+    no está consolidado, se cuenta sobre las filas de auditoría.
+
+    Returns:
+        dict: {'days', 'total', 'by_action', 'by_day'}
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=days - 1)
+
+    by_action = {}
+    by_day = {}
+    rollups = VaultActivityDaily.objects.filter(user=user, day__gte=since, day__lt=today)
+    for day, action, total in rollups.values_list('day', 'action').annotate(total=Sum('count')):
+        by_action[action] = by_action.get(action, 0) + total
+        by_day[day.isoformat()] = by_day.get(day.isoformat(), 0) + total
+
+    recent = (
+        VaultActivity.objects
+        .filter(user=user, timestamp__gte=_local_midnight(today))
+        .order_by()
+        .values_list('action')
+        .annotate(total=Count('id'))
+    )
+    for action, total in recent:
+        by_action[action] = by_action.get(action, 0) + total
+        by_day[today.isoformat()] = by_day.get(today.isoformat(), 0) + total
+
+    return {
+        'days': days,
+        'total': sum(by_action.values()),
+        'by_action': by_action,
+        'by_day': by_day,
+    }
@@ -1,3 +1,20 @@
+"""
+Configuración del admin para los modelos del baúl.
+"""
+
 from django.contrib import admin
+from .models import VaultActivityDaily
+
 
-# Register your models here.
+@admin.register(VaultActivityDaily)
+class VaultActivityDailyAdmin(admin.ModelAdmin):
+    """Resúmenes diarios de actividad; los genera vault_activity_maintenance."""
+    
+    list_display = ('user', 'day', 'action', 'count')
+    list_filter = ('action', 'day')
+    search_fields = ('user__email',)
+    date_hierarchy = 'day'
+    readonly_fields = ('user', 'day', 'action', 'count')
+    
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,164 @@
+"""
+Vistas asíncronas (ASGI) del baúl.
+
+Variantes de las APIs de estado, desbloqueo y lectura de entradas para servir
+con un servidor ASGI (uvicorn secure_project.asgi:application). El KDF se
+espera en kdf_executor sin bloquear el event loop, de modo que un solo proceso
+atiende muchos clientes en espera mientras el trabajo de CPU sigue acotado.
+"""
+
+import json
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+
+from .access_stats import access_stats
+from .audit import audit_log, audit_request
+from .health import apply_pending_removals
+from .kdf import KDFBusyError, kdf_executor
+from .key_cache import derived_key_cache, get_session_scope, open_session_scope, remember_vault_key
+from .models import MasterPasswordHash, VaultItem
+from .stats import get_vault_stats
+
+logger = logging.getLogger(__name__)
+
+
+def _load_request(request) -> bool:
+    """
+    Evalúa request.user y request.session, que se cargan de forma perezosa con
+    consultas síncronas. Después pueden usarse dentro del event loop.
+
+    Returns:
+        bool: True si el usuario está autenticado
+    """
+    request.session.get('vault_unlocked')
+    return request.user.is_authenticated
+
+
+def async_login_required(view):
+    """Equivalente de login_required para vistas async (Django 4.2 no lo admite)."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(_load_request)(request):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_login_required
+async def vault_status_api(request):
+    """API asíncrona para obtener estado del baúl."""
+    try:
+        user = request.user
+        # Las mismas estadísticas cacheadas que la vista síncrona
+        stats = await sync_to_async(get_vault_stats)(user.pk)
+        response_data = {
+            'has_master_password': stats['has_master_password'],
+            'vault_unlocked': request.session.get('vault_unlocked', False),
+            'total_items': stats['total_items'],
+        }
+
+        # Métricas de la caché de claves, del pool de KDF y de accesos solo para staff
+        if user.is_staff:
+            response_data['key_cache'] = derived_key_cache.stats()
+            response_data['kdf_executor'] = kdf_executor.stats()
+            response_data['access_stats'] = access_stats.stats()
+            response_data['audit_log'] = audit_log.stats()
+
+        return JsonResponse(response_data)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error al obtener estado: {str(e)}'})
+
+
+@async_login_required
+async def unlock_vault_api(request):
+    """API asíncrona para desbloquear el baúl con contraseña maestra."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    try:
+        master_password = json.loads(request.body).get('master_password')
+        if not master_password:
+            return JsonResponse({'error': 'Contraseña maestra requerida'})
+
+        try:
+            master_hash = await MasterPasswordHash.objects.select_related('user').aget(
+                user=request.user
+            )
+        except MasterPasswordHash.DoesNotExist:
+            return JsonResponse({'error': 'Contraseña maestra no configurada'})
+
+        vault_key = await master_hash.aunlock(master_password)
+        if vault_key is None:
+            return JsonResponse({'error': 'Contraseña maestra incorrecta'})
+
+        # La sesión ya está cargada: estas escrituras no consultan la base de datos
+        request.session['vault_unlocked'] = True
+        request.session['vault_unlock_time'] = timezone.now().isoformat()
+        remember_vault_key(open_session_scope(request), master_password, vault_key)
+        # Con la clave ya disponible se corrigen los recuentos de salud
+        await sync_to_async(apply_pending_removals)(request.user.pk, vault_key)
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Baúl desbloqueado exitosamente'
+        })
+
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al desbloquear: {str(e)}'})
+
+
+@async_login_required
+async def vault_item_api(request, item_id):
+    """
+    API asíncrona para leer una entrada descifrada.
+    Con el baúl desbloqueado la clave sale de la caché y no se ejecuta ningún KDF.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    cache_scope = get_session_scope(request)
+    if cache_scope is None:
+        return JsonResponse({'error': 'El baúl está bloqueado'}, status=403)
+
+    try:
+        item = await VaultItem.objects.select_related('folder').aget(
+            id=item_id, user=request.user
+        )
+    except VaultItem.DoesNotExist:
+        raise Http404('Entrada no encontrada')
+
+    try:
+        master_password = json.loads(request.body).get('master_password')
+        if not master_password:
+            return JsonResponse({'error': 'Contraseña maestra requerida'})
+
+        master_hash = await MasterPasswordHash.objects.select_related('user').aget(
+            user=request.user
+        )
+        vault_key = await master_hash.aget_vault_key(master_password, cache_scope)
+
+        # Descifrado AES-GCM: trabajo de CPU sin ORM (los accesos van al buffer de
+        # access_stats), así que no se serializa en el hilo síncrono compartido.
+        # Las entradas 1.0 derivan su clave en el pool acotado de kdf_executor.
+        data = await sync_to_async(item.get_decrypted_data, thread_sensitive=False)(
+            master_password, cache_scope, vault_key=vault_key
+        )
+        # Solo encola el evento: no consulta la base de datos
+        audit_request(request, 'read', item)
+
+        return JsonResponse({'item': item.get_safe_preview(), 'data': data})
+
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al leer entrada: {str(e)}'})
@@ -0,0 +1,412 @@
+"""
+Registro de auditoría del baúl (VaultActivity) escrito por lotes.
+
+Los eventos se acumulan en un buffer circular en memoria y un hilo en segundo
+plano los inserta con bulk_create cada VAULT_AUDIT_BATCH_SIZE eventos o cada
+VAULT_AUDIT_FLUSH_MS milisegundos. Antes de aceptarse, cada evento se añade a
+un spool en disco (JSON por líneas), de modo que si el proceso muere los
+eventos pendientes se reinsertan al arrancar el siguiente.
+
+Si la base de datos se retrasa, las lecturas se muestrean y las acciones
+críticas (crear, borrar, compartir, exportar...) esperan brevemente a que haya
+hueco en el buffer antes de descartarse.
+"""
+
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Acciones frecuentes que pueden muestrearse cuando la base de datos se retrasa
+SAMPLED_ACTIONS = frozenset({'read'})
+
+
+def _summarize(samples) -> dict:
+    """Promedio, p95 y máximo de una muestra."""
+    if not samples:
+        return {'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered), 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max': round(ordered[-1], 2),
+    }
+
+
+class AuditSpool:
+    """
+    Spool en disco por segmentos: audit-<pid>-<n>.jsonl.
+
+    Los eventos se añaden al segmento activo; al volcar, el segmento se cierra
+    y se borra cuando sus eventos ya están en la base de datos. Los segmentos de
+    procesos que ya no existen se reinsertan al arrancar (recover()).
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._file = None
+        self._path = None
+        self._sequence = 0
+        self._closed = []
+
+    def _open(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._sequence += 1
+        self._path = self.root / f'audit-{os.getpid()}-{self._sequence}.jsonl'
+        self._file = open(self._path, 'a', encoding='utf-8')
+
+    def append(self, event: dict):
+        """Escribe un evento; sobrevive a la caída del proceso (no a la del host)."""
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(event, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def rotate(self):
+        """Cierra el segmento activo; los eventos siguientes van a uno nuevo."""
+        if self._file is not None:
+            self._file.close()
+            self._closed.append(self._path)
+            self._file = None
+            self._path = None
+
+    def commit(self):
+        """Borra los segmentos cerrados cuyos eventos ya se insertaron."""
+        for path in self._closed:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._closed = []
+
+    def orphaned(self) -> list:
+        """Segmentos de procesos que ya no están vivos."""
+        if not self.root.is_dir():
+            return []
+
+        segments = []
+        for path in sorted(self.root.glob('audit-*.jsonl')):
+            try:
+                pid = int(path.name.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid == os.getpid() or not _pid_alive(pid):
+                if path != self._path and path not in self._closed:
+                    segments.append(path)
+        return segments
+
+    @staticmethod
+    def read(path: Path) -> list:
+        """Eventos de un segmento; una última línea truncada se ignora."""
+        events = []
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f'Skipping truncated audit spool line in {path.name}')
+        return events
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditLogWriter:
+    """
+    Escritor por lotes de VaultActivity.
+
+    record() no toca la base de datos: encola el evento (y lo añade al spool)
+    y devuelve si se aceptó. Cada evento lleva su UUID desde el origen, así que
+    reinsertar un segmento ya volcado no duplica filas.
+    """
+
+    def __init__(self, batch_size: int = None, flush_ms: int = None, capacity: int = None,
+                 spool_dir=None, samples: int = 1000):
+        self.batch_size = batch_size or getattr(settings, 'VAULT_AUDIT_BATCH_SIZE', 200)
+        self.flush_ms = flush_ms or getattr(settings, 'VAULT_AUDIT_FLUSH_MS', 500)
+        self.capacity = capacity or getattr(settings, 'VAULT_AUDIT_BUFFER_SIZE', 10000)
+        self.lag_ms = getattr(settings, 'VAULT_AUDIT_LAG_MS', 1000)
+        self.sample_rate = getattr(settings, 'VAULT_AUDIT_SAMPLE_RATE', 0.1)
+        self.block_ms = getattr(settings, 'VAULT_AUDIT_BLOCK_MS', 50)
+        if spool_dir is None:
+            spool_dir = getattr(settings, 'VAULT_AUDIT_SPOOL_DIR', None)
+        self.spool = AuditSpool(spool_dir) if spool_dir else None
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._recovered = False
+        self._batch_sizes = deque(maxlen=samples)
+        self._flush_latency = deque(maxlen=samples)
+        self.last_flush_ms = 0.0
+        self.recorded = 0
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.recovered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'VAULT_AUDIT_ENABLED', True)
+
+    def lagging(self) -> bool:
+        """La base de datos no sigue el ritmo: buffer a más de la mitad o volcados lentos."""
+        return len(self._buffer) >= self.capacity // 2 or self.last_flush_ms > self.lag_ms
+
+    def record(self, user_id, action: str, vault_item_id=None, description: str = '',
+               ip_address: str = None, user_agent: str = '') -> bool:
+        """
+        Encola un evento de auditoría.
+
+        Args:
+            user_id: Usuario que realiza la acción
+            action (str): Acción (VaultActivity.ACTION_CHOICES)
+            vault_item_id: Entrada afectada, si la hay
+            description (str): Descripción de la actividad
+            ip_address (str): IP del cliente
+            user_agent (str): User agent del cliente
+
+        Returns:
+            bool: False si el evento se descartó (muestreo o buffer lleno)
+        """
+        if not self.enabled:
+            return False
+
+        self._ensure_worker()
+        event = {
+            'id': uuid.uuid4().hex,
+            'user_id': str(user_id),
+            'vault_item_id': str(vault_item_id) if vault_item_id else None,
+            'action': action,
+            'description': description,
+            'ip_address': ip_address,
+            'user_agent': (user_agent or '')[:500],
+            'timestamp': timezone.now().isoformat(),
+        }
+
+        with self._lock:
+            if action in SAMPLED_ACTIONS and self.lagging():
+                if random.random() >= self.sample_rate:
+                    self.sampled_out += 1
+                    return False
+
+            if len(self._buffer) >= self.capacity:
+                # Contrapresión: las acciones críticas esperan a que haya hueco
+                if action in SAMPLED_ACTIONS or not self._not_full.wait_for(
+                    lambda: len(self._buffer) < self.capacity, self.block_ms / 1000
+                ):
+                    self.dropped += 1
+                    return False
+
+            if self.spool is not None:
+                try:
+                    self.spool.append(event)
+                except OSError as e:
+                    logger.error(f'Error writing audit spool: {str(e)}')
+
+            self._buffer.append(event)
+            self.recorded += 1
+            if len(self._buffer) >= self.batch_size:
+                self._not_empty.notify()
+        return True
+
+    def flush(self) -> int:
+        """
+        Inserta todos los eventos pendientes (en lotes de batch_size).
+
+        Returns:
+            int: Filas insertadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._buffer)
+                self._buffer.clear()
+                if self.spool is not None:
+                    self.spool.rotate()
+                self._not_full.notify_all()
+            if not events:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                written = self._write(events)
+            except Exception as e:
+                self.failed_flushes += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                logger.error(f'Error flushing vault audit log: {str(e)}')
+                # Vuelven al buffer; sus segmentos se conservan hasta un volcado correcto
+                with self._lock:
+                    room = max(self.capacity - len(self._buffer), 0)
+                    self.dropped += max(len(events) - room, 0)
+                    self._buffer.extendleft(reversed(events[:room]))
+                return 0
+
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                if self.spool is not None:
+                    self.spool.commit()
+                self.last_flush_ms = elapsed
+                self._flush_latency.append(elapsed)
+                self._batch_sizes.append(len(events))
+                self.written += written
+            return written
+
+    def _write(self, events: list) -> int:
+        """bulk_create de los eventos; ignora los ya insertados (mismo UUID)."""
+        from django.contrib.auth import get_user_model
+        from .models import VaultActivity, VaultItem
+
+        # Usuarios o entradas borrados desde que se registró el evento
+        user_ids = {event['user_id'] for event in events}
+        item_ids = {event['vault_item_id'] for event in events if event['vault_item_id']}
+        users = {
+            str(pk) for pk in
+            get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+        }
+        items = {
+            str(pk).replace('-', '') for pk in
+            VaultItem.objects.filter(pk__in=item_ids).values_list('pk', flat=True)
+        }
+
+        rows = []
+        for event in events:
+            if event['user_id'] not in users:
+                continue
+            item_id = event['vault_item_id']
+            rows.append(VaultActivity(
+                id=uuid.UUID(event['id']),
+                user_id=event['user_id'],
+                vault_item_id=item_id if item_id and item_id.replace('-', '') in items else None,
+                action=event['action'],
+                description=event['description'],
+                ip_address=event['ip_address'],
+                user_agent=event['user_agent'],
+                timestamp=datetime.fromisoformat(event['timestamp']),
+            ))
+
+        VaultActivity.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(rows)
+
+    def recover(self) -> int:
+        """
+        Reinserta los segmentos del spool que dejaron procesos caídos.
+
+        Returns:
+            int: Eventos reinsertados
+        """
+        if self.spool is None:
+            return 0
+
+        with self._lock:
+            segments = self.spool.orphaned()
+
+        total = 0
+        for path in segments:
+            try:
+                events = self.spool.read(path)
+                if events:
+                    total += self._write(events)
+                path.unlink()
+            except Exception as e:
+                logger.error(f'Error recovering audit spool {path.name}: {str(e)}')
+        if total:
+            logger.info(f'Recovered {total} audit events from spool')
+        self.recovered += total
+        return total
+
+    def _ensure_worker(self):
+        """Arranca el hilo de volcado la primera vez que se necesita."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='vault-audit-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        if not self._recovered:
+            self._recovered = True
+            close_old_connections()
+            self.recover()
+
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(
+                    lambda: len(self._buffer) >= self.batch_size, self.flush_ms / 1000
+                )
+            close_old_connections()
+            self.flush()
+
+    def stats(self) -> dict:
+        """Métricas del escritor: tamaño de lote, latencia de volcado y descartes."""
+        with self._lock:
+            return {
+                'pending': len(self._buffer),
+                'capacity': self.capacity,
+                'lagging': self.lagging(),
+                'recorded': self.recorded,
+                'written': self.written,
+                'sampled_out': self.sampled_out,
+                'dropped': self.dropped,
+                'failed_flushes': self.failed_flushes,
+                'recovered': self.recovered,
+                'batch_size': _summarize(self._batch_sizes),
+                'flush_ms': _summarize(self._flush_latency),
+            }
+
+
+audit_log = AuditLogWriter()
+
+# Los eventos en memoria se insertan al terminar el proceso; si falla, quedan en el spool
+atexit.register(audit_log.flush)
+
+
+def audit_request(request, action: str, item=None, description: str = '') -> bool:
+    """
+    Registra una actividad del usuario de la petición.
+
+    Args:
+        request: HttpRequest autenticada
+        action (str): Acción (VaultActivity.ACTION_CHOICES)
+        item (VaultItem, optional): Entrada afectada
+        description (str): Descripción de la actividad
+
+    Returns:
+        bool: False si el evento se descartó
+    """
+    from usuarios.signals import get_client_ip
+
+    return audit_log.record(
+        request.user.pk,
+        action,
+        vault_item_id=item.pk if item is not None else None,
+        description=description,
+        ip_address=get_client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+    )
@@ -0,0 +1,461 @@
+"""
+Benchmarks del sistema de cifrado.
+Mide el rendimiento de los distintos modos de AESCrypto sobre payloads de prueba.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.urls import reverse
+
+from .crypto import (
+    AESCrypto, ALGORITHM_GCM, VaultEntry, generate_vault_key, get_crypto, item_associated_data
+)
+from .models import MasterPasswordHash
+
+
+DEFAULT_PAYLOAD_SIZES = (1024, 64 * 1024)
+
+
+def time_operation(func, iterations: int) -> dict:
+    """
+    Ejecuta una función varias veces y mide el tiempo total.
+    
+    Args:
+        func (callable): Función sin argumentos a medir
+        iterations (int): Número de repeticiones
+    
+    Returns:
+        dict: Repeticiones, tiempo total, operaciones/segundo y media en microsegundos
+    """
+    func()  # Calentamiento
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'iterations': iterations,
+        'total_s': round(elapsed, 6),
+        'ops_per_s': round(iterations / elapsed, 2) if elapsed else 0.0,
+        'mean_us': round(elapsed / iterations * 1_000_000, 2),
+    }
+
+
+def _with_throughput(result: dict, payload_size: int) -> dict:
+    """Agrega el rendimiento en MB/s a un resultado de time_operation()."""
+    result['mb_per_s'] = round(result['ops_per_s'] * payload_size / (1024 * 1024), 2)
+    return result
+
+
+def bench_algorithms(payload_sizes=DEFAULT_PAYLOAD_SIZES, iterations: int = 200,
+                     kdf_iterations: int = 5, crypto: AESCrypto = None) -> list:
+    """
+    Compara AES-256-GCM contra la ruta AES-256-CBC-DOUBLE.
+    
+    Se miden tres variantes: CBC-DOUBLE 1.0 (PBKDF2 por entrada), CBC-DOUBLE 2.0
+    (clave del baúl, dos pasadas CBC) y GCM (una pasada autenticada).
+    
+    Args:
+        payload_sizes (iterable): Tamaños de payload en bytes
+        iterations (int): Repeticiones para los modos sin KDF
+        kdf_iterations (int): Repeticiones para el modo 1.0, dominado por PBKDF2
+        crypto (AESCrypto, optional): Instancia a usar
+    
+    Returns:
+        list: Un diccionario por (modo, tamaño, operación)
+    """
+    crypto = crypto or get_crypto()
+    vault_key = generate_vault_key()
+    password = 'benchmark-master-password'
+    aad = item_associated_data('00000000-0000-0000-0000-000000000000', 'login')
+    results = []
+    
+    for size in payload_sizes:
+        payload = os.urandom(size)
+        
+        modes = [
+            ('AES-256-CBC-DOUBLE 1.0', kdf_iterations,
+             lambda: crypto.encrypt(payload, user_password=password),
+             lambda blob: crypto.decrypt_bytes(blob, user_password=password)),
+            ('AES-256-CBC-DOUBLE 2.0', iterations,
+             lambda: crypto.encrypt(payload, vault_key=vault_key),
+             lambda blob: crypto.decrypt_bytes(blob, vault_key=vault_key)),
+            ('AES-256-GCM', iterations,
+             lambda: crypto.encrypt(payload, vault_key=vault_key, algorithm=ALGORITHM_GCM,
+                                    associated_data=aad),
+             lambda blob: crypto.decrypt_bytes(blob, vault_key=vault_key, associated_data=aad)),
+        ]
+        
+        for name, count, encrypt, decrypt in modes:
+            blob = encrypt()
+            assert decrypt(blob) == payload
+            
+            for operation, func in (('encrypt', encrypt), ('decrypt', lambda: decrypt(blob))):
+                result = _with_throughput(time_operation(func, count), size)
+                result.update({'mode': name, 'payload_size': size, 'operation': operation})
+                results.append(result)
+    
+    return results
+
+
+DEFAULT_ITEM_COUNTS = (1, 50)
+
+# Claves que identifican un caso del benchmark entre ejecuciones
+RESULT_KEY = ('case', 'payload_size', 'items')
+
+
+def _sample_entry(payload_size: int) -> dict:
+    """Entrada de tipo login cuyas notas ocupan aproximadamente payload_size bytes."""
+    return {
+        'type': 'login',
+        'name': 'Benchmark',
+        'username': 'usuario@ejemplo.com',
+        'password': 'ContraseñaDePrueba123!',
+        'url': 'https://ejemplo.com',
+        'notes': 'x' * payload_size,
+    }
+
+
+def bench_suite(payload_sizes=DEFAULT_PAYLOAD_SIZES, item_counts=DEFAULT_ITEM_COUNTS,
+                iterations: int = 200, kdf_iterations: int = 5,
+                crypto: AESCrypto = None) -> list:
+    """
+    Suite de micro-benchmarks de la capa de cifrado.
+    
+    Cubre encrypt/decrypt en modo simple (solo clave maestra) y doble,
+    encrypt_json/decrypt_json, VaultEntry.create_entry/update_entry con varias
+    entradas por operación y MasterPasswordHash.verify_password. per_item_us es
+    el coste por entrada y es la métrica que se compara con la línea base.
+    
+    Args:
+        payload_sizes (iterable): Tamaños de payload en bytes
+        item_counts (iterable): Entradas procesadas por operación en los casos de VaultEntry
+        iterations (int): Repeticiones para los casos sin KDF
+        kdf_iterations (int): Repeticiones para los casos dominados por el KDF
+        crypto (AESCrypto, optional): Instancia a usar
+    
+    Returns:
+        list: Un diccionario por caso (case, payload_size, items y tiempos)
+    """
+    crypto = crypto or get_crypto()
+    vault_key = generate_vault_key()
+    password = 'benchmark-master-password'
+    aad = item_associated_data('00000000-0000-0000-0000-000000000000', 'login')
+    results = []
+    
+    def record(case, func, count, payload_size=0, items=1):
+        result = time_operation(func, count)
+        result.update({
+            'case': case,
+            'payload_size': payload_size,
+            'items': items,
+            'per_item_us': round(result['mean_us'] / items, 2),
+        })
+        results.append(result)
+    
+    for size in payload_sizes:
+        payload = os.urandom(size)
+        modes = [
+            ('single', iterations, {}),
+            ('double-1.0', kdf_iterations, {'user_password': password}),
+            ('double-2.0', iterations, {'vault_key': vault_key}),
+            ('gcm', iterations, {'vault_key': vault_key, 'algorithm': ALGORITHM_GCM,
+                                 'associated_data': aad}),
+        ]
+        for mode, count, kwargs in modes:
+            blob = crypto.encrypt(payload, **kwargs)
+            decrypt_kwargs = {k: v for k, v in kwargs.items() if k != 'algorithm'}
+            record(f'encrypt[{mode}]', lambda: crypto.encrypt(payload, **kwargs), count, size)
+            record(f'decrypt[{mode}]', lambda: crypto.decrypt_bytes(blob, **decrypt_kwargs),
+                   count, size)
+        
+        entry = _sample_entry(size)
+        blob = crypto.encrypt_json(entry, vault_key=vault_key, algorithm=ALGORITHM_GCM,
+                                   associated_data=aad)
+        record('encrypt_json[gcm]', lambda: crypto.encrypt_json(
+            entry, vault_key=vault_key, algorithm=ALGORITHM_GCM, associated_data=aad
+        ), iterations, size)
+        record('decrypt_json[gcm]', lambda: crypto.decrypt_json(
+            blob, vault_key=vault_key, associated_data=aad
+        ), iterations, size)
+        
+        vault = VaultEntry(crypto, vault_key=vault_key)
+        for count in item_counts:
+            entries = [_sample_entry(size) for _ in range(count)]
+            encrypted = [vault.create_entry(password, e, aad) for e in entries]
+            repeats = max(1, iterations // count)
+            record('entry.create', lambda: [
+                vault.create_entry(password, e, aad) for e in entries
+            ], repeats, size, count)
+            record('entry.update', lambda: [
+                vault.update_entry(e, password, {'data': {'username': 'otro'}}, aad)
+                for e in encrypted
+            ], repeats, size, count)
+    
+    # La contraseña maestra no depende del tamaño del payload: un caso por KDF configurada
+    master_hash = MasterPasswordHash(user=get_user_model()(email='benchmark@localhost'))
+    master_hash.set_password(password)
+    record(f'verify_password[{master_hash.kdf_algorithm}]',
+           lambda: master_hash.verify_password(password), kdf_iterations)
+    
+    return results
+
+
+def _str_pipeline_decrypt(crypto: AESCrypto, blob, **kwargs) -> dict:
+    """Ruta anterior de decrypt_json: bytes -> str -> json.loads."""
+    return json.loads(crypto.decrypt_bytes(blob, **kwargs).decode('utf-8'))
+
+
+def bench_json_pipeline(items: int = 1000, payload_size: int = 1024,
+                        crypto: AESCrypto = None) -> list:
+    """
+    Compara el descifrado de un baúl completo con la ruta JSON por str y la ruta por bytes.
+    
+    Se mide el tiempo total de descifrar y deserializar `items` entradas, en GCM
+    y en CBC-DOUBLE 2.0, y con tracemalloc el pico de memoria de las copias
+    intermedias (texto descifrado, str decodificado) de cada entrada.
+    
+    Args:
+        items (int): Entradas del baúl
+        payload_size (int): Tamaño aproximado de cada entrada en bytes
+        crypto (AESCrypto, optional): Instancia a usar
+    
+    Returns:
+        list: Un diccionario por (modo, ruta) con el tiempo en ms y el pico en KiB
+    """
+    crypto = crypto or get_crypto()
+    vault_key = generate_vault_key()
+    aad = item_associated_data('00000000-0000-0000-0000-000000000000', 'login')
+    entry = _sample_entry(payload_size)
+    results = []
+    
+    modes = [
+        ('AES-256-GCM', {'algorithm': ALGORITHM_GCM, 'associated_data': aad}),
+        ('AES-256-CBC-DOUBLE 2.0', {}),
+    ]
+    for mode, kwargs in modes:
+        decrypt_kwargs = {'vault_key': vault_key, 'associated_data': kwargs.get('associated_data')}
+        blobs = [crypto.encrypt_json(entry, vault_key=vault_key, **kwargs) for _ in range(items)]
+        
+        pipelines = [
+            ('str', lambda blob: _str_pipeline_decrypt(crypto, blob, **decrypt_kwargs)),
+            ('bytes', lambda blob: crypto.decrypt_json(blob, **decrypt_kwargs)),
+        ]
+        for pipeline, decrypt in pipelines:
+            decrypt(blobs[0])  # Calentamiento
+            tracemalloc.start()
+            start = time.perf_counter()
+            # Cada resultado se descarta: el pico refleja los buffers intermedios por entrada
+            for blob in blobs:
+                decrypt(blob)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            
+            results.append({
+                'mode': mode,
+                'pipeline': pipeline,
+                'items': items,
+                'payload_size': payload_size,
+                'total_ms': round(elapsed * 1000, 2),
+                'peak_kib': round(peak / 1024, 1),
+            })
+    
+    return results
+
+
+def save_baseline(path: str, results: list):
+    """
+    Guarda los resultados de bench_suite() como línea base en JSON.
+    
+    Args:
+        path (str): Ruta del archivo
+        results (list): Resultados de bench_suite()
+    """
+    baseline = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path: str) -> dict:
+    """Lee una línea base guardada con save_baseline()."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_to_baseline(results: list, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Compara el coste por entrada con la línea base.
+    
+    Args:
+        results (list): Resultados de bench_suite()
+        baseline (dict): Línea base de load_baseline()
+        threshold (float): Aumento relativo tolerado (0.2 = 20 %)
+    
+    Returns:
+        list: Un diccionario por caso presente en ambos, con 'regression' si lo supera
+    """
+    previous = {
+        tuple(result[key] for key in RESULT_KEY): result
+        for result in baseline.get('results', [])
+    }
+    comparison = []
+    
+    for result in results:
+        before = previous.get(tuple(result[key] for key in RESULT_KEY))
+        if not before or not before.get('per_item_us'):
+            continue
+        change = result['per_item_us'] / before['per_item_us'] - 1
+        comparison.append({
+            **{key: result[key] for key in RESULT_KEY},
+            'baseline_us': before['per_item_us'],
+            'current_us': result['per_item_us'],
+            'change': round(change, 4),
+            'regression': change > threshold,
+        })
+    
+    return comparison
+
+
+def summarize_latencies(samples) -> dict:
+    """
+    Percentiles de una muestra de latencias.
+    
+    Args:
+        samples (iterable): Latencias en milisegundos
+    
+    Returns:
+        dict: p50, p95, p99 y máximo en milisegundos
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+    
+    return {
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(ordered[-1], 2),
+    }
+
+
+def _classify(response) -> str:
+    """Clasifica la respuesta de un desbloqueo: ok, busy (503) o error."""
+    if response.status_code == 503:
+        return 'busy'
+    if response.status_code == 200 and json.loads(response.content).get('success'):
+        return 'ok'
+    return 'error'
+
+
+def _load_report(mode: str, results: list, wall_s: float) -> dict:
+    """Resume los resultados (clase, milisegundos) de una prueba de carga."""
+    outcomes = Counter(outcome for outcome, _ in results)
+    return {
+        'mode': mode,
+        'requests': len(results),
+        'ok': outcomes['ok'],
+        'busy': outcomes['busy'],
+        'errors': outcomes['error'],
+        'wall_s': round(wall_s, 3),
+        'req_per_s': round(len(results) / wall_s, 2) if wall_s else 0.0,
+        **summarize_latencies([ms for _, ms in results]),
+    }
+
+
+def load_test_unlock(mode: str, user, password: str, concurrency: int = 500,
+                     wsgi_threads: int = 32) -> dict:
+    """
+    Lanza `concurrency` desbloqueos simultáneos contra la vista síncrona o async.
+    
+    Se ejecuta en proceso con los clientes de prueba de Django: en modo WSGI un
+    pool de wsgi_threads hilos emula los hilos de un worker (gunicorn --threads)
+    y en modo ASGI todas las peticiones comparten un event loop. La latencia se
+    mide desde que el cliente envía la petición, incluida la espera por un hilo.
+    
+    Args:
+        mode (str): 'wsgi' o 'asgi'
+        user: Usuario con contraseña maestra
+        password (str): Contraseña maestra del usuario
+        concurrency (int): Peticiones simultáneas (una sesión por cliente)
+        wsgi_threads (int): Hilos del worker WSGI emulado
+    
+    Returns:
+        dict: Resultado por clase y percentiles de latencia
+    """
+    # El framework de pruebas solo se importa al lanzar la prueba de carga
+    from django.test import override_settings
+    
+    # Fuera del runner de tests el host de los clientes de prueba no está permitido
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        return _run_unlock_load(mode, user, password, concurrency, wsgi_threads)
+
+
+def _run_unlock_load(mode: str, user, password: str, concurrency: int,
+                     wsgi_threads: int) -> dict:
+    """Implementación de load_test_unlock()."""
+    from django.test import AsyncClient, Client
+    
+    body = json.dumps({'master_password': password})
+    
+    if mode == 'wsgi':
+        path = reverse('core:unlock-vault')
+        clients = [Client() for _ in range(concurrency)]
+        for client in clients:
+            client.force_login(user)
+        
+        def request(client, submitted):
+            try:
+                response = client.post(path, body, content_type='application/json')
+                return _classify(response), (time.perf_counter() - submitted) * 1000
+            finally:
+                # El cliente de prueba no cierra la conexión como el handler WSGI
+                close_old_connections()
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=wsgi_threads) as pool:
+            futures = [pool.submit(request, client, time.perf_counter()) for client in clients]
+            results = [future.result() for future in futures]
+        return _load_report(mode, results, time.perf_counter() - start)
+    
+    if mode == 'asgi':
+        path = reverse('core:async-unlock-vault')
+        clients = [AsyncClient() for _ in range(concurrency)]
+        for client in clients:
+            client.force_login(user)
+        
+        async def request(client):
+            submitted = time.perf_counter()
+            # Igual que ASGIHandler: cada petición tiene su propio hilo para el
+            # código síncrono (middleware sin soporte async, sync_to_async)
+            async with ThreadSensitiveContext():
+                response = await client.post(path, body, content_type='application/json')
+            return _classify(response), (time.perf_counter() - submitted) * 1000
+        
+        async def run_all():
+            return await asyncio.gather(*(request(client) for client in clients))
+        
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        return _load_report(mode, results, time.perf_counter() - start)
+    
+    raise ValueError(f'Unsupported mode: {mode}')
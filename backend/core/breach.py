@@ -0,0 +1,245 @@
+"""
+Comprobación local de contraseñas filtradas (sin llamadas de red).
+
+El índice es un filtro de Bloom sobre los SHA-1 de un volcado de contraseñas
+filtradas (formato de Have I Been Pwned), construido con el comando
+build_breach_index. Se abre con mmap de solo lectura: las páginas viven en la
+caché del sistema operativo y las comparten todos los workers, y cada consulta
+lee como mucho k bytes, así que el coste es O(1) y la memoria residente por
+proceso es mínima.
+
+Formato en disco:
+    cabecera (32 bytes): MAGIC (4) | k funciones hash (4) | m bits (8) | n hashes (8) | relleno (8)
+    bits: m bits, el bit i en el byte i // 8 (bit menos significativo primero)
+
+Las k posiciones salen del propio SHA-1 por doble hashing, sin más hashes por
+consulta. Un filtro de Bloom no tiene falsos negativos; los falsos positivos
+(VAULT_BREACH_FP_RATE al construirlo) solo hacen que una contraseña se marque
+como débil.
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SVBF'
+HEADER_FORMAT = '>4sIQQ8x'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DEFAULT_FP_RATE = 0.001
+
+# Cada cuánto se comprueba si el archivo del índice se ha reemplazado
+RECHECK_SECONDS = 60
+
+
+def _positions(digest: bytes, hashes: int, bits: int):
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    return ((h1 + i * h2) % bits for i in range(hashes))
+
+
+def bloom_parameters(count: int, fp_rate: float = DEFAULT_FP_RATE) -> tuple:
+    """
+    Tamaño óptimo del filtro para count hashes.
+
+    Returns:
+        tuple: (m bits, k funciones hash)
+    """
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / count * math.log(2)))
+    return bits, hashes
+
+
+class BreachIndex:
+    """
+    Filtro de Bloom de solo lectura proyectado en memoria con mmap.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, self.hashes, self.bits, self.count = struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if magic != MAGIC or len(self._mmap) < HEADER_SIZE + self.bits // 8:
+            self._mmap.close()
+            raise ValueError(f'Índice de contraseñas filtradas no válido: {self.path}')
+
+        # Acceso aleatorio: sin lectura anticipada de páginas que no se consultan
+        if hasattr(mmap, 'MADV_RANDOM'):
+            self._mmap.madvise(mmap.MADV_RANDOM)
+
+    def contains_hash(self, digest: bytes) -> bool:
+        """True si el SHA-1 (20 bytes) está, con la probabilidad de falso positivo del filtro."""
+        data = self._mmap
+        for position in _positions(digest, self.hashes, self.bits):
+            if not data[HEADER_SIZE + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def contains(self, password: str) -> bool:
+        """True si la contraseña aparece en el volcado."""
+        return self.contains_hash(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def close(self):
+        self._mmap.close()
+
+
+def build_index(digests, count: int, path, fp_rate: float = DEFAULT_FP_RATE) -> dict:
+    """
+    Construye el índice en un temporal junto al destino y lo renombra al final:
+    los procesos que ya lo tienen abierto siguen leyendo el anterior hasta
+    que lo vuelven a abrir.
+
+    Args:
+        digests: Iterable de SHA-1 de 20 bytes
+        count (int): Número de hashes (para dimensionar el filtro)
+        path: Ruta del índice
+        fp_rate (float): Probabilidad de falso positivo objetivo
+
+    Returns:
+        dict: {'count', 'bits', 'hashes', 'size'}
+    """
+    bits, hashes = bloom_parameters(count, fp_rate)
+    size = HEADER_SIZE + bits // 8
+    destination = Path(path)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+
+    written = 0
+    fd, tmp_path = tempfile.mkstemp(dir=destination.parent, prefix='.breach-')
+    try:
+        with os.fdopen(fd, 'r+b') as output:
+            output.truncate(size)
+            # Los bits se escriben sobre el archivo proyectado: no se carga el filtro en memoria
+            with mmap.mmap(output.fileno(), size) as data:
+                for digest in digests:
+                    for position in _positions(digest, hashes, bits):
+                        data[HEADER_SIZE + (position >> 3)] |= 1 << (position & 7)
+                    written += 1
+                struct.pack_into(HEADER_FORMAT, data, 0, MAGIC, hashes, bits, written)
+                data.flush()
+            os.fsync(output.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    if written > count:
+        logger.warning(f'Breach index built with {written} hashes for {count} expected: '
+                       f'false positive rate above {fp_rate}')
+    return {'count': written, 'bits': bits, 'hashes': hashes, 'size': size}
+
+
+def iter_dump_hashes(source, min_count: int = 0):
+    """
+    SHA-1 de un volcado de contraseñas filtradas.
+
+    Admite un archivo con líneas HASH[:VECES] (40 hex) o un directorio de
+    rangos como los que descarga el downloader de Have I Been Pwned, con un
+    archivo por prefijo de 5 hex (00000.txt) y líneas SUFIJO:VECES.
+
+    Args:
+        source: Archivo o directorio del volcado
+        min_count (int): Omite los hashes vistos menos veces (reduce el índice)
+
+    Raises:
+        ValueError: Si una línea no tiene el formato esperado
+    """
+    source = Path(source)
+    if source.is_dir():
+        files = sorted(
+            (entry.stem.upper(), entry) for entry in source.iterdir()
+            if entry.is_file() and len(entry.stem) == 5
+        )
+    else:
+        files = [('', source)]
+
+    for prefix, file_path in files:
+        with open(file_path, encoding='ascii', errors='replace') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                suffix, _, times = line.partition(':')
+                try:
+                    digest = bytes.fromhex(prefix + suffix)
+                    if len(digest) != 20:
+                        raise ValueError('longitud')
+                    if min_count and int(times or 0) < min_count:
+                        continue
+                except ValueError:
+                    raise ValueError(f'Línea no válida en {file_path}:{line_number}')
+                yield digest
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_breach_index():
+    """
+    Índice del proceso (VAULT_BREACH_INDEX_PATH), abierto la primera vez que se
+    usa y reabierto si el archivo se reemplaza.
+
+    Returns:
+        BreachIndex: Índice, o None si no está configurado o no existe
+    """
+    global _index, _checked_at
+
+    now = time.monotonic()
+    if now - _checked_at < RECHECK_SECONDS:
+        return _index
+
+    with _lock:
+        if now - _checked_at < RECHECK_SECONDS:
+            return _index
+        _checked_at = now
+
+        path = getattr(settings, 'VAULT_BREACH_INDEX_PATH', '')
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+
+        if stat is None:
+            _index = None
+        elif _index is None or _index.identity != (stat.st_ino, stat.st_mtime_ns):
+            try:
+                _index = BreachIndex(path)
+                logger.info(f'Breach index loaded: {_index.count} hashes ({path})')
+            except (OSError, ValueError) as e:
+                logger.error(f'Error loading breach index: {str(e)}')
+                _index = None
+        return _index
+
+
+def reset_breach_index():
+    """Fuerza a abrir de nuevo el índice en la próxima consulta (p. ej. tras reconstruirlo)."""
+    global _index, _checked_at
+    with _lock:
+        _index = None
+        _checked_at = 0.0
+
+
+def is_breached(password: str) -> bool:
+    """True si la contraseña aparece en el índice local de filtraciones."""
+    if not password:
+        return False
+    index = get_breach_index()
+    return index is not None and index.contains(password)
@@ -5,68 +5,467 @@ Implementa funcionalidades similares a Bitwarden para proteger información conf
 
 import base64
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.padding import PKCS7
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap
 from cryptography.hazmat.backends import default_backend
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 import json
 import secrets
 import logging
 
+from .kdf import KDFBusyError, get_kdf, kdf_executor
+from .key_cache import derived_key_cache
+
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa json
+    orjson = None
+
+# Versiones del formato cifrado
+LEGACY_VERSION = '1.0'     # Salt y PBKDF2 por entrada
+VAULT_KEY_VERSION = '2.0'  # Clave del baúl por usuario, solo IV por entrada
+FIELDS_VERSION = '3.0'     # Clave del baúl, cada campo sellado por separado (solo GCM)
+
+# Algoritmos soportados en el campo 'algorithm'
+ALGORITHM_CBC = 'AES-256-CBC'                 # Solo clave maestra
+ALGORITHM_CBC_DOUBLE = 'AES-256-CBC-DOUBLE'   # Clave de usuario + clave maestra
+ALGORITHM_GCM = 'AES-256-GCM'                 # AEAD de una pasada con la clave del baúl
+
+# Derivación única de la contraseña maestra: PBKDF2 + HKDF-Expand (verificador y KEK)
+MASTER_KDF = 'PBKDF2-HKDF'
+_VERIFIER_INFO = b'securevault/master-password/verifier'
+_KEK_INFO = b'securevault/master-password/vault-kek'
+
+# Sobre binario: cabecera | versión | algoritmo | versión de datos | id de clave | campos | texto cifrado
+# La versión 1 no incluye el id de clave maestra (longitud + id) y se sigue leyendo.
+ENVELOPE_HEADER = 0xA5
+ENVELOPE_VERSION = 2
+
+_ALGORITHM_CODES = {ALGORITHM_CBC: 1, ALGORITHM_CBC_DOUBLE: 2, ALGORITHM_GCM: 3}
+_ALGORITHM_NAMES = {code: name for name, code in _ALGORITHM_CODES.items()}
+_DATA_VERSION_CODES = {LEGACY_VERSION: 1, VAULT_KEY_VERSION: 2, FIELDS_VERSION: 3}
+_DATA_VERSION_NAMES = {code: name for name, code in _DATA_VERSION_CODES.items()}
+
+# Segmento de una entrada por campos con sus metadatos (id, tipo, nombre, favorito, fechas)
+# y el manifiesto de segmentos
+META_SEGMENT = ''
+# Revisión con la que se sella el segmento de metadatos cuando lleva manifiesto
+MANIFEST_REVISION = 'manifest'
+
+
+def _envelope_layout(algorithm: str, version: str) -> list:
+    """Campos de longitud fija que siguen a la cabecera, en orden."""
+    if algorithm == ALGORITHM_GCM:
+        return [('iv', 12)]
+    if algorithm == ALGORITHM_CBC_DOUBLE and version == LEGACY_VERSION:
+        return [('iv', 16), ('iv2', 16), ('salt', 16), ('iterations', 4)]
+    if algorithm == ALGORITHM_CBC_DOUBLE:
+        return [('iv', 16), ('iv2', 16)]
+    return [('iv', 16)]
+
+
+def pack_envelope(encrypted_data: dict) -> bytes:
+    """
+    Convierte datos cifrados de encrypt() a un sobre binario compacto.
+    Evita el ~33% de base64 y las claves JSON repetidas en cada fila.
+    
+    Args:
+        encrypted_data (dict): Datos cifrados en formato JSON
+    
+    Returns:
+        bytes: Sobre binario
+    """
+    algorithm = encrypted_data.get('algorithm', ALGORITHM_CBC)
+    version = encrypted_data.get('version', LEGACY_VERSION)
+    
+    key_id = (encrypted_data.get('key_id') or '').encode('utf-8')
+    if len(key_id) > 255:
+        raise ValueError("Master key id too long for envelope")
+    
+    parts = [bytes([
+        ENVELOPE_HEADER,
+        ENVELOPE_VERSION,
+        _ALGORITHM_CODES[algorithm],
+        _DATA_VERSION_CODES[version],
+        len(key_id),
+    ]), key_id]
+    if version == FIELDS_VERSION:
+        # Segmentos: longitud del nombre | nombre | nonce | longitud del texto cifrado | texto cifrado
+        for name, segment in encrypted_data['segments'].items():
+            name_bytes = name.encode('utf-8')
+            iv = base64.b64decode(segment['iv'].encode('utf-8'))
+            ciphertext = base64.b64decode(segment['ciphertext'].encode('utf-8'))
+            if len(name_bytes) > 255 or len(iv) != 12:
+                raise ValueError(f"Invalid envelope segment '{name}'")
+            parts.extend([
+                bytes([len(name_bytes)]), name_bytes, iv,
+                len(ciphertext).to_bytes(4, 'big'), ciphertext
+            ])
+        return b''.join(parts)
+    
+    for field, length in _envelope_layout(algorithm, version):
+        if field == 'iterations':
+            value = int(encrypted_data.get('iterations', 100000)).to_bytes(length, 'big')
+        else:
+            value = base64.b64decode(encrypted_data[field].encode('utf-8'))
+        if len(value) != length:
+            raise ValueError(f"Invalid length for envelope field '{field}'")
+        parts.append(value)
+    parts.append(base64.b64decode(encrypted_data['ciphertext'].encode('utf-8')))
+    
+    return b''.join(parts)
+
+
+def unpack_envelope(buffer) -> dict:
+    """
+    Lee un sobre binario sin copiar: los campos son memoryviews sobre el buffer.
+    
+    Args:
+        buffer (bytes | memoryview): Sobre generado por pack_envelope()
+    
+    Returns:
+        dict: Entrada normalizada (mismo formato que parse_encrypted())
+    """
+    view = memoryview(buffer)
+    if len(view) < 2 or view[0] != ENVELOPE_HEADER:
+        raise ValueError("Invalid envelope header")
+    if view[1] not in (1, ENVELOPE_VERSION):
+        raise ValueError(f"Unsupported envelope version: {view[1]}")
+    # La versión 1 termina en la versión de datos; la 2 añade la longitud del id de clave
+    offset = 4 if view[1] == 1 else 5
+    if len(view) < offset or view[2] not in _ALGORITHM_NAMES or view[3] not in _DATA_VERSION_NAMES:
+        raise ValueError("Invalid envelope header")
+    
+    algorithm = _ALGORITHM_NAMES[view[2]]
+    version = _DATA_VERSION_NAMES[view[3]]
+    parsed = {'algorithm': algorithm, 'version': version, 'key_id': None}
+    
+    if view[1] >= 2:
+        key_id_length = view[4]
+        offset += key_id_length
+        if len(view) < offset:
+            raise ValueError("Truncated envelope")
+        if key_id_length:
+            parsed['key_id'] = bytes(view[5:offset]).decode('utf-8')
+    if version == FIELDS_VERSION:
+        parsed['segments'] = _unpack_segments(view, offset)
+        return parsed
+    for field, length in _envelope_layout(algorithm, version):
+        value = view[offset:offset + length]
+        if len(value) != length:
+            raise ValueError("Truncated envelope")
+        parsed[field] = int.from_bytes(value, 'big') if field == 'iterations' else value
+        offset += length
+    parsed['ciphertext'] = view[offset:]
+    
+    return parsed
+
+
+def _unpack_segments(view: memoryview, offset: int) -> dict:
+    """Lee los segmentos de un sobre por campos como memoryviews, sin descifrarlos."""
+    segments = {}
+    while offset < len(view):
+        name_length = view[offset]
+        name_end = offset + 1 + name_length
+        header_end = name_end + 12 + 4
+        if header_end > len(view):
+            raise ValueError("Truncated envelope")
+        name = bytes(view[offset + 1:name_end]).decode('utf-8')
+        length = int.from_bytes(view[name_end + 12:header_end], 'big')
+        if header_end + length > len(view):
+            raise ValueError("Truncated envelope")
+        segments[name] = {
+            'iv': view[name_end:name_end + 12],
+            'ciphertext': view[header_end:header_end + length],
+        }
+        offset = header_end + length
+    return segments
+
+
+def parse_encrypted(encrypted_data) -> dict:
+    """
+    Normaliza datos cifrados (JSON con base64 o sobre binario) a campos en bytes.
+    
+    Args:
+        encrypted_data (dict | bytes | memoryview): Datos cifrados
+    
+    Returns:
+        dict: algorithm, version, key_id y los campos binarios presentes
+              (ciphertext, iv, iv2, salt, iterations; segments en el formato 3.0)
+    """
+    if isinstance(encrypted_data, (bytes, bytearray, memoryview)):
+        return unpack_envelope(encrypted_data)
+    
+    parsed = {
+        'algorithm': encrypted_data.get('algorithm', ALGORITHM_CBC),
+        'version': encrypted_data.get('version', LEGACY_VERSION),
+        'key_id': encrypted_data.get('key_id'),
+    }
+    if parsed['version'] == FIELDS_VERSION:
+        parsed['segments'] = {
+            name: {
+                field: base64.b64decode(segment[field].encode('utf-8'))
+                for field in ('iv', 'ciphertext')
+            }
+            for name, segment in encrypted_data['segments'].items()
+        }
+        return parsed
+    for field in ('ciphertext', 'iv', 'iv2', 'salt'):
+        if field in encrypted_data:
+            parsed[field] = base64.b64decode(encrypted_data[field].encode('utf-8'))
+    if 'iterations' in encrypted_data:
+        parsed['iterations'] = encrypted_data['iterations']
+    
+    return parsed
+
+
+def describe_encrypted(encrypted_data) -> tuple:
+    """
+    Obtiene (algoritmo, versión) sin decodificar el resto de la entrada.
+    
+    Returns:
+        tuple: (algorithm, version)
+    """
+    if isinstance(encrypted_data, (bytes, bytearray, memoryview)):
+        view = memoryview(encrypted_data)
+        return _ALGORITHM_NAMES[view[2]], _DATA_VERSION_NAMES[view[3]]
+    return (
+        encrypted_data.get('algorithm', ALGORITHM_CBC),
+        encrypted_data.get('version', LEGACY_VERSION),
+    )
+
+
+def derive_master_keys(password: str, salt: bytes, kdf_name: str = None, kdf_params: dict = None) -> tuple:
+    """
+    Deriva el verificador de la contraseña maestra y la KEK del baúl con un solo KDF.
+    
+    La KDF del usuario produce una clave raíz de la que HKDF-Expand obtiene dos
+    claves independientes: conocer el verificador almacenado no revela la KEK.
+    
+    Args:
+        password (str): Contraseña maestra
+        salt (bytes): Salt del usuario
+        kdf_name (str, optional): Estrategia de core.kdf (por defecto PBKDF2)
+        kdf_params (dict, optional): Parámetros de coste de la estrategia
+    
+    Returns:
+        tuple: (verificador, kek), 32 bytes cada uno
+    """
+    root = kdf_executor.derive(get_kdf(kdf_name), password, salt, kdf_params)
+    return _expand_master_keys(root)
+
+
+async def aderive_master_keys(password: str, salt: bytes, kdf_name: str = None,
+                              kdf_params: dict = None) -> tuple:
+    """
+    Versión asíncrona de derive_master_keys() para las vistas ASGI.
+    
+    Returns:
+        tuple: (verificador, kek), 32 bytes cada uno
+    """
+    root = await kdf_executor.aderive(get_kdf(kdf_name), password, salt, kdf_params)
+    return _expand_master_keys(root)
+
+
+def _expand_master_keys(root: bytes) -> tuple:
+    """Obtiene el verificador y la KEK de la clave raíz con HKDF-Expand."""
+    verifier = HKDFExpand(hashes.SHA256(), 32, _VERIFIER_INFO).derive(root)
+    kek = HKDFExpand(hashes.SHA256(), 32, _KEK_INFO).derive(root)
+    return verifier, kek
+
+
+def is_field_encrypted(encrypted_data) -> bool:
+    """Indica si los datos usan el formato por campos (3.0)."""
+    try:
+        return describe_encrypted(encrypted_data)[1] == FIELDS_VERSION
+    except (KeyError, IndexError, AttributeError):
+        return False
+
+
+def segment_associated_data(associated_data: bytes, name: str, revision=None) -> bytes:
+    """
+    Metadatos autenticados de un segmento: los de la entrada más el nombre del
+    campo y la revisión en que se selló, de modo que un segmento no puede
+    moverse a otro campo ni a otra entrada, ni sustituirse por una versión anterior.
+    """
+    associated_data = (associated_data or b'') + b'#' + name.encode('utf-8')
+    if revision is not None:
+        associated_data += b'#' + str(revision).encode('utf-8')
+    return associated_data
+
+
+def dumps_json(data) -> bytes:
+    """
+    Serializa a JSON UTF-8 compacto directamente en bytes.
+    Con orjson no se crea ningún str intermedio.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Enteros de más de 64 bits u objetos que orjson no admite
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads_json(buffer):
+    """
+    Deserializa JSON desde bytes o memoryview sin decodificarlo antes a str.
+    
+    Raises:
+        ValueError: Si el contenido no es JSON UTF-8 válido
+    """
+    if orjson is not None:
+        return orjson.loads(buffer)
+    if isinstance(buffer, (bytes, bytearray)):
+        return json.loads(buffer)
+    # json.loads no admite memoryview: se decodifica directamente, sin copiarla a
+    # bytes, y se suelta antes de deserializar para no tener a la vez buffer, str y dict
+    text = str(buffer, 'utf-8')
+    del buffer
+    return json.loads(text)
+
+
+def _decode_master_key(value) -> bytes:
+    """Decodifica una clave maestra de settings (base64 de 32 bytes o 32 caracteres)."""
+    if isinstance(value, bytes) and len(value) == 32:
+        return value
+    if value and len(value) == 44:  # Base64 de 32 bytes
+        key = base64.b64decode(value.encode())
+        if len(key) == 32:
+            return key
+    elif value and len(value) == 32:  # Ya son 32 bytes
+        return value.encode()
+    raise ValueError("Invalid key length")
+
+
+class MasterKeyRing:
+    """
+    Claves maestras del servidor indexadas por id.
+    
+    Las entradas nuevas se cifran con la clave activa y guardan su id; las que
+    no tienen id (anteriores al llavero) se leen con la clave heredada.
+    """
+    
+    def __init__(self, keys: dict, active_key_id: str, legacy_key_id: str = None):
+        """
+        Args:
+            keys (dict): {id: clave de 32 bytes}
+            active_key_id (str): Id de la clave usada para cifrar
+            legacy_key_id (str, optional): Id de la clave de las entradas sin id
+        """
+        if active_key_id not in keys:
+            raise ValueError(f"Active master key '{active_key_id}' not in key ring")
+        self._keys = {key_id: (key, algorithms.AES(key)) for key_id, key in keys.items()}
+        self.active_key_id = active_key_id
+        self.legacy_key_id = legacy_key_id if legacy_key_id in keys else active_key_id
+    
+    @classmethod
+    def from_settings(cls):
+        """
+        Construye el llavero desde ENCRYPTION_KEY, ENCRYPTION_KEY_ID y
+        ENCRYPTION_PREVIOUS_KEYS ('id:clave' separados por comas).
+        
+        Una clave activa inválida solo se tolera en DEBUG: se genera una clave
+        efímera una única vez por proceso, en lugar de una por instancia.
+        """
+        active_key_id = getattr(settings, 'ENCRYPTION_KEY_ID', '1')
+        keys = {}
+        
+        for item in getattr(settings, 'ENCRYPTION_PREVIOUS_KEYS', []):
+            key_id, _, value = item.partition(':')
+            try:
+                keys[key_id.strip()] = _decode_master_key(value.strip())
+            except ValueError:
+                raise ImproperlyConfigured(f"Invalid previous encryption key '{key_id.strip()}'")
+        
+        try:
+            keys[active_key_id] = _decode_master_key(getattr(settings, 'ENCRYPTION_KEY', None))
+        except ValueError:
+            if not settings.DEBUG:
+                raise ImproperlyConfigured("ENCRYPTION_KEY must be 32 bytes (or their base64)")
+            keys[active_key_id] = os.urandom(32)  # 256 bits
+            logger.warning(
+                "Invalid encryption key in settings, using an ephemeral key for this process"
+            )
+        
+        return cls(keys, active_key_id, getattr(settings, 'ENCRYPTION_LEGACY_KEY_ID', active_key_id))
+    
+    def key(self, key_id: str = None) -> bytes:
+        """Clave maestra por id (sin id: la clave heredada)."""
+        return self._entry(key_id)[0]
+    
+    def algorithm(self, key_id: str = None):
+        """Objeto algorithms.AES ya construido para la clave indicada."""
+        return self._entry(key_id)[1]
+    
+    def _entry(self, key_id):
+        try:
+            return self._keys[key_id or self.legacy_key_id]
+        except KeyError:
+            raise ValueError(f"Unknown master key id: {key_id}")
+    
+    def key_ids(self) -> list:
+        return list(self._keys)
+
 
 class AESCrypto:
     """
     Clase para manejo de cifrado/descifrado AES-256-CBC.
     Implementa best practices de seguridad para protección de datos.
+    
+    Es segura entre hilos: usar get_crypto() para la instancia compartida del proceso.
     """
     
-    def __init__(self, master_key=None):
+    def __init__(self, master_key=None, keyring: MasterKeyRing = None, key_id: str = None):
         """
         Inicializa el sistema de cifrado.
         
         Args:
             master_key (bytes, optional): Clave maestra para cifrado. 
-                                        Si no se proporciona, usa la de settings.
+                                        Si no se proporciona, usa el llavero de settings.
+            keyring (MasterKeyRing, optional): Llavero de claves maestras
+            key_id (str, optional): Id de master_key cuando se proporciona
         """
-        self.master_key = master_key or self._get_master_key()
-        self.algorithm = algorithms.AES(self.master_key)
+        if master_key is not None:
+            keyring = MasterKeyRing({key_id: master_key}, key_id)
+        self.keyring = keyring or get_keyring()
         self.backend = default_backend()
     
-    def _get_master_key(self):
-        """Obtiene la clave maestra desde settings o genera una nueva."""
-        key_from_settings = getattr(settings, 'ENCRYPTION_KEY', None)
-        
-        if key_from_settings:
-            # Si la clave está en base64, decodificarla
-            try:
-                if len(key_from_settings) == 44:  # Base64 de 32 bytes
-                    return base64.b64decode(key_from_settings.encode())
-                elif len(key_from_settings) == 32:  # Ya son 32 bytes
-                    return key_from_settings.encode()
-                else:
-                    raise ValueError("Invalid key length")
-            except Exception:
-                logger.warning("Invalid encryption key in settings, generating new one")
-        
-        # Generar nueva clave si no hay una válida
-        new_key = os.urandom(32)  # 256 bits
-        logger.warning(
-            f"Generated new encryption key: {base64.b64encode(new_key).decode()}"
-        )
-        return new_key
+    @property
+    def key_id(self) -> str:
+        """Id de la clave maestra activa (se guarda en las entradas cifradas)."""
+        return self.keyring.active_key_id
     
-    def generate_key_from_password(self, password: str, salt: bytes = None) -> tuple:
+    @property
+    def master_key(self) -> bytes:
+        """Clave maestra activa."""
+        return self.keyring.key(self.key_id)
+    
+    @property
+    def algorithm(self):
+        """algorithms.AES de la clave maestra activa."""
+        return self.keyring.algorithm(self.key_id)
+    
+    def generate_key_from_password(self, password: str, salt: bytes = None,
+                                   iterations: int = 100000) -> tuple:
         """
         Genera una clave de cifrado derivada de una contraseña usando PBKDF2.
         
         Args:
             password (str): Contraseña del usuario
             salt (bytes, optional): Salt para la derivación. Si no se proporciona, se genera uno nuevo.
+            iterations (int): Iteraciones PBKDF2 (las registradas en la entrada al descifrar)
         
         Returns:
             tuple: (key, salt) - Clave derivada y salt usado
@@ -78,20 +477,79 @@ class AESCrypto:
             algorithm=hashes.SHA256(),
             length=32,  # 256 bits
             salt=salt,
-            iterations=100000,  # OWASP recommended minimum
+            iterations=iterations,  # 100000 por defecto (OWASP recommended minimum)
             backend=self.backend
         )
         
-        key = kdf.derive(password.encode('utf-8'))
+        # En el pool acotado: con la cola llena se lanza KDFBusyError
+        key = kdf_executor.run(kdf.derive, password.encode('utf-8'))
         return key, salt
     
-    def encrypt(self, plaintext: str, user_password: str = None) -> dict:
+    def derive_user_key(self, password: str, salt: bytes, cache_scope: tuple = None,
+                        iterations: int = 100000) -> bytes:
         """
-        Cifra un texto usando AES-256-CBC.
+        Deriva la clave de usuario reutilizando la caché de sesión si es posible.
+        
+        Args:
+            password (str): Contraseña del usuario
+            salt (bytes): Salt de la entrada cifrada
+            cache_scope (tuple, optional): Alcance (usuario, época) del baúl desbloqueado.
+                                         Sin alcance no se consulta ni se llena la caché.
+            iterations (int): Iteraciones PBKDF2 registradas junto al salt
+        
+        Returns:
+            bytes: Clave derivada
+        """
+        if cache_scope is not None:
+            key = derived_key_cache.get(cache_scope, salt, password)
+            if key is not None:
+                return key
+        
+        key, _ = self.generate_key_from_password(password, salt, iterations)
+        
+        if cache_scope is not None:
+            derived_key_cache.set(cache_scope, salt, password, key)
+        return key
+    
+    def _cbc_encrypt(self, key_algorithm, iv: bytes, data: bytes) -> bytes:
+        """Aplica padding PKCS7 y cifra con AES-CBC."""
+        padder = PKCS7(128).padder()
+        padded_data = padder.update(data) + padder.finalize()
+        
+        encryptor = Cipher(key_algorithm, modes.CBC(iv), backend=self.backend).encryptor()
+        return encryptor.update(padded_data) + encryptor.finalize()
+    
+    def _cbc_decrypt(self, key_algorithm, iv: bytes, data: bytes) -> memoryview:
+        """
+        Descifra con AES-CBC y quita el padding PKCS7.
+        
+        Solo el último bloque pasa por el unpadder (que valida en tiempo
+        constante); el resultado es una vista sobre el buffer descifrado, sin copiarlo.
+        """
+        decryptor = Cipher(key_algorithm, modes.CBC(iv), backend=self.backend).decryptor()
+        padded_data = decryptor.update(data)
+        tail = decryptor.finalize()
+        if tail:
+            padded_data += tail
+        
+        unpadder = PKCS7(128).unpadder()
+        last_block = unpadder.update(padded_data[-16:]) + unpadder.finalize()
+        return memoryview(padded_data)[:len(padded_data) - 16 + len(last_block)]
+    
+    def encrypt(self, plaintext: str, user_password: str = None, cache_scope: tuple = None,
+                vault_key: bytes = None, algorithm: str = None, associated_data: bytes = None) -> dict:
+        """
+        Cifra un texto usando AES-256-CBC o AES-256-GCM.
         
         Args:
             plaintext (str): Texto a cifrar
             user_password (str, optional): Contraseña del usuario para cifrado adicional
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            vault_key (bytes, optional): Clave del baúl del usuario (formato 2.0).
+                                       Tiene prioridad sobre user_password.
+            algorithm (str, optional): ALGORITHM_GCM para cifrado autenticado con la clave
+                                     del baúl. Por defecto se usa CBC.
+            associated_data (bytes, optional): Metadatos autenticados (solo GCM)
         
         Returns:
             dict: Diccionario con datos cifrados y metadatos
@@ -103,155 +561,688 @@ class AESCrypto:
             else:
                 plaintext_bytes = plaintext
             
+            if algorithm == ALGORITHM_GCM:
+                if not vault_key:
+                    raise ValueError("Vault key required for AES-256-GCM encryption")
+                
+                # Una sola pasada, sin padding; el tag autentica texto y metadatos
+                nonce = os.urandom(12)  # 96 bits recomendados para GCM
+                ciphertext = AESGCM(vault_key).encrypt(nonce, plaintext_bytes, associated_data)
+                
+                return {
+                    'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+                    'iv': base64.b64encode(nonce).decode('utf-8'),
+                    'algorithm': ALGORITHM_GCM,
+                    'version': VAULT_KEY_VERSION
+                }
+            
             # Generar IV aleatorio
             iv = os.urandom(16)  # 128 bits para AES
             
-            # Si se proporciona contraseña de usuario, usar cifrado en capas
-            if user_password:
-                # Primera capa: cifrado con clave derivada de contraseña
-                user_key, salt = self.generate_key_from_password(user_password)
-                cipher_user = Cipher(algorithms.AES(user_key), modes.CBC(iv), backend=self.backend)
-                encryptor_user = cipher_user.encryptor()
-                
-                # Padding para AES
-                padder = PKCS7(128).padder()
-                padded_data = padder.update(plaintext_bytes) + padder.finalize()
-                
-                # Cifrar con clave de usuario
-                first_layer = encryptor_user.update(padded_data) + encryptor_user.finalize()
+            if vault_key:
+                # Formato 2.0: primera capa con la clave del baúl, sin KDF por entrada
+                first_layer = self._cbc_encrypt(algorithms.AES(vault_key), iv, plaintext_bytes)
                 
                 # Segunda capa: cifrado con clave maestra
                 iv2 = os.urandom(16)
-                cipher_master = Cipher(self.algorithm, modes.CBC(iv2), backend=self.backend)
-                encryptor_master = cipher_master.encryptor()
+                ciphertext = self._cbc_encrypt(self.algorithm, iv2, first_layer)
                 
-                # Padding para segunda capa
-                padder2 = PKCS7(128).padder()
-                padded_first_layer = padder2.update(first_layer) + padder2.finalize()
+                return {
+                    'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+                    'iv': base64.b64encode(iv).decode('utf-8'),
+                    'iv2': base64.b64encode(iv2).decode('utf-8'),
+                    'algorithm': ALGORITHM_CBC_DOUBLE,
+                    'version': VAULT_KEY_VERSION,
+                    'key_id': self.key_id
+                }
+            elif user_password:
+                # Primera capa: cifrado con clave derivada de contraseña
+                user_key, salt = self.generate_key_from_password(user_password)
+                if cache_scope is not None:
+                    # Salt nuevo: se cachea para que la próxima lectura no repita el KDF
+                    derived_key_cache.set(cache_scope, salt, user_password, user_key)
+                first_layer = self._cbc_encrypt(algorithms.AES(user_key), iv, plaintext_bytes)
                 
-                # Cifrado final
-                ciphertext = encryptor_master.update(padded_first_layer) + encryptor_master.finalize()
+                # Segunda capa: cifrado con clave maestra
+                iv2 = os.urandom(16)
+                ciphertext = self._cbc_encrypt(self.algorithm, iv2, first_layer)
                 
                 return {
                     'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
                     'iv': base64.b64encode(iv).decode('utf-8'),
                     'iv2': base64.b64encode(iv2).decode('utf-8'),
                     'salt': base64.b64encode(salt).decode('utf-8'),
-                    'algorithm': 'AES-256-CBC-DOUBLE',
+                    'algorithm': ALGORITHM_CBC_DOUBLE,
                     'iterations': 100000,
-                    'version': '1.0'
+                    'version': LEGACY_VERSION,
+                    'key_id': self.key_id
                 }
             else:
                 # Cifrado simple con clave maestra
-                cipher = Cipher(self.algorithm, modes.CBC(iv), backend=self.backend)
-                encryptor = cipher.encryptor()
-                
-                # Padding
-                padder = PKCS7(128).padder()
-                padded_data = padder.update(plaintext_bytes) + padder.finalize()
-                
-                # Cifrar
-                ciphertext = encryptor.update(padded_data) + encryptor.finalize()
+                ciphertext = self._cbc_encrypt(self.algorithm, iv, plaintext_bytes)
                 
                 return {
                     'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
                     'iv': base64.b64encode(iv).decode('utf-8'),
-                    'algorithm': 'AES-256-CBC',
-                    'version': '1.0'
+                    'algorithm': ALGORITHM_CBC,
+                    'version': LEGACY_VERSION,
+                    'key_id': self.key_id
                 }
                 
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f"Encryption error: {str(e)}")
             raise ValidationError(f"Error durante el cifrado: {str(e)}")
     
-    def decrypt(self, encrypted_data: dict, user_password: str = None) -> str:
+    def _resolve_user_key(self, parsed: dict, user_password: str = None,
+                          cache_scope: tuple = None, vault_key: bytes = None):
+        """
+        Determina la clave de la capa de usuario según el formato de la entrada.
+        
+        Args:
+            parsed (dict): Entrada normalizada por parse_encrypted()
+        
+        Returns:
+            bytes: Clave de usuario, o None si la entrada solo usa la clave maestra
+        """
+        algorithm = parsed['algorithm']
+        
+        if algorithm == ALGORITHM_GCM:
+            if not vault_key:
+                raise ValueError("Vault key required for AES-256-GCM decryption")
+            return vault_key
+        
+        if algorithm != ALGORITHM_CBC_DOUBLE:
+            return None
+        
+        if parsed['version'] == VAULT_KEY_VERSION:
+            if not vault_key:
+                raise ValueError("Vault key required for version 2.0 decryption")
+            return vault_key
+        
+        if not user_password:
+            raise ValueError("User password required for double-layer decryption")
+        return self.derive_user_key(
+            user_password, bytes(parsed['salt']), cache_scope, parsed.get('iterations', 100000)
+        )
+    
+    def _decrypt_bytes(self, parsed: dict, user_key: bytes = None,
+                       associated_data: bytes = None) -> bytes:
+        """
+        Descifra una entrada normalizada con la clave de usuario ya resuelta.
+        Los campos pueden ser memoryviews sobre el sobre binario: no se copian.
+        """
+        ciphertext = parsed['ciphertext']
+        iv = parsed['iv']
+        algorithm = parsed['algorithm']
+        
+        if algorithm == ALGORITHM_GCM:
+            # InvalidTag si el texto o los metadatos fueron alterados
+            return AESGCM(user_key).decrypt(iv, ciphertext, associated_data)
+        
+        # Clave maestra con la que se cifró la entrada (las anteriores al llavero no tienen id)
+        master_algorithm = self.keyring.algorithm(parsed.get('key_id'))
+        
+        if algorithm == ALGORITHM_CBC_DOUBLE:
+            # Primera capa: descifrar con clave maestra
+            first_layer = self._cbc_decrypt(master_algorithm, parsed['iv2'], ciphertext)
+            
+            # Segunda capa: descifrar con clave de usuario
+            return self._cbc_decrypt(algorithms.AES(user_key), iv, first_layer)
+        
+        # Descifrado simple
+        return self._cbc_decrypt(master_algorithm, iv, ciphertext)
+    
+    def decrypt(self, encrypted_data, user_password: str = None, cache_scope: tuple = None,
+                vault_key: bytes = None, associated_data: bytes = None) -> str:
         """
         Descifra datos cifrados.
         
         Args:
-            encrypted_data (dict): Datos cifrados del método encrypt()
+            encrypted_data (dict | bytes): Datos cifrados del método encrypt(), o su
+                                         sobre binario generado por pack_envelope()
             user_password (str, optional): Contraseña del usuario si se usó cifrado en capas
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            vault_key (bytes, optional): Clave del baúl, requerida para el formato 2.0
+            associated_data (bytes, optional): Metadatos autenticados usados al cifrar (GCM)
         
         Returns:
             str: Texto descifrado
         """
+        plaintext = self._decrypt_buffer(
+            encrypted_data, user_password, cache_scope, vault_key, associated_data
+        )
         try:
-            # Extraer datos
-            ciphertext = base64.b64decode(encrypted_data['ciphertext'].encode('utf-8'))
-            iv = base64.b64decode(encrypted_data['iv'].encode('utf-8'))
-            algorithm = encrypted_data.get('algorithm', 'AES-256-CBC')
-            
-            if algorithm == 'AES-256-CBC-DOUBLE':
-                if not user_password:
-                    raise ValueError("User password required for double-layer decryption")
-                
-                # Descifrado en capas
-                iv2 = base64.b64decode(encrypted_data['iv2'].encode('utf-8'))
-                salt = base64.b64decode(encrypted_data['salt'].encode('utf-8'))
-                
-                # Primera capa: descifrar con clave maestra
-                cipher_master = Cipher(self.algorithm, modes.CBC(iv2), backend=self.backend)
-                decryptor_master = cipher_master.decryptor()
-                first_layer_padded = decryptor_master.update(ciphertext) + decryptor_master.finalize()
-                
-                # Quitar padding
-                unpadder = PKCS7(128).unpadder()
-                first_layer = unpadder.update(first_layer_padded) + unpadder.finalize()
-                
-                # Segunda capa: descifrar con clave de usuario
-                user_key, _ = self.generate_key_from_password(user_password, salt)
-                cipher_user = Cipher(algorithms.AES(user_key), modes.CBC(iv), backend=self.backend)
-                decryptor_user = cipher_user.decryptor()
-                plaintext_padded = decryptor_user.update(first_layer) + decryptor_user.finalize()
-                
-                # Quitar padding final
-                unpadder2 = PKCS7(128).unpadder()
-                plaintext_bytes = unpadder2.update(plaintext_padded) + unpadder2.finalize()
-                
-            else:
-                # Descifrado simple
-                cipher = Cipher(self.algorithm, modes.CBC(iv), backend=self.backend)
-                decryptor = cipher.decryptor()
-                plaintext_padded = decryptor.update(ciphertext) + decryptor.finalize()
-                
-                # Quitar padding
-                unpadder = PKCS7(128).unpadder()
-                plaintext_bytes = unpadder.update(plaintext_padded) + unpadder.finalize()
-            
-            return plaintext_bytes.decode('utf-8')
+            return str(plaintext, 'utf-8')
+        except UnicodeDecodeError as e:
+            logger.error(f"Decryption error: {str(e)}")
+            raise ValidationError(f"Error durante el descifrado: {str(e)}")
+    
+    def decrypt_bytes(self, encrypted_data, user_password: str = None, cache_scope: tuple = None,
+                      vault_key: bytes = None, associated_data: bytes = None) -> bytes:
+        """
+        Descifra datos cifrados sin decodificarlos como texto.
+        Acepta los mismos argumentos que decrypt().
+        
+        Returns:
+            bytes: Datos descifrados
+        """
+        return bytes(self._decrypt_buffer(
+            encrypted_data, user_password, cache_scope, vault_key, associated_data
+        ))
+    
+    def _decrypt_buffer(self, encrypted_data, user_password: str = None, cache_scope: tuple = None,
+                        vault_key: bytes = None, associated_data: bytes = None):
+        """
+        Descifra sin copias adicionales: en CBC retorna una memoryview sobre el
+        buffer descifrado (ver _cbc_decrypt) y en GCM los bytes de AESGCM.
+        
+        Returns:
+            bytes | memoryview: Datos descifrados
+        """
+        try:
+            parsed = parse_encrypted(encrypted_data)
+            user_key = self._resolve_user_key(parsed, user_password, cache_scope, vault_key)
+            return self._decrypt_bytes(parsed, user_key, associated_data)
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f"Decryption error: {str(e)}")
             raise ValidationError(f"Error durante el descifrado: {str(e)}")
     
-    def encrypt_json(self, data: dict, user_password: str = None) -> dict:
+    def decrypt_many(self, encrypted_items: list, user_password: str = None, workers: int = None,
+                     cache_scope: tuple = None, vault_key: bytes = None,
+                     associated_data: list = None, raw: bool = False) -> list:
+        """
+        Descifra varias entradas en paralelo.
+        
+        La clave de usuario se deriva una sola vez por salt distinto (formato 1.0) y el
+        descifrado se reparte en un pool de hilos; OpenSSL libera el GIL durante AES.
+        
+        Args:
+            encrypted_items (list): Datos cifrados (JSON o sobres binarios)
+            user_password (str, optional): Contraseña del usuario
+            workers (int, optional): Número de hilos. Por defecto VAULT_DECRYPT_WORKERS
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            vault_key (bytes, optional): Clave del baúl para entradas 2.0
+            associated_data (list, optional): Metadatos autenticados por entrada (GCM),
+                                            alineados con encrypted_items
+            raw (bool): Retornar el buffer descifrado (bytes o memoryview) sin decodificarlo
+        
+        Returns:
+            list: Tuplas (texto, error) en el mismo orden que la entrada.
+                  Si una entrada falla, texto es None y error describe el problema.
+        """
+        if not encrypted_items:
+            return []
+        
+        workers = workers or getattr(settings, 'VAULT_DECRYPT_WORKERS', min(8, os.cpu_count() or 1))
+        
+        parsed_items = []
+        for encrypted_data in encrypted_items:
+            try:
+                parsed_items.append(parse_encrypted(encrypted_data))
+            except Exception as e:
+                parsed_items.append(e)
+        
+        # Salts distintos de entradas 1.0: un solo KDF por salt
+        salts = {
+            bytes(parsed['salt']): parsed.get('iterations', 100000)
+            for parsed in parsed_items
+            if isinstance(parsed, dict) and self._needs_password_key(parsed)
+        }
+        
+        def derive(salt):
+            return self.derive_user_key(user_password, salt, cache_scope, salts[salt])
+        
+        def decrypt_one(parsed, aad):
+            if isinstance(parsed, Exception):
+                raise parsed
+            if self._needs_password_key(parsed):
+                user_key = derived_keys[bytes(parsed['salt'])]
+                if isinstance(user_key, Exception):
+                    raise user_key
+            else:
+                user_key = self._resolve_user_key(parsed, user_password, cache_scope, vault_key)
+            plaintext = self._decrypt_bytes(parsed, user_key, aad)
+            return plaintext if raw else str(plaintext, 'utf-8')
+        
+        derived_keys = {}
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            if salts and not user_password:
+                error = ValueError("User password required for double-layer decryption")
+                derived_keys = {salt: error for salt in salts}
+            elif salts:
+                futures = {salt: pool.submit(derive, salt) for salt in salts}
+                for salt, future in futures.items():
+                    try:
+                        derived_keys[salt] = future.result()
+                    except KDFBusyError:
+                        # La petición completa se responde con 503 (KDFBusyMiddleware)
+                        raise
+                    except Exception as e:
+                        derived_keys[salt] = e
+            
+            aads = associated_data or [None] * len(parsed_items)
+            futures = [
+                pool.submit(decrypt_one, parsed, aad)
+                for parsed, aad in zip(parsed_items, aads)
+            ]
+            for index, future in enumerate(futures):
+                try:
+                    results.append((future.result(), None))
+                except KDFBusyError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Decryption error in batch item {index}: {str(e)}")
+                    results.append((None, f"Error durante el descifrado: {str(e)}"))
+        
+        return results
+    
+    def _needs_password_key(self, parsed: dict) -> bool:
+        """Indica si la entrada requiere derivar una clave desde la contraseña (formato 1.0)."""
+        return (
+            parsed['algorithm'] == ALGORITHM_CBC_DOUBLE
+            and parsed['version'] == LEGACY_VERSION
+            and 'salt' in parsed
+        )
+    
+    def encrypt_json(self, data: dict, user_password: str = None, cache_scope: tuple = None,
+                     vault_key: bytes = None, algorithm: str = None,
+                     associated_data: bytes = None) -> dict:
         """
         Cifra un diccionario completo serializándolo a JSON.
         
         Args:
             data (dict): Diccionario a cifrar
             user_password (str, optional): Contraseña del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            vault_key (bytes, optional): Clave del baúl del usuario
+            algorithm (str, optional): Algoritmo a usar (ver encrypt())
+            associated_data (bytes, optional): Metadatos autenticados (solo GCM)
         
         Returns:
             dict: Datos cifrados
         """
-        json_string = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
-        return self.encrypt(json_string, user_password)
+        return self.encrypt(
+            dumps_json(data), user_password, cache_scope, vault_key, algorithm, associated_data
+        )
     
-    def decrypt_json(self, encrypted_data: dict, user_password: str = None) -> dict:
+    def decrypt_json(self, encrypted_data: dict, user_password: str = None, cache_scope: tuple = None,
+                     vault_key: bytes = None, associated_data: bytes = None) -> dict:
         """
         Descifra y deserializa datos JSON cifrados.
         
         Args:
             encrypted_data (dict): Datos cifrados
             user_password (str, optional): Contraseña del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            vault_key (bytes, optional): Clave del baúl del usuario
+            associated_data (bytes, optional): Metadatos autenticados usados al cifrar (GCM)
         
         Returns:
             dict: Diccionario descifrado
         """
-        json_string = self.decrypt(encrypted_data, user_password)
-        return json.loads(json_string)
+        try:
+            # Sin referencia local: loads_json puede liberar el buffer descifrado
+            return loads_json(self._decrypt_buffer(
+                encrypted_data, user_password, cache_scope, vault_key, associated_data
+            ))
+        except ValueError as e:
+            logger.error(f"Decryption error: {str(e)}")
+            raise ValidationError(f"Error durante el descifrado: {str(e)}")
+    
+    def encrypt_fields(self, segments: dict, vault_key: bytes, associated_data: bytes = None) -> dict:
+        """
+        Cifra un documento por campos (formato 3.0).
+        
+        Cada segmento se serializa y se sella por separado con AES-256-GCM y la
+        clave del baúl, así que después se puede leer o reemplazar uno solo. El
+        segmento de metadatos lleva además el manifiesto: los nombres de los
+        segmentos y la revisión en que se selló cada uno, que forma parte de sus
+        metadatos autenticados. Así no se puede quitar, añadir ni sustituir por
+        una copia anterior ningún segmento sin que falle el descifrado.
+        
+        Args:
+            segments (dict): Nombre del segmento -> valor serializable a JSON
+            vault_key (bytes): Clave del baúl del usuario
+            associated_data (bytes, optional): Metadatos autenticados de la entrada
+        
+        Returns:
+            dict: Documento cifrado
+        """
+        try:
+            return self._fields_document(segments, {}, 1, vault_key, associated_data)
+        except Exception as e:
+            logger.error(f"Encryption error: {str(e)}")
+            raise ValidationError(f"Error durante el cifrado: {str(e)}")
+    
+    def _fields_document(self, changes: dict, kept: dict, revision: int, vault_key: bytes,
+                         associated_data: bytes = None, order: list = None) -> dict:
+        """
+        Sella los segmentos modificados con la revisión indicada y el manifiesto.
+        
+        Args:
+            changes (dict): Nombre del segmento -> nuevo valor (META_SEGMENT: metadatos)
+            kept (dict): Nombre -> (segmento sellado, revisión) de los que no cambian
+            revision (int): Revisión del documento tras el cambio
+            order (list, optional): Orden de los segmentos existentes
+        """
+        if not vault_key:
+            raise ValueError("Vault key required for field-level encryption")
+        aesgcm = AESGCM(vault_key)
+        
+        def seal(name, value, segment_revision):
+            nonce = os.urandom(12)
+            ciphertext = aesgcm.encrypt(
+                nonce, dumps_json(value),
+                segment_associated_data(associated_data, name, segment_revision)
+            )
+            return {
+                'iv': base64.b64encode(nonce).decode('utf-8'),
+                'ciphertext': base64.b64encode(ciphertext).decode('utf-8'),
+            }
+        
+        sealed = {name: segment for name, (segment, _) in kept.items()}
+        revisions = {name: segment_revision for name, (_, segment_revision) in kept.items()}
+        for name, value in changes.items():
+            if name != META_SEGMENT:
+                sealed[name] = seal(name, value, revision)
+                revisions[name] = revision
+        
+        # Los metadatos se vuelven a sellar siempre: llevan el manifiesto
+        sealed[META_SEGMENT] = seal(META_SEGMENT, {
+            'value': changes.get(META_SEGMENT),
+            'revision': revision,
+            'segments': revisions,
+        }, MANIFEST_REVISION)
+        
+        # Se conserva el orden de los campos; los nuevos van al final
+        order = order or [META_SEGMENT]
+        segments = {name: sealed.pop(name) for name in order if name in sealed}
+        segments.update(sealed)
+        return {'algorithm': ALGORITHM_GCM, 'version': FIELDS_VERSION, 'segments': segments}
+    
+    def _open_manifest(self, aesgcm: AESGCM, segments: dict, associated_data: bytes = None) -> dict:
+        """
+        Descifra el segmento de metadatos y comprueba el conjunto de segmentos.
+        
+        Returns:
+            dict: {'value', 'revision', 'segments'}
+        
+        Raises:
+            ValueError: Si faltan o sobran segmentos respecto al manifiesto
+        """
+        if META_SEGMENT not in segments:
+            raise ValueError("Missing metadata segment")
+        meta = segments[META_SEGMENT]
+        manifest = loads_json(aesgcm.decrypt(
+            meta['iv'], meta['ciphertext'],
+            segment_associated_data(associated_data, META_SEGMENT, MANIFEST_REVISION)
+        ))
+        
+        names = set(segments) - {META_SEGMENT}
+        expected = set(manifest['segments'])
+        if names != expected:
+            raise ValueError(
+                f"Segment set does not match manifest (missing: {sorted(expected - names)}, "
+                f"unexpected: {sorted(names - expected)})"
+            )
+        return manifest
+    
+    def decrypt_fields(self, encrypted_data, vault_key: bytes, associated_data: bytes = None,
+                       names: list = None) -> dict:
+        """
+        Descifra solo los segmentos pedidos de un documento por campos.
+        El segmento de metadatos se descifra siempre para comprobar el manifiesto.
+        
+        Args:
+            encrypted_data (dict | bytes): Documento cifrado (JSON o sobre binario)
+            vault_key (bytes): Clave del baúl del usuario
+            associated_data (bytes, optional): Metadatos autenticados de la entrada
+            names (list, optional): Segmentos a descifrar; por defecto todos.
+                                    Los que no figuran en el manifiesto se omiten.
+        
+        Returns:
+            dict: Nombre del segmento -> valor descifrado
+        
+        Raises:
+            ValidationError: Si el documento fue alterado, incluidos segmentos
+                             eliminados, añadidos o de una revisión anterior
+        """
+        try:
+            parsed = parse_encrypted(encrypted_data)
+            if parsed['version'] != FIELDS_VERSION:
+                raise ValueError("Data is not field-level encrypted")
+            if not vault_key:
+                raise ValueError("Vault key required for field-level decryption")
+            
+            aesgcm = AESGCM(vault_key)
+            segments = parsed['segments']
+            manifest = self._open_manifest(aesgcm, segments, associated_data)
+            revisions = manifest['segments']
+            wanted = segments if names is None else [name for name in names if name in segments]
+            return {
+                name: manifest['value'] if name == META_SEGMENT else loads_json(aesgcm.decrypt(
+                    segments[name]['iv'], segments[name]['ciphertext'],
+                    segment_associated_data(associated_data, name, revisions[name])
+                ))
+                for name in wanted
+            }
+            
+        except Exception as e:
+            logger.error(f"Decryption error: {str(e)}")
+            raise ValidationError(f"Error durante el descifrado: {str(e)}")
     
+    def update_fields(self, encrypted_data, vault_key: bytes, changes: dict,
+                      associated_data: bytes = None, removed: list = ()) -> dict:
+        """
+        Reemplaza segmentos de un documento por campos sin descifrar el resto.
+        Los segmentos no modificados se conservan tal cual, todavía cifrados;
+        los metadatos se vuelven a sellar siempre con el manifiesto de la nueva revisión.
+        
+        Args:
+            encrypted_data (dict | bytes): Documento cifrado (JSON o sobre binario)
+            vault_key (bytes): Clave del baúl del usuario
+            changes (dict): Nombre del segmento -> nuevo valor
+            associated_data (bytes, optional): Metadatos autenticados de la entrada
+            removed (list, optional): Segmentos a eliminar
+        
+        Returns:
+            dict: Documento cifrado actualizado
+        """
+        try:
+            if not vault_key:
+                raise ValueError("Vault key required for field-level encryption")
+            parsed = parse_encrypted(encrypted_data)
+            manifest = self._open_manifest(AESGCM(vault_key), parsed['segments'], associated_data)
+            changes = dict(changes)
+            changes.setdefault(META_SEGMENT, manifest['value'])
+            order = list(parsed['segments'])
+            
+            kept = {
+                name: (
+                    {
+                        field: base64.b64encode(bytes(segment[field])).decode('utf-8')
+                        for field in ('iv', 'ciphertext')
+                    },
+                    manifest['segments'][name],
+                )
+                for name, segment in parsed['segments'].items()
+                if name != META_SEGMENT and name not in changes and name not in removed
+            }
+            return self._fields_document(
+                changes, kept, manifest['revision'] + 1, vault_key, associated_data, order
+            )
+            
+        except Exception as e:
+            logger.error(f"Encryption error: {str(e)}")
+            raise ValidationError(f"Error durante el cifrado: {str(e)}")
+    
+    def wrap_vault_key(self, vault_key: bytes, user_password: str = None, cache_scope: tuple = None,
+                       kek: bytes = None) -> dict:
+        """
+        Protege la clave del baúl con la contraseña maestra y la clave del servidor.
+        
+        La clave se envuelve primero (AES Key Wrap, RFC 3394) con una clave de cifrado
+        de claves derivada de la contraseña, y luego con la clave maestra del servidor.
+        
+        Args:
+            vault_key (bytes): Clave aleatoria del baúl (32 bytes)
+            user_password (str, optional): Contraseña maestra del usuario (sobre con salt propio)
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            kek (bytes, optional): Clave de cifrado de claves ya derivada por
+                                 derive_master_keys(); evita un segundo KDF
+        
+        Returns:
+            dict: Sobre de la clave listo para almacenar
+        """
+        try:
+            envelope = {
+                'algorithm': 'AES-KW',
+                'version': VAULT_KEY_VERSION,
+                'key_id': self.key_id
+            }
+            
+            if kek is None:
+                kek, salt = self.generate_key_from_password(user_password)
+                if cache_scope is not None:
+                    derived_key_cache.set(cache_scope, salt, user_password, kek)
+                envelope['salt'] = base64.b64encode(salt).decode('utf-8')
+                envelope['iterations'] = 100000
+            else:
+                # La KEK sale de la misma derivación que el verificador de la contraseña
+                envelope['kdf'] = MASTER_KDF
+            
+            inner = aes_key_wrap(kek, vault_key, self.backend)
+            wrapped = aes_key_wrap(self.master_key, inner, self.backend)
+            envelope['wrapped_key'] = base64.b64encode(wrapped).decode('utf-8')
+            
+            return envelope
+            
+        except KDFBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Key wrap error: {str(e)}")
+            raise ValidationError(f"Error al proteger la clave del baúl: {str(e)}")
+    
+    def unwrap_vault_key(self, envelope: dict, user_password: str = None, cache_scope: tuple = None,
+                         kek: bytes = None) -> bytes:
+        """
+        Recupera la clave del baúl desde su sobre.
+        AES Key Wrap verifica la integridad, así que una contraseña incorrecta falla aquí.
+        
+        Args:
+            envelope (dict): Sobre generado por wrap_vault_key()
+            user_password (str, optional): Contraseña maestra (sobres con salt propio)
+            cache_scope (tuple, optional): Alcance de la caché de claves derivadas
+            kek (bytes, optional): KEK de derive_master_keys() (sobres sin salt propio)
+        
+        Returns:
+            bytes: Clave del baúl
+        """
+        try:
+            wrapped = base64.b64decode(envelope['wrapped_key'].encode('utf-8'))
+            
+            master_key = self.keyring.key(envelope.get('key_id'))
+            inner = aes_key_unwrap(master_key, wrapped, self.backend)
+            
+            if 'salt' in envelope:
+                salt = base64.b64decode(envelope['salt'].encode('utf-8'))
+                kek = self.derive_user_key(
+                    user_password, salt, cache_scope, envelope.get('iterations', 100000)
+                )
+            elif kek is None:
+                raise ValueError("Key-encryption key required for this envelope")
+            return aes_key_unwrap(kek, inner, self.backend)
+            
+        except KDFBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Key unwrap error: {str(e)}")
+            raise ValidationError(f"Error al recuperar la clave del baúl: {str(e)}")
+    
+    def needs_rewrap(self, encrypted_data) -> bool:
+        """
+        Indica si los datos dependen de una clave maestra distinta de la activa.
+        Las entradas AES-256-GCM no tienen capa maestra (la protege el sobre de la clave del baúl).
+        """
+        if isinstance(encrypted_data, dict) and 'wrapped_key' in encrypted_data:
+            key_id = encrypted_data.get('key_id')
+        else:
+            parsed = parse_encrypted(encrypted_data)
+            if parsed['algorithm'] == ALGORITHM_GCM:
+                return False
+            key_id = parsed['key_id']
+        return (key_id or self.keyring.legacy_key_id) != self.key_id
+
+    def rewrap_master_layer(self, encrypted_data) -> dict:
+        """
+        Vuelve a cifrar solo la capa de la clave maestra con la clave activa.
+
+        La capa de usuario no se toca, por lo que no hacen falta contraseñas.
+        En entradas AES-256-CBC simples la capa maestra es la única.
+
+        Args:
+            encrypted_data (dict | bytes): Entrada cifrada (JSON o sobre binario)
+
+        Returns:
+            dict: Entrada con la capa maestra renovada, en formato JSON
+        """
+        parsed = parse_encrypted(encrypted_data)
+        old_algorithm = self.keyring.algorithm(parsed.get('key_id'))
+
+        rewrapped = {
+            'algorithm': parsed['algorithm'],
+            'version': parsed['version'],
+            'key_id': self.key_id,
+        }
+        if parsed['algorithm'] == ALGORITHM_CBC_DOUBLE:
+            inner = self._cbc_decrypt(old_algorithm, parsed['iv2'], parsed['ciphertext'])
+            iv2 = os.urandom(16)
+            rewrapped['ciphertext'] = self._cbc_encrypt(self.algorithm, iv2, inner)
+            rewrapped['iv'] = parsed['iv']
+            rewrapped['iv2'] = iv2
+            if parsed['version'] == LEGACY_VERSION:
+                rewrapped['salt'] = parsed['salt']
+                rewrapped['iterations'] = parsed.get('iterations', 100000)
+        elif parsed['algorithm'] == ALGORITHM_CBC:
+            plaintext = self._cbc_decrypt(old_algorithm, parsed['iv'], parsed['ciphertext'])
+            iv = os.urandom(16)
+            rewrapped['ciphertext'] = self._cbc_encrypt(self.algorithm, iv, plaintext)
+            rewrapped['iv'] = iv
+        else:
+            raise ValueError(f"{parsed['algorithm']} has no master key layer")
+
+        for field in ('ciphertext', 'iv', 'iv2', 'salt'):
+            if field in rewrapped:
+                rewrapped[field] = base64.b64encode(bytes(rewrapped[field])).decode('utf-8')
+        return rewrapped
+
+    def rewrap_vault_key(self, envelope: dict) -> dict:
+        """
+        Vuelve a envolver el sobre de la clave del baúl con la clave maestra activa.
+        La envoltura interna (contraseña del usuario) se conserva intacta.
+
+        Args:
+            envelope (dict): Sobre generado por wrap_vault_key()
+
+        Returns:
+            dict: Sobre con la envoltura externa renovada
+        """
+        wrapped = base64.b64decode(envelope['wrapped_key'].encode('utf-8'))
+        inner = aes_key_unwrap(self.keyring.key(envelope.get('key_id')), wrapped, self.backend)
+        return {
+            **envelope,
+            'wrapped_key': base64.b64encode(
+                aes_key_wrap(self.master_key, inner, self.backend)
+            ).decode('utf-8'),
+            'key_id': self.key_id,
+        }
+
     def generate_secure_token(self, length: int = 32) -> str:
         """
         Genera un token seguro para verificaciones.
@@ -266,22 +1257,85 @@ class AESCrypto:
         return base64.urlsafe_b64encode(token_bytes).decode('utf-8')
 
 
+_keyring = None
+_crypto = None
+_registry_lock = threading.RLock()
+
+
+def get_keyring() -> MasterKeyRing:
+    """Llavero de claves maestras del proceso, construido una sola vez."""
+    global _keyring
+    if _keyring is None:
+        with _registry_lock:
+            if _keyring is None:
+                _keyring = MasterKeyRing.from_settings()
+    return _keyring
+
+
+def get_crypto() -> AESCrypto:
+    """
+    Instancia AESCrypto compartida por el proceso.
+    Evita decodificar la clave y construir los objetos AES en cada petición.
+    """
+    global _crypto
+    if _crypto is None:
+        with _registry_lock:
+            if _crypto is None:
+                _crypto = AESCrypto(keyring=get_keyring())
+    return _crypto
+
+
+def reset_crypto():
+    """Descarta el llavero y la instancia compartida (cambio de configuración)."""
+    global _keyring, _crypto
+    with _registry_lock:
+        _keyring = None
+        _crypto = None
+
+
 class VaultEntry:
     """
     Representa una entrada en el baúl de contraseñas cifrado.
     Similar a las entradas de Bitwarden.
     """
     
-    def __init__(self, crypto_instance: AESCrypto = None):
-        self.crypto = crypto_instance or AESCrypto()
+    def __init__(self, crypto_instance: AESCrypto = None, cache_scope: tuple = None,
+                 vault_key: bytes = None):
+        self.crypto = crypto_instance or get_crypto()
+        # Alcance (usuario, época) del baúl desbloqueado para reutilizar claves derivadas
+        self.cache_scope = cache_scope
+        # Clave del baúl del usuario; si existe, las entradas nuevas usan el formato 2.0
+        self.vault_key = vault_key
+        # Algoritmo para entradas nuevas cuando hay clave del baúl
+        self.algorithm = (
+            getattr(settings, 'VAULT_ENCRYPTION_ALGORITHM', ALGORITHM_GCM) if vault_key else None
+        )
+        # Con GCM las entradas se guardan por campos (3.0): cada campo se sella por separado
+        self.field_level = (
+            self.algorithm == ALGORITHM_GCM
+            and getattr(settings, 'VAULT_FIELD_ENCRYPTION', True)
+        )
     
-    def create_entry(self, user_password: str, entry_data: dict) -> dict:
+    def is_legacy(self, encrypted_entry) -> bool:
+        """
+        Indica si una entrada usa el formato 1.0 con salt y PBKDF2 por entrada.
+        
+        Args:
+            encrypted_entry (dict | bytes): Entrada cifrada (JSON o sobre binario)
+        
+        Returns:
+            bool: True si la entrada debería migrarse al formato con clave del baúl
+        """
+        return describe_encrypted(encrypted_entry) == (ALGORITHM_CBC_DOUBLE, LEGACY_VERSION)
+    
+    def create_entry(self, user_password: str, entry_data: dict, associated_data: bytes = None) -> dict:
         """
         Crea una nueva entrada cifrada en el baúl.
         
         Args:
             user_password (str): Contraseña maestra del usuario
             entry_data (dict): Datos de la entrada (nombre, username, password, url, notas, etc.)
+            associated_data (bytes, optional): Metadatos autenticados (ver item_associated_data)
         
         Returns:
             dict: Entrada cifrada lista para almacenar
@@ -335,37 +1389,184 @@ class VaultEntry:
                 'address': entry_data.get('address', ''),
                 'notes': entry_data.get('notes', '')
             }
+        elif entry_data['type'] == 'file':
+            # El contenido vive en el almacén de archivos; aquí solo su clave y metadatos
+            vault_entry['data'] = {
+                'file_id': entry_data.get('file_id', ''),
+                'file_key': entry_data.get('file_key', ''),
+                'filename': entry_data.get('filename', ''),
+                'content_type': entry_data.get('content_type', ''),
+                'size': entry_data.get('size', 0),
+                'notes': entry_data.get('notes', '')
+            }
+
+        return self.seal_entry(vault_entry, user_password, associated_data)
+    
+    def seal_entry(self, vault_entry: dict, user_password: str, associated_data: bytes = None):
+        """
+        Cifra una entrada ya estructurada en el formato de las entradas nuevas.
+        
+        Args:
+            vault_entry (dict): Entrada con metadatos y sección 'data'
+            user_password (str): Contraseña maestra del usuario
+            associated_data (bytes, optional): Metadatos autenticados de la entrada
+        
+        Returns:
+            dict: Entrada cifrada (por campos con GCM, o un único bloque JSON)
+        """
+        if self.field_level:
+            meta = {key: value for key, value in vault_entry.items() if key != 'data'}
+            return self.crypto.encrypt_fields(
+                {META_SEGMENT: meta, **vault_entry['data']}, self.vault_key, associated_data
+            )
         
         # Cifrar la entrada completa
-        return self.crypto.encrypt_json(vault_entry, user_password)
+        return self.crypto.encrypt_json(
+            vault_entry, user_password, self.cache_scope, self.vault_key,
+            self.algorithm, associated_data
+        )
     
-    def decrypt_entry(self, encrypted_entry: dict, user_password: str) -> dict:
+    def decrypt_entry(self, encrypted_entry, user_password: str,
+                      associated_data: bytes = None, fields: list = None) -> dict:
         """
         Descifra una entrada del baúl.
+        Lee entradas 1.0 (salt por entrada), 2.0 (clave del baúl) y 3.0 (por campos).
         
         Args:
-            encrypted_entry (dict): Entrada cifrada
+            encrypted_entry (dict | bytes): Entrada cifrada (JSON o sobre binario)
             user_password (str): Contraseña maestra del usuario
+            associated_data (bytes, optional): Metadatos autenticados usados al cifrar
+            fields (list, optional): Campos de 'data' a devolver. En entradas por
+                                   campos solo se descifran esos segmentos.
         
         Returns:
             dict: Entrada descifrada
         """
-        return self.crypto.decrypt_json(encrypted_entry, user_password)
+        if is_field_encrypted(encrypted_entry):
+            names = None if fields is None else [META_SEGMENT, *fields]
+            segments = self.crypto.decrypt_fields(
+                encrypted_entry, self.vault_key, associated_data, names
+            )
+            entry = segments.pop(META_SEGMENT)
+            entry['data'] = segments
+            return entry
+        
+        entry = self.crypto.decrypt_json(
+            encrypted_entry, user_password, self.cache_scope, self.vault_key, associated_data
+        )
+        if fields is not None:
+            entry['data'] = {
+                key: value for key, value in entry.get('data', {}).items() if key in fields
+            }
+        return entry
+    
+    def decrypt_field(self, encrypted_entry, user_password: str, field: str,
+                      associated_data: bytes = None):
+        """
+        Descifra un único campo de 'data'.
+        En entradas por campos solo se abren ese segmento y el manifiesto de los metadatos.
+        
+        Args:
+            encrypted_entry (dict | bytes): Entrada cifrada (JSON o sobre binario)
+            user_password (str): Contraseña maestra del usuario
+            field (str): Nombre del campo
+            associated_data (bytes, optional): Metadatos autenticados usados al cifrar
+        
+        Returns:
+            Valor descifrado del campo
+        
+        Raises:
+            KeyError: Si la entrada no tiene ese campo
+        """
+        if field == META_SEGMENT:
+            raise KeyError(field)
+        if is_field_encrypted(encrypted_entry):
+            segments = self.crypto.decrypt_fields(
+                encrypted_entry, self.vault_key, associated_data, [field]
+            )
+            return segments[field]
+        return self.decrypt_entry(encrypted_entry, user_password, associated_data)['data'][field]
+    
+    def decrypt_many(self, encrypted_entries: list, user_password: str, workers: int = None,
+                     associated_data: list = None) -> list:
+        """
+        Descifra varias entradas del baúl en paralelo.
+        
+        Args:
+            encrypted_entries (list): Entradas cifradas
+            user_password (str): Contraseña maestra del usuario
+            workers (int, optional): Número de hilos del pool
+            associated_data (list, optional): Metadatos autenticados por entrada
+        
+        Returns:
+            list: Tuplas (entrada, error) en el mismo orden que la entrada
+        """
+        aads = associated_data or [None] * len(encrypted_entries)
+        results = [None] * len(encrypted_entries)
+        
+        # Las entradas por campos son GCM con la clave del baúl: se descifran aquí directamente
+        batch = []
+        for index, encrypted_entry in enumerate(encrypted_entries):
+            if not is_field_encrypted(encrypted_entry):
+                batch.append(index)
+                continue
+            try:
+                results[index] = (
+                    self.decrypt_entry(encrypted_entry, user_password, aads[index]), None
+                )
+            except ValidationError as e:
+                results[index] = (None, e.messages[0])
+            except Exception as e:
+                results[index] = (None, f"Error durante el descifrado: {str(e)}")
+        
+        decrypted = self.crypto.decrypt_many(
+            [encrypted_entries[index] for index in batch], user_password, workers,
+            self.cache_scope, self.vault_key, [aads[index] for index in batch], raw=True
+        )
+        for index, (plaintext, error) in zip(batch, decrypted):
+            if error:
+                results[index] = (None, error)
+                continue
+            try:
+                results[index] = (loads_json(plaintext), None)
+            except ValueError as e:
+                results[index] = (None, f"Error al deserializar la entrada: {str(e)}")
+        return results
     
-    def update_entry(self, encrypted_entry: dict, user_password: str, updates: dict) -> dict:
+    def update_entry(self, encrypted_entry: dict, user_password: str, updates: dict,
+                     associated_data: bytes = None) -> dict:
         """
         Actualiza una entrada existente.
+        En entradas por campos solo se vuelven a cifrar los campos modificados y los metadatos.
         
         Args:
             encrypted_entry (dict): Entrada cifrada existente
             user_password (str): Contraseña maestra del usuario
             updates (dict): Datos a actualizar
+            associated_data (bytes, optional): Metadatos autenticados de la entrada
         
         Returns:
             dict: Entrada actualizada y cifrada
         """
+        from django.utils import timezone
+        
+        if self.field_level and is_field_encrypted(encrypted_entry):
+            # Solo se descifran los metadatos y se vuelven a sellar los campos modificados
+            meta = self.crypto.decrypt_fields(
+                encrypted_entry, self.vault_key, associated_data, [META_SEGMENT]
+            )[META_SEGMENT]
+            changes = dict(updates.get('data', {}))
+            for key, value in updates.items():
+                if key != 'data':
+                    meta[key] = value
+            meta['updated_at'] = timezone.now().isoformat()
+            changes[META_SEGMENT] = meta
+            return self.crypto.update_fields(
+                encrypted_entry, self.vault_key, changes, associated_data
+            )
+        
         # Descifrar entrada existente
-        current_entry = self.decrypt_entry(encrypted_entry, user_password)
+        current_entry = self.decrypt_entry(encrypted_entry, user_password, associated_data)
         
         # Aplicar actualizaciones
         for key, value in updates.items():
@@ -376,11 +1577,35 @@ class VaultEntry:
                 current_entry[key] = value
         
         # Actualizar timestamp
-        from django.utils import timezone
         current_entry['updated_at'] = timezone.now().isoformat()
         
-        # Cifrar y retornar
-        return self.crypto.encrypt_json(current_entry, user_password)
+        # Cifrar y retornar (con clave del baúl, la entrada queda en el formato actual)
+        return self.seal_entry(current_entry, user_password, associated_data)
+
+
+def item_associated_data(item_id, item_type: str) -> bytes:
+    """
+    Construye los metadatos autenticados (AAD) de una entrada para AES-GCM.
+    Vincula el texto cifrado a la fila: no puede moverse a otra entrada ni cambiar de tipo.
+    
+    Args:
+        item_id: Identificador de la entrada (VaultItem.id)
+        item_type (str): Tipo de entrada ('login', 'note', ...)
+    
+    Returns:
+        bytes: Datos asociados
+    """
+    return f'{item_id}|{item_type}'.encode('utf-8')
+
+
+def generate_vault_key() -> bytes:
+    """
+    Genera una clave aleatoria para el baúl de un usuario.
+    
+    Returns:
+        bytes: Clave de 256 bits
+    """
+    return os.urandom(32)
 
 
 def generate_encryption_key() -> str:
@@ -398,7 +1623,7 @@ def test_encryption():
     """
     Función de prueba para verificar el funcionamiento del cifrado.
     """
-    crypto = AESCrypto()
+    crypto = get_crypto()
     
     # Datos de prueba
     test_data = {
@@ -0,0 +1,169 @@
+"""
+Almacenamiento cifrado en disco para entradas de tipo 'file'.
+
+Los archivos se cifran por bloques de tamaño fijo con AES-256-GCM, de modo que
+el cifrado y el descifrado usan memoria constante y se pueden leer rangos sin
+descifrar el archivo completo.
+
+Formato en disco:
+    cabecera (16 bytes): MAGIC (4) | tamaño de bloque (4) | prefijo de nonce (8)
+    bloques: texto cifrado (<= tamaño de bloque) | tag GCM (16)
+
+Cada bloque usa nonce = prefijo || contador y autentica como datos asociados el
+id del archivo, el índice del bloque y si es el último, lo que impide reordenar,
+mezclar o truncar bloques.
+"""
+
+import logging
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SVF1'
+HEADER_SIZE = 16
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class EncryptedFileStore:
+    """
+    Almacén de archivos cifrados por bloques autenticados.
+    """
+
+    def __init__(self, root=None, chunk_size: int = None):
+        self.root = Path(root or getattr(settings, 'VAULT_FILE_STORE_ROOT', settings.BASE_DIR / 'vault_files'))
+        self.chunk_size = chunk_size or getattr(settings, 'VAULT_FILE_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    def path(self, file_id: str) -> Path:
+        """Ruta del archivo cifrado; se reparte en subdirectorios por prefijo."""
+        if not file_id.isalnum():
+            raise ValueError('Invalid file id')
+        return self.root / file_id[:2] / file_id
+
+    def _associated_data(self, file_id: str, index: int, final: bool) -> bytes:
+        return file_id.encode('ascii') + struct.pack('>IB', index, 1 if final else 0)
+
+    def write(self, file_id: str, fileobj, key: bytes) -> int:
+        """
+        Cifra un archivo desde un objeto file-like, bloque a bloque.
+
+        Args:
+            file_id (str): Identificador alfanumérico del archivo
+            fileobj: Objeto con read(n) (p. ej. UploadedFile)
+            key (bytes): Clave AES-256 del archivo
+
+        Returns:
+            int: Tamaño del archivo en claro
+        """
+        aesgcm = AESGCM(key)
+        nonce_prefix = os.urandom(8)
+        destination = self.path(file_id)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+
+        size = 0
+        index = 0
+        # Se escribe en un temporal y se renombra: nunca queda un archivo a medias
+        fd, tmp_path = tempfile.mkstemp(dir=destination.parent, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                output.write(MAGIC + struct.pack('>I', self.chunk_size) + nonce_prefix)
+
+                chunk = fileobj.read(self.chunk_size)
+                while True:
+                    # Se lee un bloque por adelantado para saber cuál es el último
+                    next_chunk = fileobj.read(self.chunk_size) if chunk else b''
+                    final = not next_chunk
+                    nonce = nonce_prefix + struct.pack('>I', index)
+                    output.write(aesgcm.encrypt(
+                        nonce, chunk, self._associated_data(file_id, index, final)
+                    ))
+                    size += len(chunk)
+                    index += 1
+                    if final:
+                        break
+                    chunk = next_chunk
+
+            os.replace(tmp_path, destination)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.info(f'Encrypted file stored: {file_id} ({size} bytes, {index} chunks)')
+        return size
+
+    def _layout(self, handle) -> tuple:
+        """Lee la cabecera y calcula (tamaño de bloque, prefijo, nº de bloques, tamaño en claro)."""
+        header = handle.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+            raise ValueError('Invalid encrypted file header')
+        chunk_size = struct.unpack('>I', header[4:8])[0]
+        nonce_prefix = header[8:16]
+
+        encrypted_size = os.fstat(handle.fileno()).st_size - HEADER_SIZE
+        stored_chunk = chunk_size + TAG_SIZE
+        chunks = max(1, -(-encrypted_size // stored_chunk))
+        plaintext_size = encrypted_size - chunks * TAG_SIZE
+        return chunk_size, nonce_prefix, chunks, plaintext_size
+
+    def size(self, file_id: str) -> int:
+        """Tamaño en claro del archivo, calculado sin descifrar."""
+        with open(self.path(file_id), 'rb') as handle:
+            return self._layout(handle)[3]
+
+    def read_range(self, file_id: str, key: bytes, start: int = 0, end: int = None):
+        """
+        Descifra un rango de bytes [start, end] (inclusivo) con memoria constante.
+
+        Solo se leen y descifran los bloques que contienen el rango.
+
+        Args:
+            file_id (str): Identificador del archivo
+            key (bytes): Clave AES-256 del archivo
+            start (int): Primer byte a devolver
+            end (int, optional): Último byte a devolver (por defecto, el final)
+
+        Yields:
+            bytes: Fragmentos de texto en claro
+        """
+        aesgcm = AESGCM(key)
+        with open(self.path(file_id), 'rb') as handle:
+            chunk_size, nonce_prefix, chunks, plaintext_size = self._layout(handle)
+            if end is None or end >= plaintext_size:
+                end = plaintext_size - 1
+            if plaintext_size == 0 or start > end:
+                return
+
+            first = start // chunk_size
+            last = end // chunk_size
+            stored_chunk = chunk_size + TAG_SIZE
+            handle.seek(HEADER_SIZE + first * stored_chunk)
+
+            for index in range(first, last + 1):
+                encrypted = handle.read(stored_chunk)
+                nonce = nonce_prefix + struct.pack('>I', index)
+                plaintext = aesgcm.decrypt(
+                    nonce, encrypted, self._associated_data(file_id, index, index == chunks - 1)
+                )
+
+                chunk_start = index * chunk_size
+                lower = max(start - chunk_start, 0)
+                upper = min(end - chunk_start + 1, len(plaintext))
+                yield plaintext[lower:upper]
+
+    def delete(self, file_id: str):
+        """Elimina el archivo cifrado si existe."""
+        try:
+            self.path(file_id).unlink()
+        except FileNotFoundError:
+            return
+        logger.info(f'Encrypted file deleted: {file_id}')
+
+
+file_store = EncryptedFileStore()
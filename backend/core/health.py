@@ -0,0 +1,326 @@
+"""
+Análisis de salud de las contraseñas del baúl (centro de seguridad).
+
+Con el baúl desbloqueado se descifran por lotes las entradas de tipo login y
+se evalúa cada contraseña: fortaleza (calculate_password_strength, que consulta
+el índice local de filtraciones de core.breach), reutilización y antigüedad.
+Las contraseñas repetidas se detectan en O(n) agrupando por un HMAC con una
+clave por usuario derivada de la clave del baúl, sin comparar pares ni guardar
+nunca la contraseña ni un hash sin clave.
+
+Solo se persiste PasswordHealthReport: los recuentos, que el centro de seguridad
+lee sin descifrar nada, y el detalle por entrada cifrado con la clave del baúl.
+El detalle hace de índice (HMAC -> entradas, con su nivel): tras el primer
+análisis completo, VaultItem.save_encrypted_data/update_encrypted_data lo
+actualizan con la contraseña que ya tienen en claro (index_password), así que
+recuentos y repeticiones no vuelven a exigir descifrar el baúl entero.
+
+Los borrados no disponen de la clave del baúl: solo se anota el id de la
+entrada (pending_removals) y los recuentos se corrigen en la siguiente
+actualización con clave o al desbloquear el baúl (apply_pending_removals).
+En claro solo quedan los recuentos agregados, nunca datos por entrada.
+"""
+
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .breach import is_breached
+from .crypto import ALGORITHM_GCM, get_crypto
+from .models import PasswordHealthReport, VaultItem
+
+logger = logging.getLogger(__name__)
+
+_HEALTH_KEY_INFO = b'securevault-password-health-v1'
+
+# Niveles de calculate_password_strength que cuentan como contraseña débil
+WEAK_LEVELS = frozenset({'very_weak', 'weak'})
+
+
+def calculate_password_strength(password):
+    """Calcula la fortaleza de una contraseña."""
+    score = 0
+
+    # Longitud
+    if len(password) >= 8:
+        score += 1
+    if len(password) >= 12:
+        score += 1
+
+    # Complejidad
+    if any(c.islower() for c in password):
+        score += 1
+    if any(c.isupper() for c in password):
+        score += 1
+    if any(c.isdigit() for c in password):
+        score += 1
+    if any(c in '!@#$%^&*()_+-=[]{}|;:,.<>?' for c in password):
+        score += 1
+
+    # Una contraseña filtrada es muy débil sea cual sea su complejidad
+    breached = is_breached(password)
+    if breached:
+        score = 0
+
+    # Determinar nivel
+    if score >= 5:
+        level = 'very_strong'
+    elif score >= 4:
+        level = 'strong'
+    elif score >= 3:
+        level = 'medium'
+    elif score >= 2:
+        level = 'weak'
+    else:
+        level = 'very_weak'
+
+    return {
+        'score': score,
+        'level': level,
+        'percentage': min(100, (score / 6) * 100),
+        'breached': breached,
+    }
+
+
+def health_key(vault_key: bytes) -> bytes:
+    """Clave HMAC por usuario, derivada de la clave del baúl (HKDF-Expand)."""
+    return HKDFExpand(hashes.SHA256(), 32, _HEALTH_KEY_INFO).derive(vault_key)
+
+
+def password_fingerprint(key: bytes, password: str) -> str:
+    """HMAC-SHA256 de la contraseña; solo es comparable dentro del mismo baúl."""
+    return hmac.new(key, password.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _report_associated_data(user_id) -> bytes:
+    return f'password-health|{user_id}'.encode('utf-8')
+
+
+def summarize(entries: dict, now=None) -> dict:
+    """
+    Clasifica las entradas analizadas.
+
+    Args:
+        entries (dict): item_id -> {'level', 'score', 'breached', 'fingerprint', 'updated_at'}
+
+    Returns:
+        dict: {'weak', 'breached', 'old', 'duplicates'} con ids de entradas;
+            duplicates es una lista de grupos que comparten contraseña
+    """
+    now = now or timezone.now()
+    max_age = timedelta(days=getattr(settings, 'VAULT_PASSWORD_MAX_AGE_DAYS', 180))
+    cutoff = (now - max_age).isoformat()
+
+    groups = {}
+    weak = []
+    breached = []
+    old = []
+    for item_id, entry in entries.items():
+        if entry['level'] in WEAK_LEVELS:
+            weak.append(item_id)
+        if entry.get('breached'):
+            breached.append(item_id)
+        if entry['updated_at'] < cutoff:
+            old.append(item_id)
+        groups.setdefault(entry['fingerprint'], []).append(item_id)
+
+    return {
+        'weak': sorted(weak),
+        'breached': sorted(breached),
+        'old': sorted(old),
+        'duplicates': sorted(sorted(ids) for ids in groups.values() if len(ids) > 1),
+    }
+
+
+def score_item(password: str, key: bytes, changed_at) -> dict:
+    """
+    Resultado del análisis de una contraseña (sin la contraseña).
+
+    Args:
+        password (str): Contraseña en claro
+        key (bytes): Clave HMAC de health_key()
+        changed_at (datetime): Fecha del último cambio de la contraseña
+    """
+    strength = calculate_password_strength(password)
+    return {
+        'level': strength['level'],
+        'score': strength['score'],
+        'breached': strength['breached'],
+        'fingerprint': password_fingerprint(key, password),
+        'updated_at': changed_at.isoformat(),
+    }
+
+
+def analyze_vault(user, user_password: str, vault_key: bytes, cache_scope: tuple = None) -> dict:
+    """
+    Analiza todas las contraseñas del usuario y guarda el informe.
+
+    Args:
+        user: Propietario del baúl
+        user_password (str): Contraseña maestra del usuario
+        vault_key (bytes): Clave del baúl ya recuperada
+        cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+
+    Returns:
+        dict: Detalle del informe ({'entries', 'weak', 'breached', 'old', 'duplicates', 'errors'})
+    """
+    items = list(
+        VaultItem.objects.filter(user=user, item_type='login')
+        .only('id', 'user_id', 'item_type', 'updated_at', 'encrypted_data', 'encrypted_blob')
+    )
+    results = VaultItem.decrypt_many(
+        items, user_password, cache_scope, vault_key=vault_key, record_access=False
+    )
+
+    key = health_key(vault_key)
+    entries = {}
+    errors = []
+    for item, (data, error) in zip(items, results):
+        if error is not None:
+            errors.append(str(item.pk))
+            continue
+        password = (data.get('data') or {}).get('password')
+        if password:
+            entries[str(item.pk)] = score_item(password, key, item.updated_at)
+
+    detail = {'entries': entries, **summarize(entries), 'errors': errors}
+    save_report(user.pk, detail, vault_key)
+    logger.info(f'Password health analyzed for {user.email}: {len(entries)} passwords')
+    return detail
+
+
+def save_report(user_id, detail: dict, vault_key: bytes, analyzed_at=None) -> PasswordHealthReport:
+    """
+    Guarda los recuentos en claro y el detalle cifrado con la clave del baúl.
+
+    Args:
+        analyzed_at (datetime, optional): Fecha del último análisis completo (por defecto, ahora)
+    """
+    encrypted = get_crypto().encrypt_json(
+        detail, vault_key=vault_key, algorithm=ALGORITHM_GCM,
+        associated_data=_report_associated_data(user_id)
+    )
+    report, _ = PasswordHealthReport.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            **_counts(detail),
+            'encrypted_detail': encrypted,
+            'pending_removals': [],
+            'analyzed_at': analyzed_at or timezone.now(),
+        }
+    )
+    return report
+
+
+def _counts(detail: dict) -> dict:
+    """Recuentos en claro de PasswordHealthReport a partir del detalle."""
+    return {
+        'analyzed_passwords': len(detail['entries']),
+        'weak_passwords': len(detail['weak']),
+        'breached_passwords': len(detail['breached']),
+        'duplicate_passwords': sum(len(ids) for ids in detail['duplicates']),
+        'old_passwords': len(detail['old']),
+    }
+
+
+def load_report_detail(report: PasswordHealthReport, vault_key: bytes):
+    """
+    Descifra el detalle de un informe, sin las entradas borradas desde la
+    última actualización (pending_removals).
+
+    Returns:
+        dict: Detalle, o None si no se puede descifrar (p. ej. tras rotar la clave del baúl)
+    """
+    try:
+        detail = get_crypto().decrypt_json(
+            report.encrypted_detail, vault_key=vault_key,
+            associated_data=_report_associated_data(report.user_id)
+        )
+    except ValidationError as e:
+        logger.warning(f'Discarding unreadable password health report: {str(e)}')
+        return None
+
+    if report.pending_removals:
+        for item_id in report.pending_removals:
+            detail['entries'].pop(item_id, None)
+        detail['errors'] = [item_id for item_id in detail['errors']
+                            if item_id not in report.pending_removals]
+        detail.update(summarize(detail['entries']))
+    return detail
+
+
+def index_password(item: VaultItem, password: str, vault_key: bytes) -> bool:
+    """
+    Actualiza el índice de un usuario con la contraseña de una entrada.
+    Solo se mantiene un índice que ya exista: el primero lo crea analyze_vault().
+
+    Args:
+        item (VaultItem): Entrada creada o modificada (su id ya está asignado)
+        password (str): Contraseña en claro; vacía si la entrada ya no tiene contraseña
+        vault_key (bytes): Clave del baúl ya recuperada
+
+    Returns:
+        bool: True si el índice se actualizó
+    """
+    item_id = str(item.pk)
+    with transaction.atomic():
+        report = PasswordHealthReport.objects.select_for_update().filter(user_id=item.user_id).first()
+        if report is None:
+            return False
+        detail = load_report_detail(report, vault_key)
+        if detail is None:
+            return False
+
+        if password:
+            entry = score_item(password, health_key(vault_key), timezone.now())
+            previous = detail['entries'].get(item_id)
+            if previous and hmac.compare_digest(previous['fingerprint'], entry['fingerprint']):
+                # La misma contraseña reenviada (p. ej. al editar las notas) conserva su antigüedad
+                entry['updated_at'] = previous['updated_at']
+            detail['entries'][item_id] = entry
+        elif detail['entries'].pop(item_id, None) is None and not report.pending_removals:
+            return False
+        detail['errors'] = [error for error in detail['errors'] if error != item_id]
+        detail.update(summarize(detail['entries']))
+        save_report(item.user_id, detail, vault_key, analyzed_at=report.analyzed_at)
+    return True
+
+
+def forget_item(user_id, item_id):
+    """
+    Anota una entrada borrada para quitarla del detalle cifrado y de los
+    recuentos en la siguiente actualización con clave (el borrado no dispone
+    de la clave del baúl).
+    """
+    with transaction.atomic():
+        report = PasswordHealthReport.objects.select_for_update().filter(user_id=user_id).first()
+        if report is not None and str(item_id) not in report.pending_removals:
+            report.pending_removals.append(str(item_id))
+            report.save(update_fields=['pending_removals', 'updated_at'])
+
+
+def apply_pending_removals(user_id, vault_key: bytes) -> bool:
+    """
+    Aplica los borrados pendientes al detalle cifrado y a los recuentos
+    (p. ej. al desbloquear el baúl, cuando vuelve a haber clave).
+
+    Returns:
+        bool: True si había borrados pendientes y se aplicaron
+    """
+    with transaction.atomic():
+        report = PasswordHealthReport.objects.select_for_update().filter(user_id=user_id).first()
+        if report is None or not report.pending_removals:
+            return False
+        detail = load_report_detail(report, vault_key)
+        if detail is None:
+            return False
+        save_report(user_id, detail, vault_key, analyzed_at=report.analyzed_at)
+    return True
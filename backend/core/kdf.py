@@ -0,0 +1,330 @@
+"""
+Estrategias de derivación de claves (KDF) para la contraseña maestra.
+
+Cada usuario guarda el algoritmo y los parámetros con los que se derivó su
+hash, de modo que el coste puede ajustarse por despliegue (calibrate_kdf) y los
+usuarios se actualizan al siguiente desbloqueo correcto. Las derivaciones se
+ejecutan en un pool acotado (kdf_executor) para no saturar los workers.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from argon2.low_level import Type, hash_secret_raw
+except ImportError:  # argon2-cffi es opcional
+    hash_secret_raw = None
+
+
+class KDF:
+    """
+    Interfaz de una estrategia de derivación.
+    """
+
+    name = None
+    # Parámetros por defecto; nunca se calibra por debajo de ellos
+    default_params = {}
+
+    def derive(self, password: str, salt: bytes, params: dict, length: int = 32) -> bytes:
+        raise NotImplementedError
+
+    def normalize(self, params: dict = None) -> dict:
+        """Completa los parámetros con los valores por defecto."""
+        return {**self.default_params, **(params or {})}
+
+    def measure(self, params: dict) -> float:
+        """Tiempo en milisegundos de una derivación con los parámetros dados."""
+        start = time.perf_counter()
+        self.derive('calibration-password', os.urandom(16), params)
+        return (time.perf_counter() - start) * 1000
+
+    def calibrate(self, target_ms: float, **limits) -> tuple:
+        """
+        Busca los parámetros cuyo coste se acerca a target_ms en este host.
+
+        Returns:
+            tuple: (parámetros, milisegundos medidos)
+        """
+        raise NotImplementedError
+
+
+class PBKDF2KDF(KDF):
+    """PBKDF2-HMAC-SHA256; el coste escala linealmente con las iteraciones."""
+
+    name = 'pbkdf2-sha256'
+    default_params = {'iterations': 100000}
+
+    def derive(self, password: str, salt: bytes, params: dict, length: int = 32) -> bytes:
+        params = self.normalize(params)
+        return hashlib.pbkdf2_hmac(
+            'sha256', password.encode('utf-8'), salt, int(params['iterations']), length
+        )
+
+    def calibrate(self, target_ms: float, **limits) -> tuple:
+        probe = {'iterations': 20000}
+        per_iteration = self.measure(probe) / probe['iterations']
+        iterations = int(target_ms / per_iteration) // 1000 * 1000
+        params = {'iterations': max(iterations, self.default_params['iterations'])}
+        return params, self.measure(params)
+
+
+class ScryptKDF(KDF):
+    """scrypt (memoria dura); se ajusta n con r y p fijos."""
+
+    name = 'scrypt'
+    default_params = {'n': 2 ** 15, 'r': 8, 'p': 1}
+
+    def derive(self, password: str, salt: bytes, params: dict, length: int = 32) -> bytes:
+        params = self.normalize(params)
+        n, r, p = int(params['n']), int(params['r']), int(params['p'])
+        return hashlib.scrypt(
+            password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+            maxmem=self.memory(n, r, p) + 2 ** 20, dklen=length
+        )
+
+    @staticmethod
+    def memory(n: int, r: int, p: int) -> int:
+        """Memoria aproximada que requiere scrypt (bytes)."""
+        return 128 * r * (n + p)
+
+    def calibrate(self, target_ms: float, max_memory_mb: int = 128, **limits) -> tuple:
+        r, p = self.default_params['r'], self.default_params['p']
+        n = 2 ** 14
+        best = ({'n': n, 'r': r, 'p': p}, self.measure({'n': n, 'r': r, 'p': p}))
+
+        # n debe ser potencia de 2: se duplica mientras no se pase del objetivo
+        while best[1] < target_ms:
+            candidate = {'n': best[0]['n'] * 2, 'r': r, 'p': p}
+            if self.memory(candidate['n'], r, p) > max_memory_mb * 2 ** 20:
+                break
+            elapsed = self.measure(candidate)
+            if elapsed > target_ms * 1.5:
+                break
+            best = (candidate, elapsed)
+
+        if best[0]['n'] < self.default_params['n']:
+            params = dict(self.default_params)
+            return params, self.measure(params)
+        return best
+
+
+class Argon2idKDF(KDF):
+    """Argon2id (requiere argon2-cffi); se ajusta time_cost con memoria fija."""
+
+    name = 'argon2id'
+    default_params = {'time_cost': 3, 'memory_cost': 64 * 1024, 'parallelism': 1}
+
+    def derive(self, password: str, salt: bytes, params: dict, length: int = 32) -> bytes:
+        params = self.normalize(params)
+        return hash_secret_raw(
+            password.encode('utf-8'), salt,
+            time_cost=int(params['time_cost']),
+            memory_cost=int(params['memory_cost']),
+            parallelism=int(params['parallelism']),
+            hash_len=length,
+            type=Type.ID,
+        )
+
+    def calibrate(self, target_ms: float, max_memory_mb: int = 128, **limits) -> tuple:
+        params = dict(self.default_params)
+        params['memory_cost'] = min(params['memory_cost'], max_memory_mb * 1024)
+        elapsed = self.measure(params)
+
+        while elapsed < target_ms:
+            candidate = {**params, 'time_cost': params['time_cost'] + 1}
+            candidate_elapsed = self.measure(candidate)
+            if candidate_elapsed > target_ms * 1.5:
+                break
+            params, elapsed = candidate, candidate_elapsed
+        return params, elapsed
+
+
+KDF_REGISTRY = {kdf.name: kdf for kdf in (PBKDF2KDF(), ScryptKDF())}
+if hash_secret_raw is not None:
+    KDF_REGISTRY[Argon2idKDF.name] = Argon2idKDF()
+
+DEFAULT_KDF = PBKDF2KDF.name
+
+
+def get_kdf(name: str) -> KDF:
+    """
+    Obtiene una estrategia por nombre.
+
+    Raises:
+        ValueError: Si el algoritmo no existe o no está instalado
+    """
+    try:
+        return KDF_REGISTRY[name or DEFAULT_KDF]
+    except KeyError:
+        raise ValueError(f'Unsupported KDF: {name}')
+
+
+def configured_kdf() -> tuple:
+    """
+    KDF configurada para hashes nuevos (VAULT_KDF_ALGORITHM / VAULT_KDF_PARAMS).
+
+    Returns:
+        tuple: (nombre, parámetros completos)
+    """
+    kdf = get_kdf(getattr(settings, 'VAULT_KDF_ALGORITHM', DEFAULT_KDF))
+    return kdf.name, kdf.normalize(getattr(settings, 'VAULT_KDF_PARAMS', None))
+
+
+class KDFBusyError(Exception):
+    """
+    La cola de derivaciones está llena; el cliente debe reintentar más tarde.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'KDF executor saturated, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _summarize(samples) -> dict:
+    """Promedio, p95 y máximo de una muestra de tiempos en milisegundos."""
+    if not samples:
+        return {'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered), 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        'max': round(ordered[-1], 2),
+    }
+
+
+class KDFExecutor:
+    """
+    Pool acotado de hilos para las derivaciones de claves.
+
+    hashlib libera el GIL durante PBKDF2 y scrypt, así que los hilos escalan
+    con los núcleos sin el coste de serializar datos a otro proceso. La
+    admisión está limitada a workers + max_pending derivaciones: por encima de
+    ese límite se rechaza de inmediato con KDFBusyError en lugar de encolar.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, samples: int = 1000):
+        self.max_workers = max_workers or getattr(settings, 'VAULT_KDF_WORKERS', os.cpu_count() or 1)
+        if max_pending is None:
+            max_pending = getattr(settings, 'VAULT_KDF_MAX_PENDING', 32)
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queue_wait = deque(maxlen=samples)
+        self._compute = deque(maxlen=samples)
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='vault-kdf'
+                    )
+        return self._pool
+
+    def _submit(self, func, *args):
+        """
+        Admite una derivación y la envía al pool.
+
+        Raises:
+            KDFBusyError: Si ya hay workers + max_pending derivaciones admitidas
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise KDFBusyError(self.retry_after())
+
+        enqueued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._queue_wait.append((started - enqueued) * 1000)
+                    self._compute.append((finished - started) * 1000)
+                    self.completed += 1
+
+        def release(future):
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+        try:
+            future = self._get_pool().submit(task)
+        except Exception:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def run(self, func, *args):
+        """
+        Ejecuta una derivación en el pool y espera su resultado.
+
+        Raises:
+            KDFBusyError: Si ya hay workers + max_pending derivaciones admitidas
+        """
+        return self._submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        """
+        Versión asíncrona de run(): el event loop no se bloquea mientras se deriva.
+
+        Raises:
+            KDFBusyError: Si ya hay workers + max_pending derivaciones admitidas
+        """
+        return await asyncio.wrap_future(self._submit(func, *args))
+
+    def derive(self, kdf: KDF, password: str, salt: bytes, params: dict, length: int = 32) -> bytes:
+        """Deriva una clave con la estrategia indicada dentro del pool."""
+        return self.run(kdf.derive, password, salt, params, length)
+
+    async def aderive(self, kdf: KDF, password: str, salt: bytes, params: dict,
+                      length: int = 32) -> bytes:
+        """Versión asíncrona de derive()."""
+        return await self.arun(kdf.derive, password, salt, params, length)
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta vaciar la cola actual (mínimo 1)."""
+        with self._lock:
+            compute_ms = sum(self._compute) / len(self._compute) if self._compute else 250
+            backlog = max(self.in_flight, 1)
+        return max(1, math.ceil(compute_ms * backlog / self.max_workers / 1000))
+
+    def stats(self) -> dict:
+        """Métricas del pool: espera en cola frente a tiempo de cómputo."""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'queue_wait_ms': _summarize(self._queue_wait),
+                'compute_ms': _summarize(self._compute),
+            }
+
+
+kdf_executor = KDFExecutor()
@@ -0,0 +1,165 @@
+"""
+Caché en memoria de claves derivadas de la contraseña maestra.
+Evita repetir PBKDF2 en cada lectura mientras el baúl está desbloqueado.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class DerivedKeyCache:
+    """
+    Caché LRU acotada con expiración por TTL para claves derivadas.
+
+    Las entradas se indexan por (alcance, salt), donde el alcance es la tupla
+    (usuario, época de desbloqueo). Junto a cada clave se guarda una huella
+    HMAC de la contraseña para que una contraseña distinta nunca reciba una
+    clave cacheada.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'VAULT_KEY_CACHE_MAX_ENTRIES', 1024)
+        self.ttl = ttl or getattr(settings, 'VAULT_KEY_CACHE_TTL', 900)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pepper = os.urandom(32)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fingerprint(self, password: str) -> bytes:
+        """Huella de la contraseña con un pepper aleatorio por proceso."""
+        return hmac.new(self._pepper, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def get(self, scope: tuple, salt: bytes, password: str):
+        """
+        Obtiene una clave derivada si está en caché y no ha expirado.
+
+        Args:
+            scope (tuple): Alcance (usuario, época de desbloqueo)
+            salt (bytes): Salt con el que se derivó la clave
+            password (str): Contraseña usada para derivar la clave
+
+        Returns:
+            bytes: Clave derivada, o None si no está disponible
+        """
+        cache_key = (scope, bytes(salt))
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                key, fingerprint, expires_at = entry
+                if expires_at <= time.monotonic():
+                    del self._entries[cache_key]
+                    self.evictions += 1
+                elif hmac.compare_digest(fingerprint, self._fingerprint(password)):
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return key
+            self.misses += 1
+            return None
+
+    def set(self, scope: tuple, salt: bytes, password: str, key: bytes):
+        """Guarda una clave derivada, expulsando la menos usada si está llena."""
+        cache_key = (scope, bytes(salt))
+        entry = (key, self._fingerprint(password), time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear_user(self, user_id) -> int:
+        """
+        Elimina todas las claves de un usuario, sin importar la época.
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        user_id = str(user_id)
+        with self._lock:
+            stale = [k for k in self._entries if k[0][0] == user_id]
+            for cache_key in stale:
+                del self._entries[cache_key]
+        return len(stale)
+
+    def clear(self):
+        """Vacía la caché completa."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Retorna contadores de aciertos/fallos para monitoreo."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
+
+
+derived_key_cache = DerivedKeyCache()
+
+# Ranura de la caché para la clave del baúl ya desenvuelta (no es un salt real)
+VAULT_KEY_SLOT = b'vault-key'
+
+
+def remember_vault_key(scope: tuple, password: str, vault_key: bytes):
+    """Entrega la clave del baúl desbloqueado a la caché de la sesión."""
+    if scope is not None:
+        derived_key_cache.set(scope, VAULT_KEY_SLOT, password, vault_key)
+
+
+def recall_vault_key(scope: tuple, password: str):
+    """
+    Recupera la clave del baúl de la sesión sin KDF ni desenvolver el sobre.
+    Como el resto de la caché, exige la misma contraseña con la que se desbloqueó.
+    
+    Returns:
+        bytes: Clave del baúl, o None si no está en caché
+    """
+    if scope is None:
+        return None
+    return derived_key_cache.get(scope, VAULT_KEY_SLOT, password)
+
+
+def open_session_scope(request) -> tuple:
+    """
+    Abre una nueva época de desbloqueo para la sesión.
+    Debe llamarse justo después de verificar la contraseña maestra.
+    """
+    epoch = secrets.token_hex(8)
+    request.session['vault_key_epoch'] = epoch
+    return (str(request.user.pk), epoch)
+
+
+def get_session_scope(request):
+    """
+    Retorna el alcance de caché de la sesión, o None si el baúl está bloqueado.
+    Sin alcance las claves nunca se guardan en caché.
+    """
+    if not request.session.get('vault_unlocked', False):
+        return None
+    epoch = request.session.get('vault_key_epoch')
+    if not epoch:
+        return None
+    return (str(request.user.pk), epoch)
+
+
+def close_session_scope(request):
+    """Cierra la época de la sesión y borra las claves cacheadas del usuario."""
+    request.session.pop('vault_key_epoch', None)
+    if request.user.is_authenticated:
+        derived_key_cache.clear_user(request.user.pk)
@@ -0,0 +1,77 @@
+"""
+Comando para construir el índice local de contraseñas filtradas (core.breach).
+
+Lee un volcado de SHA-1 descargado (un archivo HASH:VECES o el directorio de
+rangos del downloader de Have I Been Pwned) y escribe el filtro de Bloom en
+VAULT_BREACH_INDEX_PATH. Los workers abren el nuevo índice en menos de
+core.breach.RECHECK_SECONDS, sin reiniciarlos.
+
+Uso:
+    python manage.py build_breach_index pwnedpasswords.txt
+    python manage.py build_breach_index pwnedpasswords/ --min-count 10
+    python manage.py build_breach_index pwnedpasswords.txt --fp-rate 0.0001 --output /srv/breach.bloom
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.breach import DEFAULT_FP_RATE, bloom_parameters, build_index, iter_dump_hashes
+
+
+class Command(BaseCommand):
+    help = 'Construye el índice local de contraseñas filtradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='Archivo o directorio de rangos con los SHA-1 del volcado'
+        )
+        parser.add_argument(
+            '--output',
+            help='Ruta del índice (por defecto, VAULT_BREACH_INDEX_PATH)'
+        )
+        parser.add_argument(
+            '--fp-rate', type=float, default=None,
+            help='Probabilidad de falso positivo (por defecto, VAULT_BREACH_FP_RATE)'
+        )
+        parser.add_argument(
+            '--min-count', type=int, default=0,
+            help='Omite los hashes vistos menos veces en el volcado'
+        )
+        parser.add_argument(
+            '--count', type=int, default=None,
+            help='Número de hashes del volcado (evita una primera pasada para contarlos)'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'VAULT_BREACH_INDEX_PATH', '')
+        if not output:
+            raise CommandError('Indica --output o configura VAULT_BREACH_INDEX_PATH')
+
+        fp_rate = options['fp_rate'] or getattr(settings, 'VAULT_BREACH_FP_RATE', DEFAULT_FP_RATE)
+        if not 0 < fp_rate < 1:
+            raise CommandError('--fp-rate debe estar entre 0 y 1')
+
+        source = options['source']
+        min_count = options['min_count']
+        try:
+            count = options['count']
+            if count is None:
+                self.stdout.write('Contando hashes del volcado...')
+                count = sum(1 for _ in iter_dump_hashes(source, min_count))
+
+            bits, hashes = bloom_parameters(count, fp_rate)
+            self.stdout.write(
+                f'Construyendo índice: {count} hashes, {bits // 8 / 1024 / 1024:.1f} MB, k={hashes}'
+            )
+            start = time.perf_counter()
+            result = build_index(iter_dump_hashes(source, min_count), count, output, fp_rate)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error al construir el índice: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice escrito en {output}: {result['count']} hashes "
+            f"en {time.perf_counter() - start:.1f} s"
+        ))
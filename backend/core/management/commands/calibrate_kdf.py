@@ -0,0 +1,60 @@
+"""
+Comando para calibrar la KDF de la contraseña maestra en este host.
+
+Mide el coste de cada estrategia y propone los parámetros que se acercan a la
+latencia objetivo de un desbloqueo. Los usuarios se actualizan a la nueva
+configuración en su siguiente desbloqueo correcto.
+
+Uso:
+    python manage.py calibrate_kdf --target-ms 250
+    python manage.py calibrate_kdf --algorithm scrypt --max-memory-mb 64
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.kdf import KDF_REGISTRY, configured_kdf
+
+
+class Command(BaseCommand):
+    help = 'Calibra los parámetros de la KDF para una latencia objetivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms', type=float, default=250,
+            help='Latencia objetivo de una derivación en milisegundos'
+        )
+        parser.add_argument(
+            '--algorithm', choices=sorted(KDF_REGISTRY), default=None,
+            help='Estrategia a calibrar (por defecto todas las disponibles)'
+        )
+        parser.add_argument(
+            '--max-memory-mb', type=int, default=128,
+            help='Memoria máxima por derivación para scrypt/argon2id'
+        )
+
+    def handle(self, *args, **options):
+        target_ms = options['target_ms']
+        if target_ms <= 0:
+            raise CommandError('--target-ms debe ser positivo')
+
+        names = [options['algorithm']] if options['algorithm'] else sorted(KDF_REGISTRY)
+        current_name, current_params = configured_kdf()
+        self.stdout.write(f'KDF actual: {current_name} {json.dumps(current_params)}')
+        self.stdout.write(
+            f"  {KDF_REGISTRY[current_name].measure(current_params):.1f} ms por derivación"
+        )
+        self.stdout.write(f'Objetivo: {target_ms:.0f} ms\n')
+
+        for name in names:
+            params, elapsed = KDF_REGISTRY[name].calibrate(
+                target_ms, max_memory_mb=options['max_memory_mb']
+            )
+            self.stdout.write(self.style.SUCCESS(f'{name}: {elapsed:.1f} ms'))
+            self.stdout.write(f'  VAULT_KDF_ALGORITHM={name}')
+            self.stdout.write(f"  VAULT_KDF_PARAMS='{json.dumps(params, separators=(',', ':'))}'")
+            if elapsed > target_ms * 1.5:
+                self.stdout.write(self.style.WARNING(
+                    '  Los parámetros mínimos de seguridad superan el objetivo en este host'
+                ))
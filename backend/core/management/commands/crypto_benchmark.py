@@ -0,0 +1,177 @@
+"""
+Comando para medir el rendimiento del cifrado del baúl.
+
+Sin --suite compara los modos de cifrado (GCM frente a CBC-DOUBLE). Con --suite
+ejecuta la suite completa de la capa de cifrado y puede compararla con una
+línea base para detectar regresiones del coste por entrada antes de desplegar.
+
+Uso:
+    python manage.py crypto_benchmark
+    python manage.py crypto_benchmark --sizes 1024 65536 --iterations 500 --json
+    python manage.py crypto_benchmark --suite --save-baseline benchmarks/baseline.json
+    python manage.py crypto_benchmark --suite --baseline benchmarks/baseline.json --threshold 0.25
+    python manage.py crypto_benchmark --json-pipeline --vault-items 1000
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (
+    DEFAULT_ITEM_COUNTS, DEFAULT_PAYLOAD_SIZES, bench_algorithms, bench_json_pipeline,
+    bench_suite, compare_to_baseline, load_baseline, save_baseline
+)
+
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de AES-256-GCM frente a AES-256-CBC-DOUBLE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=list(DEFAULT_PAYLOAD_SIZES),
+            help='Tamaños de payload en bytes (por defecto 1 KB y 64 KB)'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=200,
+            help='Repeticiones por modo sin KDF'
+        )
+        parser.add_argument(
+            '--kdf-iterations', type=int, default=5,
+            help='Repeticiones del modo 1.0, que ejecuta PBKDF2 en cada operación'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Imprime los resultados en JSON'
+        )
+        parser.add_argument(
+            '--suite', action='store_true',
+            help='Ejecuta la suite completa (encrypt/decrypt, JSON, VaultEntry, verify_password)'
+        )
+        parser.add_argument(
+            '--json-pipeline', action='store_true',
+            help='Compara memoria y tiempo de decrypt_json por str y por bytes (tracemalloc)'
+        )
+        parser.add_argument(
+            '--vault-items', type=int, default=1000,
+            help='Entradas del baúl descifradas por --json-pipeline'
+        )
+        parser.add_argument(
+            '--items', nargs='+', type=int, default=list(DEFAULT_ITEM_COUNTS),
+            help='Entradas por operación en los casos de VaultEntry (solo --suite)'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Línea base JSON con la que comparar (solo --suite)'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Guarda los resultados como línea base en esta ruta (solo --suite)'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Aumento relativo del coste por entrada tolerado (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        if options['suite']:
+            self.handle_suite(options)
+            return
+
+        if options['json_pipeline']:
+            self.handle_json_pipeline(options)
+            return
+
+        results = bench_algorithms(
+            payload_sizes=options['sizes'],
+            iterations=options['iterations'],
+            kdf_iterations=options['kdf_iterations'],
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = f"{'modo':<24} {'tamaño':>8} {'op':<8} {'ops/s':>12} {'MB/s':>10} {'media µs':>12}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<24} {result['payload_size']:>8} {result['operation']:<8} "
+                f"{result['ops_per_s']:>12.2f} {result['mb_per_s']:>10.2f} {result['mean_us']:>12.2f}"
+            )
+
+    def handle_json_pipeline(self, options):
+        results = []
+        for size in options['sizes']:
+            results.extend(bench_json_pipeline(items=options['vault_items'], payload_size=size))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = (
+            f"{'modo':<24} {'ruta':<6} {'items':>6} {'tamaño':>8} {'ms':>10} {'pico KiB':>10}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<24} {result['pipeline']:<6} {result['items']:>6} "
+                f"{result['payload_size']:>8} {result['total_ms']:>10.2f} {result['peak_kib']:>10.1f}"
+            )
+
+    def handle_suite(self, options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = load_baseline(options['baseline'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la línea base: {str(e)}')
+
+        results = bench_suite(
+            payload_sizes=options['sizes'],
+            item_counts=options['items'],
+            iterations=options['iterations'],
+            kdf_iterations=options['kdf_iterations'],
+        )
+        comparison = (
+            compare_to_baseline(results, baseline, options['threshold']) if baseline else []
+        )
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], results)
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {'results': results, 'comparison': comparison}, indent=2
+            ))
+        else:
+            self.print_suite(results, comparison)
+
+        regressions = [c for c in comparison if c['regression']]
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} casos superan la línea base en más de '
+                f"{options['threshold']:.0%}"
+            )
+
+    def print_suite(self, results, comparison):
+        changes = {(c['case'], c['payload_size'], c['items']): c for c in comparison}
+        header = (
+            f"{'caso':<28} {'tamaño':>8} {'items':>6} {'ops/s':>12} "
+            f"{'µs/entrada':>12} {'base µs':>12} {'cambio':>8}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for result in results:
+            change = changes.get((result['case'], result['payload_size'], result['items']))
+            line = (
+                f"{result['case']:<28} {result['payload_size']:>8} {result['items']:>6} "
+                f"{result['ops_per_s']:>12.2f} {result['per_item_us']:>12.2f}"
+            )
+            if change:
+                line += f" {change['baseline_us']:>12.2f} {change['change']:>+8.1%}"
+                style = self.style.ERROR if change['regression'] else self.style.SUCCESS
+                line = style(line)
+            self.stdout.write(line)
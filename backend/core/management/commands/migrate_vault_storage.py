@@ -0,0 +1,143 @@
+"""
+Comando para migrar VaultItem.encrypted_data (JSON con base64) al sobre binario.
+
+Mide el tamaño de la tabla y el tiempo de decodificación por fila antes y
+después de la migración. La lectura es dual: las filas no migradas siguen
+leyéndose desde el JSON.
+
+Uso:
+    python manage.py migrate_vault_storage --report-only
+    python manage.py migrate_vault_storage --batch-size 500
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.crypto import pack_envelope, parse_encrypted
+from core.models import VaultItem
+
+
+class Command(BaseCommand):
+    help = 'Convierte los datos cifrados de VaultItem a sobres binarios compactos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Filas por lote (cada lote se confirma en su propia transacción)'
+        )
+        parser.add_argument(
+            '--sample-size', type=int, default=1000,
+            help='Filas usadas para medir el tiempo de decodificación'
+        )
+        parser.add_argument(
+            '--report-only', action='store_true',
+            help='Solo muestra las métricas, sin migrar'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Antes de la migración:')
+        self.print_report(self.build_report(options['sample_size']))
+
+        if options['report_only']:
+            return
+
+        converted = self.convert(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Filas convertidas: {converted}'))
+
+        self.stdout.write('Después de la migración:')
+        self.print_report(self.build_report(options['sample_size']))
+
+    def convert(self, batch_size: int) -> int:
+        """Convierte las filas JSON a binario en lotes paginados por clave primaria."""
+        converted = 0
+        last_pk = None
+
+        while True:
+            queryset = VaultItem.objects.filter(
+                encrypted_blob__isnull=True, encrypted_data__isnull=False
+            ).order_by('pk').only('pk', 'encrypted_data', 'encrypted_blob')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+
+            # Las filas del lote quedan bloqueadas hasta escribirlas: una edición
+            # concurrente espera y no se pierde al sobrescribir con el snapshot
+            with transaction.atomic():
+                batch = list(queryset.select_for_update()[:batch_size])
+                if not batch:
+                    break
+
+                for item in batch:
+                    item.encrypted_blob = pack_envelope(item.encrypted_data)
+                    item.encrypted_data = None
+
+                VaultItem.objects.bulk_update(batch, ['encrypted_blob', 'encrypted_data'])
+
+            converted += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'  {converted} filas convertidas...')
+
+        return converted
+
+    def build_report(self, sample_size: int) -> dict:
+        """Calcula tamaño almacenado y tiempo de decodificación de una muestra."""
+        report = {
+            'json_rows': VaultItem.objects.filter(encrypted_blob__isnull=True).count(),
+            'binary_rows': VaultItem.objects.filter(encrypted_blob__isnull=False).count(),
+            'table_bytes': self.table_size(),
+        }
+
+        json_samples = list(
+            VaultItem.objects.filter(encrypted_blob__isnull=True, encrypted_data__isnull=False)
+            .values_list('encrypted_data', flat=True)[:sample_size]
+        )
+        binary_samples = list(
+            VaultItem.objects.filter(encrypted_blob__isnull=False)
+            .values_list('encrypted_blob', flat=True)[:sample_size]
+        )
+
+        # JSON: el coste real incluye parsear el texto de la columna y decodificar base64
+        json_texts = [json.dumps(data) for data in json_samples]
+        report['json_avg_bytes'] = self.average(len(text) for text in json_texts)
+        report['json_decode_us'] = self.time_per_row(
+            lambda text: parse_encrypted(json.loads(text)), json_texts
+        )
+
+        report['binary_avg_bytes'] = self.average(len(blob) for blob in binary_samples)
+        report['binary_decode_us'] = self.time_per_row(parse_encrypted, binary_samples)
+
+        return report
+
+    def table_size(self):
+        """Tamaño total de la tabla con índices y TOAST (solo PostgreSQL)."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [VaultItem._meta.db_table])
+            return cursor.fetchone()[0]
+
+    def time_per_row(self, func, samples):
+        if not samples:
+            return None
+        start = time.perf_counter()
+        for sample in samples:
+            func(sample)
+        return round((time.perf_counter() - start) / len(samples) * 1_000_000, 2)
+
+    def average(self, values):
+        values = list(values)
+        return round(sum(values) / len(values), 1) if values else None
+
+    def print_report(self, report: dict):
+        self.stdout.write(f"  Filas JSON:                 {report['json_rows']}")
+        self.stdout.write(f"  Filas binarias:             {report['binary_rows']}")
+        table_bytes = report['table_bytes']
+        self.stdout.write(
+            f"  Tamaño de la tabla:         {table_bytes if table_bytes is not None else 'n/d'} bytes"
+        )
+        self.stdout.write(f"  Bytes/fila (JSON):          {report['json_avg_bytes']}")
+        self.stdout.write(f"  Bytes/fila (binario):       {report['binary_avg_bytes']}")
+        self.stdout.write(f"  Decodificación JSON (µs):   {report['json_decode_us']}")
+        self.stdout.write(f"  Decodificación binaria (µs): {report['binary_decode_us']}")
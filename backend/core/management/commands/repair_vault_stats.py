@@ -0,0 +1,61 @@
+"""
+Comando para verificar y reparar los contadores desnormalizados de VaultStats.
+
+Recuenta las entradas de cada usuario y corrige las filas que no coinciden
+(p. ej. tras escrituras masivas con QuerySet.update() o bulk_create, que no
+emiten signals). También crea las filas de usuarios que aún no tienen.
+
+Uso:
+    python manage.py repair_vault_stats --dry-run
+    python manage.py repair_vault_stats
+    python manage.py repair_vault_stats --email usuario@ejemplo.com
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import VaultStats
+from core.stats import count_vault_items, rebuild_vault_stats
+
+
+class Command(BaseCommand):
+    help = 'Verifica y repara los contadores de VaultStats'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            help='Solo el usuario con este email'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Solo informa de las diferencias, sin corregirlas'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['email']:
+            users = users.filter(email=options['email'])
+            if not users.exists():
+                raise CommandError(f"Usuario no encontrado: {options['email']}")
+
+        checked = 0
+        mismatched = 0
+        for user_id, email in users.values_list('pk', 'email').iterator():
+            checked += 1
+            if options['dry_run']:
+                stats = VaultStats.objects.filter(pk=user_id).first()
+                expected = count_vault_items(user_id)
+                differs = stats is None or any(
+                    getattr(stats, field) != value for field, value in expected.items()
+                )
+            else:
+                differs = rebuild_vault_stats(user_id)
+
+            if differs:
+                mismatched += 1
+                self.stdout.write(self.style.WARNING(f'  {email}: contadores desalineados'))
+
+        action = 'por reparar' if options['dry_run'] else 'reparados'
+        self.stdout.write(self.style.SUCCESS(
+            f'Usuarios revisados: {checked}, {action}: {mismatched}'
+        ))
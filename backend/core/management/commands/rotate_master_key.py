@@ -0,0 +1,86 @@
+"""
+Comando para rotar la clave maestra del servidor sin contraseñas de usuario.
+
+Pasos:
+    1. Añadir la clave actual a ENCRYPTION_PREVIOUS_KEYS ('id:clave').
+    2. Configurar la nueva clave en ENCRYPTION_KEY con un ENCRYPTION_KEY_ID nuevo.
+    3. Ejecutar este comando; se puede interrumpir y volver a lanzar.
+    4. Retirar la clave anterior solo cuando todas las tablas estén completadas.
+
+Uso:
+    python manage.py rotate_master_key --batch-size 500 --max-rate 2000
+    python manage.py rotate_master_key --status
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.crypto import get_crypto
+from core.models import KeyRotationJob
+from core.rotation import MasterKeyRotator
+
+
+class Command(BaseCommand):
+    help = 'Re-cifra la capa de la clave maestra con la clave activa del llavero'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Filas por lote (cada lote se confirma con su checkpoint)'
+        )
+        parser.add_argument(
+            '--max-rate', type=float, default=0,
+            help='Límite de filas por segundo (0 = sin límite)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignora los checkpoints y recorre de nuevo todas las filas'
+        )
+        parser.add_argument(
+            '--status', action='store_true',
+            help='Solo muestra el progreso de las rotaciones'
+        )
+
+    def handle(self, *args, **options):
+        key_id = get_crypto().key_id
+
+        if options['status']:
+            self.print_status(key_id)
+            return
+
+        self.stdout.write(f'Rotando a la clave maestra {key_id}...')
+        rotator = MasterKeyRotator(
+            batch_size=options['batch_size'],
+            max_rate=options['max_rate'] or None,
+            progress=self.print_progress,
+        )
+        jobs = rotator.run(restart=options['restart'])
+
+        for job in jobs:
+            style = self.style.WARNING if job.rows_failed else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{job.model_label}: {job.rows_scanned} leídas, '
+                f'{job.rows_rewrapped} re-cifradas, {job.rows_failed} con error'
+            ))
+
+        if any(job.rows_failed for job in jobs):
+            self.stdout.write(self.style.WARNING(
+                'Hay filas con error: no retire la clave anterior hasta revisarlas.'
+            ))
+
+    def print_progress(self, job, rate):
+        self.stdout.write(
+            f'  {job.model_label}: {job.rows_scanned} filas '
+            f'({job.rows_rewrapped} re-cifradas) - {rate:.0f} filas/s'
+        )
+
+    def print_status(self, key_id):
+        jobs = KeyRotationJob.objects.filter(target_key_id=key_id)
+        if not jobs:
+            self.stdout.write(f'No hay rotaciones hacia la clave {key_id}')
+            return
+        for job in jobs:
+            self.stdout.write(
+                f'{job.model_label}: {job.get_status_display()} - '
+                f'{job.rows_scanned} leídas, {job.rows_rewrapped} re-cifradas, '
+                f'{job.rows_failed} con error (checkpoint {job.last_pk or "-"})'
+            )
@@ -0,0 +1,81 @@
+"""
+Comando de mantenimiento de la auditoría del baúl (VaultActivity).
+
+Crea por adelantado las particiones mensuales, consolida los últimos días en
+VaultActivityDaily y aplica la retención (eliminando particiones completas en
+PostgreSQL o borrando por lotes en otros motores). También purga las marcas de
+borrado de la sincronización incremental. Pensado para ejecutarse a diario
+desde cron.
+
+Uso:
+    python manage.py vault_activity_maintenance --convert
+    python manage.py vault_activity_maintenance
+    python manage.py vault_activity_maintenance --rollup-days 30 --retention-months 6
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.activity import (
+    apply_retention, convert_to_partitioned, ensure_partitions, is_partitioned,
+    partitioning_supported, rollup_activity
+)
+from core.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Particiones, resúmenes diarios y retención de la actividad del baúl'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Convierte la tabla de actividad en una tabla particionada (solo PostgreSQL)'
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=None,
+            help='Meses de particiones a crear por adelantado'
+        )
+        parser.add_argument(
+            '--rollup-days', type=int, default=2,
+            help='Días recientes a consolidar (incluye eventos que llegaron tarde)'
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=None,
+            help='Meses de actividad detallada a conservar'
+        )
+        parser.add_argument(
+            '--skip-retention', action='store_true',
+            help='No elimina actividad antigua'
+        )
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            if not partitioning_supported():
+                raise CommandError('El particionado requiere PostgreSQL')
+            copied = convert_to_partitioned(options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f'Tabla particionada ({copied} filas copiadas)'))
+
+        if is_partitioned():
+            created = ensure_partitions(options['ahead'])
+            self.stdout.write(f'Particiones creadas: {", ".join(created) or "ninguna"}')
+
+        today = timezone.localdate()
+        start = today - timedelta(days=max(options['rollup_days'], 1))
+        rows = rollup_activity(start, today - timedelta(days=1))
+        self.stdout.write(f'Resúmenes diarios escritos: {rows} ({start} a {today - timedelta(days=1)})')
+
+        if options['skip_retention']:
+            return
+
+        self.stdout.write(f'Marcas de borrado purgadas: {purge_tombstones()}')
+
+        result = apply_retention(options['retention_months'])
+        if 'partitions_dropped' in result:
+            dropped = result['partitions_dropped']
+            self.stdout.write(self.style.SUCCESS(
+                f'Particiones eliminadas: {", ".join(dropped) or "ninguna"}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Filas eliminadas: {result['rows_deleted']}"))
@@ -0,0 +1,79 @@
+"""
+Comando para comparar la latencia del desbloqueo del baúl bajo carga (WSGI frente a ASGI).
+
+Lanza N desbloqueos simultáneos de un mismo usuario contra la vista síncrona y
+contra la vista async. Las respuestas 503 (pool de KDF lleno) se cuentan aparte.
+
+Uso:
+    python manage.py vault_load_test --email usuario@ejemplo.com --password 'maestra'
+    python manage.py vault_load_test --email usuario@ejemplo.com --password 'maestra' \\
+        --concurrency 500 --wsgi-threads 32 --mode both --json
+"""
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import load_test_unlock
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia p99 del desbloqueo del baúl en WSGI y ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Usuario con contraseña maestra')
+        parser.add_argument('--password', required=True, help='Contraseña maestra del usuario')
+        parser.add_argument(
+            '--concurrency', type=int, default=500,
+            help='Desbloqueos simultáneos'
+        )
+        parser.add_argument(
+            '--wsgi-threads', type=int, default=32,
+            help='Hilos del worker WSGI emulado'
+        )
+        parser.add_argument(
+            '--mode', choices=['wsgi', 'asgi', 'both'], default='both',
+            help='Vistas a medir'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Imprime los resultados en JSON'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['email']}")
+
+        if options['concurrency'] <= 0 or options['wsgi_threads'] <= 0:
+            raise CommandError('--concurrency y --wsgi-threads deben ser positivos')
+
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        results = [
+            load_test_unlock(
+                mode, user, options['password'],
+                concurrency=options['concurrency'],
+                wsgi_threads=options['wsgi_threads'],
+            )
+            for mode in modes
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = (
+            f"{'modo':<6} {'ok':>6} {'503':>6} {'error':>6} {'req/s':>9} "
+            f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<6} {result['ok']:>6} {result['busy']:>6} {result['errors']:>6} "
+                f"{result['req_per_s']:>9.2f} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+                f"{result['p99_ms']:>10.2f} {result['max_ms']:>10.2f}"
+            )
@@ -4,7 +4,7 @@ Implementa headers de seguridad y prevención de ataques comunes.
 """
 
 import logging
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
 from django.conf import settings
@@ -12,6 +12,8 @@ from django.utils import timezone
 from datetime import timedelta
 import re
 
+from .kdf import KDFBusyError
+
 logger = logging.getLogger(__name__)
 
 
@@ -298,3 +300,22 @@ class RequestLoggingMiddleware(MiddlewareMixin):
         else:
             ip = request.META.get('REMOTE_ADDR', '0.0.0.0')
         return ip
+
+
+class KDFBusyMiddleware(MiddlewareMixin):
+    """
+    Convierte KDFBusyError en una respuesta 503 inmediata con Retry-After.
+    El pool de derivaciones está lleno y es mejor reintentar que encolar.
+    """
+    
+    def process_exception(self, request, exception):
+        if not isinstance(exception, KDFBusyError):
+            return None
+        
+        logger.warning(f'KDF executor saturated, rejecting {request.path}')
+        response = JsonResponse(
+            {'error': 'Servicio ocupado, intente de nuevo en unos segundos'},
+            status=503
+        )
+        response['Retry-After'] = str(exception.retry_after)
+        return response
@@ -0,0 +1,114 @@
+"""
+Migración perezosa de entradas cifradas al formato con clave del baúl.
+Las entradas 1.0 se re-cifran al leerlas y se escriben en segundo plano.
+"""
+
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyBlobMigrator:
+    """
+    Cola en segundo plano que persiste entradas ya re-cifradas.
+
+    El re-cifrado ocurre en la petición (es barato con la clave del baúl); aquí
+    solo se hace la escritura, condicionada a que la fila no haya cambiado
+    desde la lectura. Nunca se encola texto plano.
+    """
+
+    def __init__(self, max_pending=None):
+        self.max_pending = max_pending or getattr(settings, 'VAULT_MIGRATION_QUEUE_SIZE', 1000)
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.migrated = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'VAULT_LAZY_MIGRATION', True)
+
+    def enqueue(self, item_id, old_payload, new_blob: dict) -> bool:
+        """
+        Programa la escritura de una entrada migrada.
+        
+        Args:
+            item_id: Identificador de la entrada
+            old_payload (dict | memoryview): Datos cifrados leídos (JSON o binario)
+            new_blob (dict): Datos re-cifrados por AESCrypto
+
+        Returns:
+            bool: False si la migración está deshabilitada o la cola está llena
+        """
+        if not self.enabled:
+            return False
+
+        self._ensure_worker()
+        try:
+            if isinstance(old_payload, (bytes, bytearray, memoryview)):
+                old_payload = bytes(old_payload)
+            self._queue.put_nowait((item_id, old_payload, new_blob))
+            return True
+        except queue.Full:
+            # Se reintentará en el próximo acceso
+            self.dropped += 1
+            return False
+
+    def _ensure_worker(self):
+        """Arranca el hilo de escritura la primera vez que se necesita."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='vault-legacy-migrator', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        from .models import VaultItem
+
+        while True:
+            item_id, old_payload, new_blob = self._queue.get()
+            try:
+                close_old_connections()
+                # Se escribe en el formato configurado, igual que set_encrypted_payload()
+                staged = VaultItem(pk=item_id)
+                staged.set_encrypted_payload(new_blob)
+                
+                # Solo se escribe si nadie modificó la entrada mientras tanto
+                if isinstance(old_payload, bytes):
+                    rows = VaultItem.objects.filter(pk=item_id, encrypted_blob=old_payload)
+                else:
+                    rows = VaultItem.objects.filter(pk=item_id, encrypted_data=old_payload)
+                updated = rows.update(
+                    encrypted_data=staged.encrypted_data,
+                    encrypted_blob=staged.encrypted_blob,
+                )
+                if updated:
+                    self.migrated += 1
+                else:
+                    self.skipped += 1
+            except Exception as e:
+                logger.error(f'Error migrating vault item {item_id}: {str(e)}')
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """Contadores de la migración para monitoreo."""
+        return {
+            'pending': self._queue.qsize(),
+            'migrated': self.migrated,
+            'skipped': self.skipped,
+            'dropped': self.dropped,
+        }
+
+
+legacy_migrator = LegacyBlobMigrator()
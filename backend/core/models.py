@@ -3,13 +3,27 @@ Modelos para el sistema de baúl de contraseñas cifrado.
 Implementa almacenamiento seguro de datos sensibles similar a Bitwarden.
 """
 
+import base64
+import hashlib
+import hmac
+import os
+import secrets
 import uuid
+from asgiref.sync import sync_to_async
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from .crypto import VaultEntry, AESCrypto
+from .crypto import (
+    VaultEntry, aderive_master_keys, derive_master_keys, generate_vault_key, get_crypto,
+    item_associated_data, pack_envelope
+)
+from .file_store import file_store
+from .access_stats import access_stats
+from .kdf import KDFBusyError, configured_kdf, kdf_executor
+from .key_cache import recall_vault_key, remember_vault_key
+from .migrator import legacy_migrator
 import json
 import logging
 
@@ -103,7 +117,22 @@ class VaultItem(models.Model):
     # Datos cifrados
     encrypted_data = models.JSONField(
         _('datos cifrados'),
-        help_text=_('Datos sensibles cifrados con AES-256')
+        null=True,
+        blank=True,
+        help_text=_('Datos sensibles cifrados con AES-256 (formato JSON heredado)')
+    )
+    encrypted_blob = models.BinaryField(
+        _('datos cifrados (binario)'),
+        null=True,
+        blank=True,
+        help_text=_('Sobre binario compacto con los datos cifrados')
+    )
+    file_id = models.CharField(
+        _('archivo cifrado'),
+        max_length=32,
+        blank=True,
+        editable=False,
+        help_text=_('Identificador del archivo en el almacén (entradas de tipo archivo)')
     )
     
     # Timestamps
@@ -132,21 +161,104 @@ class VaultItem(models.Model):
             models.Index(fields=['user', 'is_favorite']),
             models.Index(fields=['user', 'folder']),
             models.Index(fields=['created_at']),
+            # Paginación por cursor y sincronización incremental (core.sync)
+            models.Index(fields=['user', 'updated_at', 'id']),
         ]
     
     def __str__(self):
         return f'{self.name} ({self.get_item_type_display()})'
     
-    def save_encrypted_data(self, data: dict, user_password: str):
+    # Campos que determinan los contadores de VaultStats
+    STATS_FIELDS = ('item_type', 'is_favorite', 'folder_id')
+    
+    # Los actualiza access_stats con access_count = access_count + n; un save()
+    # completo de una instancia leída antes del volcado no debe sobrescribirlos
+    ACCESS_FIELDS = ('access_count', 'last_accessed')
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.ACCESS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado leído de la base de datos, para calcular la diferencia al guardar
+        if all(field in field_names for field in cls.STATS_FIELDS):
+            instance._stats_state = instance.stats_state()
+        return instance
+    
+    def stats_state(self) -> tuple:
+        """Tipo, favorito y carpeta: lo que cuentan los contadores de VaultStats."""
+        return (self.item_type, self.is_favorite, self.folder_id)
+    
+    def get_encrypted_payload(self):
+        """
+        Retorna los datos cifrados almacenados, priorizando el sobre binario.
+        
+        Returns:
+            memoryview | dict: Sobre binario sin copiar, o el JSON heredado
+        """
+        if self.encrypted_blob is not None:
+            return memoryview(self.encrypted_blob)
+        return self.encrypted_data
+    
+    def set_encrypted_payload(self, encrypted: dict):
+        """
+        Almacena datos cifrados en el formato configurado (VAULT_BINARY_STORAGE).
+        
+        Args:
+            encrypted (dict): Datos cifrados generados por AESCrypto
+        """
+        if getattr(settings, 'VAULT_BINARY_STORAGE', True):
+            self.encrypted_blob = pack_envelope(encrypted)
+            self.encrypted_data = None
+        else:
+            self.encrypted_data = encrypted
+            self.encrypted_blob = None
+    
+    def get_associated_data(self) -> bytes:
+        """
+        Metadatos autenticados de la entrada (id y tipo) para el cifrado AES-GCM.
+        Cambiar item_type exige volver a cifrar los datos con update_encrypted_data().
+        """
+        return item_associated_data(self.id, self.item_type)
+    
+    def get_vault_key(self, user_password: str, cache_scope: tuple = None):
+        """
+        Obtiene la clave del baúl del propietario de la entrada.
+        
+        Args:
+            user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+        
+        Returns:
+            bytes: Clave del baúl, o None si el usuario no tiene contraseña maestra
+        """
+        try:
+            master_password = MasterPasswordHash.objects.get(user_id=self.user_id)
+        except MasterPasswordHash.DoesNotExist:
+            return None
+        return master_password.get_vault_key(user_password, cache_scope)
+    
+    def save_encrypted_data(self, data: dict, user_password: str, cache_scope: tuple = None,
+                            vault_key: bytes = None):
         """
         Guarda datos cifrados en la entrada.
         
         Args:
             data (dict): Datos a cifrar y guardar
             user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada (útil en importaciones masivas)
         """
         try:
-            vault = VaultEntry()
+            if vault_key is None:
+                vault_key = self.get_vault_key(user_password, cache_scope)
+            vault = VaultEntry(cache_scope=cache_scope, vault_key=vault_key)
             
             # Preparar datos con metadatos
             entry_data = {
@@ -159,61 +271,247 @@ class VaultItem(models.Model):
             }
             
             # Cifrar y guardar
-            self.encrypted_data = vault.create_entry(user_password, entry_data)
+            self.set_encrypted_payload(vault.create_entry(
+                user_password, entry_data, self.get_associated_data()
+            ))
+            # El índice de salud se actualiza al guardar la entrada (core.signals)
+            if self.item_type == 'login':
+                self._pending_health = (data.get('password', ''), vault_key)
             
             logger.info(f'Encrypted data saved for vault item: {self.name}')
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f'Error saving encrypted data: {str(e)}')
             raise ValidationError(f'Error al cifrar datos: {str(e)}')
     
-    def get_decrypted_data(self, user_password: str) -> dict:
+    def get_decrypted_data(self, user_password: str, cache_scope: tuple = None,
+                           vault_key: bytes = None, fields: list = None) -> dict:
         """
         Obtiene los datos descifrados de la entrada.
+        Las entradas en formato 1.0 se migran en segundo plano al formato actual.
         
         Args:
             user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada
+            fields (list, optional): Campos de 'data' a descifrar (por defecto todos)
         
         Returns:
             dict: Datos descifrados
         """
         try:
-            vault = VaultEntry()
-            decrypted_data = vault.decrypt_entry(self.encrypted_data, user_password)
+            if vault_key is None:
+                vault_key = self.get_vault_key(user_password, cache_scope)
+            vault = VaultEntry(cache_scope=cache_scope, vault_key=vault_key)
+            payload = self.get_encrypted_payload()
+            decrypted_data = vault.decrypt_entry(
+                payload, user_password, self.get_associated_data(), fields
+            )
             
-            # Actualizar estadísticas de acceso
-            self.access_count += 1
-            self.last_accessed = timezone.now()
-            self.save(update_fields=['access_count', 'last_accessed'])
+            # Migración perezosa: re-cifrar con la clave del baúl y escribir en segundo plano.
+            # Una lectura parcial no tiene la entrada completa: se migra en la siguiente lectura.
+            if vault_key and fields is None and vault.is_legacy(payload):
+                upgraded = vault.seal_entry(
+                    decrypted_data, user_password, self.get_associated_data()
+                )
+                if legacy_migrator.enqueue(self.pk, payload, upgraded):
+                    self.set_encrypted_payload(upgraded)
+            
+            self.record_access()
             
             logger.info(f'Vault item accessed: {self.name}')
             return decrypted_data
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f'Error decrypting data: {str(e)}')
             raise ValidationError(f'Error al descifrar datos: {str(e)}')
     
-    def update_encrypted_data(self, updates: dict, user_password: str):
+    def get_decrypted_field(self, field: str, user_password: str, cache_scope: tuple = None,
+                            vault_key: bytes = None):
+        """
+        Descifra un único campo de 'data' (por ejemplo password o totp para autocompletar).
+        
+        En entradas por campos (3.0) solo se descifran ese segmento y el de
+        metadatos, cuyo manifiesto comprueba que no falta ni sobra ningún
+        segmento; el resto de campos no se descifran ni se deserializan.
+        
+        Args:
+            field (str): Nombre del campo dentro de 'data'
+            user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada
+        
+        Returns:
+            Valor descifrado del campo
+        
+        Raises:
+            KeyError: Si la entrada no tiene ese campo
+        """
+        try:
+            if vault_key is None:
+                vault_key = self.get_vault_key(user_password, cache_scope)
+            vault = VaultEntry(cache_scope=cache_scope, vault_key=vault_key)
+            value = vault.decrypt_field(
+                self.get_encrypted_payload(), user_password, field, self.get_associated_data()
+            )
+            
+            self.record_access()
+            
+            logger.info(f'Vault item field accessed: {self.name} ({field})')
+            return value
+            
+        except (KDFBusyError, KeyError):
+            raise
+        except Exception as e:
+            logger.error(f'Error decrypting field: {str(e)}')
+            raise ValidationError(f'Error al descifrar campo: {str(e)}')
+    
+    def record_access(self):
+        """
+        Registra un acceso en el buffer de estadísticas (access_stats).
+        La lectura no escribe en la base de datos: el volcado es periódico.
+        """
+        self.last_accessed = access_stats.record(self.pk)
+    
+    @classmethod
+    def decrypt_many(cls, items, user_password: str, cache_scope: tuple = None,
+                     vault_key: bytes = None, workers: int = None,
+                     record_access: bool = True) -> list:
+        """
+        Descifra varias entradas de un mismo usuario sin escribir en la base de datos.
+        Los accesos se registran en el buffer de estadísticas (access_stats).
+        
+        Args:
+            items (iterable): Entradas VaultItem del mismo usuario
+            user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada
+            workers (int, optional): Número de hilos del pool
+            record_access (bool): Contar la lectura en las estadísticas de acceso
+                                  (no en análisis internos como el de salud)
+        
+        Returns:
+            list: Tuplas (datos, error) en el mismo orden que items
+        """
+        items = list(items)
+        if not items:
+            return []
+        
+        if vault_key is None:
+            try:
+                vault_key = items[0].get_vault_key(user_password, cache_scope)
+            except ValidationError as e:
+                logger.error(f'Error unlocking vault key for batch: {str(e)}')
+                return [(None, f'Error al descifrar datos: {str(e)}')] * len(items)
+        
+        vault = VaultEntry(cache_scope=cache_scope, vault_key=vault_key)
+        results = vault.decrypt_many(
+            [item.get_encrypted_payload() for item in items], user_password, workers,
+            [item.get_associated_data() for item in items]
+        )
+        
+        # Los accesos se acumulan en memoria: sincronizar el baúl no genera escrituras
+        if record_access:
+            for item, (data, error) in zip(items, results):
+                if error is None:
+                    item.record_access()
+        return results
+    
+    def update_encrypted_data(self, updates: dict, user_password: str, cache_scope: tuple = None,
+                              vault_key: bytes = None):
         """
         Actualiza datos cifrados existentes.
         
         Args:
             updates (dict): Datos a actualizar
             user_password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada
         """
         try:
-            vault = VaultEntry()
-            self.encrypted_data = vault.update_entry(
-                self.encrypted_data, 
+            if vault_key is None:
+                vault_key = self.get_vault_key(user_password, cache_scope)
+            vault = VaultEntry(cache_scope=cache_scope, vault_key=vault_key)
+            self.set_encrypted_payload(vault.update_entry(
+                self.get_encrypted_payload(), 
                 user_password, 
-                updates
-            )
+                updates,
+                self.get_associated_data()
+            ))
+            # El índice de salud se actualiza al guardar la entrada (core.signals)
+            if self.item_type == 'login' and 'password' in updates.get('data', {}):
+                self._pending_health = (updates['data']['password'], vault_key)
             
             logger.info(f'Vault item updated: {self.name}')
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f'Error updating encrypted data: {str(e)}')
             raise ValidationError(f'Error al actualizar datos: {str(e)}')
+
+    def save_encrypted_file(self, fileobj, filename: str, user_password: str,
+                            content_type: str = None, cache_scope: tuple = None,
+                            vault_key: bytes = None):
+        """
+        Cifra un archivo en streaming hacia el almacén de archivos.
+
+        El contenido se cifra por bloques con una clave aleatoria propia del
+        archivo; esa clave y los metadatos se guardan en los datos cifrados de
+        la entrada, por lo que solo se recuperan con la contraseña maestra. El
+        identificador del archivo se guarda además en claro (file_id) para poder
+        borrarlo del almacén al eliminar la entrada.
+
+        Args:
+            fileobj: Objeto file-like con read(n) (p. ej. UploadedFile)
+            filename (str): Nombre original del archivo
+            user_password (str): Contraseña maestra del usuario
+            content_type (str, optional): Tipo MIME del archivo
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+            vault_key (bytes, optional): Clave del baúl ya recuperada
+        """
+        file_id = uuid.uuid4().hex
+        file_key = os.urandom(32)
+        try:
+            size = file_store.write(file_id, fileobj, file_key)
+        except Exception as e:
+            logger.error(f'Error storing encrypted file: {str(e)}')
+            raise ValidationError(f'Error al cifrar archivo: {str(e)}')
+
+        try:
+            self.save_encrypted_data({
+                'file_id': file_id,
+                'file_key': base64.b64encode(file_key).decode('utf-8'),
+                'filename': filename,
+                'content_type': content_type or 'application/octet-stream',
+                'size': size,
+            }, user_password, cache_scope, vault_key)
+        except ValidationError:
+            file_store.delete(file_id)
+            raise
+        self.file_id = file_id
+
+    def read_encrypted_file(self, file_data: dict, start: int = 0, end: int = None):
+        """
+        Descifra en streaming el archivo de la entrada.
+
+        Args:
+            file_data (dict): Sección 'data' de la entrada descifrada (get_decrypted_data)
+            start (int): Primer byte del rango
+            end (int, optional): Último byte del rango (inclusivo)
+
+        Returns:
+            generator: Fragmentos de bytes en claro, con memoria constante
+        """
+        if 'file_id' not in file_data:
+            raise ValidationError('La entrada no contiene un archivo cifrado')
+
+        file_key = base64.b64decode(file_data['file_key'])
+        return file_store.read_range(file_data['file_id'], file_key, start, end)
     
     def get_safe_preview(self) -> dict:
         """
@@ -236,6 +534,111 @@ class VaultItem(models.Model):
         }
 
 
+class VaultStats(models.Model):
+    """
+    Contadores desnormalizados del baúl por usuario.
+    Los mantienen los signals de VaultItem (core.stats); repair_vault_stats los
+    recalcula si alguna escritura masiva los dejó desalineados.
+    """
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vault_stats',
+        verbose_name=_('usuario')
+    )
+    total_items = models.IntegerField(_('entradas'), default=0)
+    login_items = models.IntegerField(_('credenciales'), default=0)
+    note_items = models.IntegerField(_('notas'), default=0)
+    card_items = models.IntegerField(_('tarjetas'), default=0)
+    identity_items = models.IntegerField(_('identidades'), default=0)
+    file_items = models.IntegerField(_('archivos'), default=0)
+    favorite_items = models.IntegerField(_('favoritos'), default=0)
+    folder_items = models.JSONField(
+        _('entradas por carpeta'),
+        default=dict,
+        help_text=_('Id de carpeta -> número de entradas')
+    )
+    updated_at = models.DateTimeField(_('actualizado'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Estadísticas del Baúl')
+        verbose_name_plural = _('Estadísticas del Baúl')
+    
+    def __str__(self):
+        return f'{self.user.email}: {self.total_items} entradas'
+
+
+class PasswordHealthReport(models.Model):
+    """
+    Análisis de salud de contraseñas del usuario (core.health).
+    Los recuentos están en claro para el centro de seguridad; el detalle por
+    entrada (niveles y HMAC de las contraseñas) se cifra con la clave del baúl
+    y se actualiza con cada alta o cambio de contraseña. Los borrados se
+    aplican en la siguiente actualización con clave (pending_removals).
+    """
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='password_health',
+        verbose_name=_('usuario')
+    )
+    analyzed_passwords = models.PositiveIntegerField(_('contraseñas analizadas'), default=0)
+    weak_passwords = models.PositiveIntegerField(_('contraseñas débiles'), default=0)
+    breached_passwords = models.PositiveIntegerField(_('contraseñas filtradas'), default=0)
+    duplicate_passwords = models.PositiveIntegerField(_('contraseñas repetidas'), default=0)
+    old_passwords = models.PositiveIntegerField(_('contraseñas antiguas'), default=0)
+    encrypted_detail = models.JSONField(
+        _('detalle cifrado'),
+        help_text=_('Detalle por entrada cifrado con la clave del baúl (AES-256-GCM)')
+    )
+    pending_removals = models.JSONField(
+        _('borrados pendientes'),
+        default=list,
+        help_text=_('Entradas borradas que aún no se han quitado del detalle cifrado')
+    )
+    analyzed_at = models.DateTimeField(_('analizado'))
+    updated_at = models.DateTimeField(_('actualizado'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Informe de Salud de Contraseñas')
+        verbose_name_plural = _('Informes de Salud de Contraseñas')
+    
+    def __str__(self):
+        return f'{self.user.email}: {self.weak_passwords} débiles, {self.duplicate_passwords} repetidas'
+
+
+class VaultItemTombstone(models.Model):
+    """
+    Marca de una entrada borrada, para que la sincronización incremental
+    (since=<cursor>) informe de los borrados. Se purgan pasada la retención
+    VAULT_SYNC_TOMBSTONE_DAYS; un cursor más antiguo exige resincronizar.
+    """
+    
+    item_id = models.UUIDField(_('entrada'), primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='vault_tombstones',
+        verbose_name=_('usuario')
+    )
+    deleted_at = models.DateTimeField(_('borrado'), default=timezone.now)
+    
+    class Meta:
+        verbose_name = _('Entrada Borrada')
+        verbose_name_plural = _('Entradas Borradas')
+        ordering = ['-deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.item_id} ({self.deleted_at})'
+
+
 class VaultItemShare(models.Model):
     """
     Modelo para compartir entradas del baúl con otros usuarios.
@@ -355,7 +758,8 @@ class VaultActivity(models.Model):
         _('user agent'),
         blank=True
     )
-    timestamp = models.DateTimeField(_('fecha y hora'), auto_now_add=True)
+    # Sin auto_now_add: el escritor por lotes conserva la hora real del evento
+    timestamp = models.DateTimeField(_('fecha y hora'), default=timezone.now)
     
     class Meta:
         verbose_name = _('Actividad del Baúl')
@@ -372,12 +776,49 @@ class VaultActivity(models.Model):
         return f'{self.user.email} - {self.get_action_display()} - {item_name}'
 
 
+class VaultActivityDaily(models.Model):
+    """
+    Resumen diario de VaultActivity por usuario y acción.
+    Permite consultar periodos largos sin recorrer las filas de auditoría,
+    que se eliminan por particiones al vencer la retención (core.activity).
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='vault_activity_days',
+        verbose_name=_('usuario')
+    )
+    day = models.DateField(_('día'))
+    action = models.CharField(
+        _('acción'),
+        max_length=20,
+        choices=VaultActivity.ACTION_CHOICES
+    )
+    count = models.PositiveIntegerField(_('eventos'), default=0)
+    
+    class Meta:
+        verbose_name = _('Resumen Diario de Actividad')
+        verbose_name_plural = _('Resúmenes Diarios de Actividad')
+        ordering = ['-day']
+        unique_together = ['user', 'day', 'action']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.email} - {self.day} - {self.get_action_display()}: {self.count}'
+
+
 class MasterPasswordHash(models.Model):
     """
     Almacena el hash de la contraseña maestra del usuario.
     Se usa para verificar la contraseña sin almacenarla en texto plano.
     """
     
+    LEGACY_HASH = 1  # PBKDF2 directo; el sobre de la clave del baúl tiene su propio salt
+    HKDF_HASH = 2    # Una derivación PBKDF2 de la que salen el verificador y la KEK
+    
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -399,6 +840,29 @@ class MasterPasswordHash(models.Model):
         default=100000,
         help_text=_('Número de iteraciones PBKDF2')
     )
+    hash_version = models.PositiveSmallIntegerField(
+        _('versión del hash'),
+        default=1,
+        help_text=_('1: PBKDF2 directo; 2: KDF + HKDF (verificador y KEK del baúl)')
+    )
+    kdf_algorithm = models.CharField(
+        _('algoritmo KDF'),
+        max_length=20,
+        default='pbkdf2-sha256',
+        help_text=_('Estrategia de derivación (ver core.kdf)')
+    )
+    kdf_params = models.JSONField(
+        _('parámetros KDF'),
+        null=True,
+        blank=True,
+        help_text=_('Parámetros de coste de la KDF; vacío usa las iteraciones PBKDF2')
+    )
+    encrypted_vault_key = models.JSONField(
+        _('clave del baúl cifrada'),
+        null=True,
+        blank=True,
+        help_text=_('Clave aleatoria del baúl envuelta con la contraseña maestra y la clave del servidor')
+    )
     created_at = models.DateTimeField(_('creado'), auto_now_add=True)
     updated_at = models.DateTimeField(_('actualizado'), auto_now=True)
     
@@ -409,6 +873,67 @@ class MasterPasswordHash(models.Model):
     def __str__(self):
         return f'Contraseña maestra de {self.user.email}'
     
+    def _check_password(self, password: str) -> tuple:
+        """
+        Verifica la contraseña con una sola derivación.
+        
+        Returns:
+            tuple: (es válida, KEK del baúl); la KEK es None en hashes heredados
+        """
+        salt = bytes.fromhex(self.salt)
+        stored_hash = bytes.fromhex(self.password_hash)
+        
+        if self.hash_version >= self.HKDF_HASH:
+            verifier, kek = derive_master_keys(
+                password, salt, self.kdf_algorithm, self.get_kdf_params()
+            )
+            return hmac.compare_digest(verifier, stored_hash), kek
+        
+        password_hash = hashlib.pbkdf2_hmac(
+            'sha256',
+            password.encode('utf-8'),
+            salt,
+            self.iterations
+        )
+        return hmac.compare_digest(password_hash, stored_hash), None
+    
+    async def _acheck_password(self, password: str) -> tuple:
+        """
+        Versión asíncrona de _check_password(): el KDF se espera en kdf_executor.
+        
+        Returns:
+            tuple: (válida, kek); kek es None en hashes heredados
+        """
+        salt = bytes.fromhex(self.salt)
+        stored_hash = bytes.fromhex(self.password_hash)
+        
+        if self.hash_version >= self.HKDF_HASH:
+            verifier, kek = await aderive_master_keys(
+                password, salt, self.kdf_algorithm, self.get_kdf_params()
+            )
+            return hmac.compare_digest(verifier, stored_hash), kek
+        
+        password_hash = await kdf_executor.arun(
+            hashlib.pbkdf2_hmac, 'sha256', password.encode('utf-8'), salt, self.iterations
+        )
+        return hmac.compare_digest(password_hash, stored_hash), None
+    
+    def get_kdf_params(self) -> dict:
+        """Parámetros de la KDF del usuario (los hashes PBKDF2 antiguos usan iterations)."""
+        if self.kdf_params:
+            return self.kdf_params
+        return {'iterations': self.iterations}
+    
+    def needs_rehash(self) -> bool:
+        """
+        Indica si el hash no usa el formato o la KDF configurados actualmente.
+        Se actualiza en el siguiente desbloqueo correcto (ver calibrate_kdf).
+        """
+        if self.hash_version < self.HKDF_HASH:
+            return True
+        kdf_name, kdf_params = configured_kdf()
+        return (self.kdf_algorithm, self.get_kdf_params()) != (kdf_name, kdf_params)
+    
     def verify_password(self, password: str) -> bool:
         """
         Verifica si la contraseña proporcionada coincide con la almacenada.
@@ -420,55 +945,237 @@ class MasterPasswordHash(models.Model):
             bool: True si la contraseña es correcta
         """
         try:
-            crypto = AESCrypto()
-            derived_key, _ = crypto.generate_key_from_password(
-                password, 
-                bytes.fromhex(self.salt)
-            )
-            
-            # Comparar hashes
-            import hashlib
-            password_hash = hashlib.pbkdf2_hmac(
-                'sha256',
-                password.encode('utf-8'),
-                bytes.fromhex(self.salt),
-                self.iterations
-            )
-            
-            stored_hash = bytes.fromhex(self.password_hash)
-            return hashlib.compare_digest(password_hash, stored_hash)
+            return self._check_password(password)[0]
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f'Error verifying master password: {str(e)}')
             return False
     
-    def set_password(self, password: str):
+    def set_password(self, password: str, vault_key: bytes = None):
         """
         Establece una nueva contraseña maestra.
         
+        Si el usuario ya tiene clave del baúl, se vuelve a envolver con la KEK
+        de la nueva contraseña; sin ella el baúl quedaría inaccesible.
+        
         Args:
             password (str): Nueva contraseña maestra
+            vault_key (bytes, optional): Clave del baúl actual (obligatoria si ya existe)
         """
+        if self.encrypted_vault_key and vault_key is None:
+            raise ValidationError(
+                'Se requiere la clave del baúl para cambiar la contraseña maestra'
+            )
+        
         try:
-            import hashlib
-            import secrets
-            
             # Generar salt aleatorio
             salt = secrets.token_hex(16)
             
-            # Generar hash
-            password_hash = hashlib.pbkdf2_hmac(
-                'sha256',
-                password.encode('utf-8'),
-                bytes.fromhex(salt),
-                self.iterations
-            )
+            # Verificador y KEK en una sola derivación, con la KDF configurada
+            kdf_name, kdf_params = configured_kdf()
+            verifier, kek = derive_master_keys(password, bytes.fromhex(salt), kdf_name, kdf_params)
             
             self.salt = salt
-            self.password_hash = password_hash.hex()
+            self.password_hash = verifier.hex()
+            self.hash_version = self.HKDF_HASH
+            self.kdf_algorithm = kdf_name
+            self.kdf_params = kdf_params
+            if 'iterations' in kdf_params:
+                self.iterations = kdf_params['iterations']
+            if vault_key is not None:
+                self.encrypted_vault_key = get_crypto().wrap_vault_key(vault_key, kek=kek)
             
             logger.info(f'Master password set for user: {self.user.email}')
             
+        except KDFBusyError:
+            raise
         except Exception as e:
             logger.error(f'Error setting master password: {str(e)}')
             raise ValidationError(f'Error al establecer contraseña maestra: {str(e)}')
+    
+    def unlock(self, password: str, cache_scope: tuple = None):
+        """
+        Verifica la contraseña y recupera la clave del baúl con un solo KDF.
+        
+        La clave queda en la caché de la sesión, así que las operaciones
+        posteriores sobre entradas no repiten ningún KDF. Los hashes heredados y
+        los sobres con salt propio se actualizan al formato de una derivación.
+        
+        Args:
+            password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la sesión que recibe la clave
+        
+        Returns:
+            bytes: Clave del baúl, o None si la contraseña es incorrecta
+        """
+        valid, kek = self._check_password(password)
+        if not valid:
+            return None
+        return self._open_vault(password, kek, cache_scope)
+    
+    async def aunlock(self, password: str, cache_scope: tuple = None):
+        """
+        Versión asíncrona de unlock() para las vistas ASGI.
+        
+        El KDF se espera sin bloquear el event loop; el resto (desenvolver la
+        clave y, si hace falta, actualizar el formato) es breve y usa el ORM,
+        así que se ejecuta con sync_to_async.
+        
+        Returns:
+            bytes: Clave del baúl, o None si la contraseña es incorrecta
+        """
+        valid, kek = await self._acheck_password(password)
+        if not valid:
+            return None
+        return await sync_to_async(self._open_vault)(password, kek, cache_scope)
+    
+    def _open_vault(self, password: str, kek: bytes, cache_scope: tuple = None):
+        """
+        Recupera (o crea) la clave del baúl tras verificar la contraseña.
+        
+        Returns:
+            bytes: Clave del baúl
+        """
+        crypto = get_crypto()
+        envelope = self.encrypted_vault_key
+        
+        if envelope and kek is not None and 'salt' not in envelope:
+            vault_key = crypto.unwrap_vault_key(envelope, kek=kek)
+            if self.needs_rehash():
+                # Cambió la KDF configurada: se re-deriva con los nuevos parámetros
+                self._upgrade(password, vault_key)
+        elif envelope:
+            # Formato anterior: se paga un KDF extra una única vez para actualizarlo
+            vault_key = crypto.unwrap_vault_key(envelope, password)
+            self._upgrade(password, vault_key, kek)
+        else:
+            vault_key = generate_vault_key()
+            if not self._upgrade(password, vault_key, kek, create=True):
+                # Otra petición creó la clave primero: usar la suya
+                self.refresh_from_db()
+                return self.unlock(password, cache_scope)
+            logger.info(f'Vault key created for user: {self.user_id}')
+        
+        remember_vault_key(cache_scope, password, vault_key)
+        return vault_key
+    
+    def _upgrade(self, password: str, vault_key: bytes, kek: bytes = None,
+                 create: bool = False) -> bool:
+        """
+        Guarda el hash y el sobre en el formato de una sola derivación.
+        
+        Returns:
+            bool: False si create=True y otra petición ya había creado la clave
+        """
+        if kek is None or self.needs_rehash():
+            # Hash heredado o KDF desactualizada: nuevo salt, KDF configurada y HKDF
+            self.encrypted_vault_key = None
+            self.set_password(password, vault_key)
+        else:
+            self.encrypted_vault_key = get_crypto().wrap_vault_key(vault_key, kek=kek)
+        
+        rows = MasterPasswordHash.objects.filter(pk=self.pk)
+        if create:
+            rows = rows.filter(encrypted_vault_key__isnull=True)
+        updated = rows.update(
+            password_hash=self.password_hash,
+            salt=self.salt,
+            iterations=self.iterations,
+            hash_version=self.hash_version,
+            kdf_algorithm=self.kdf_algorithm,
+            kdf_params=self.kdf_params,
+            encrypted_vault_key=self.encrypted_vault_key,
+            updated_at=timezone.now(),
+        )
+        return bool(updated)
+    
+    def get_vault_key(self, password: str, cache_scope: tuple = None) -> bytes:
+        """
+        Recupera la clave del baúl, creándola la primera vez.
+        Con el baúl desbloqueado se obtiene de la caché de la sesión.
+        
+        Args:
+            password (str): Contraseña maestra del usuario
+            cache_scope (tuple, optional): Alcance de la caché de claves del baúl desbloqueado
+        
+        Returns:
+            bytes: Clave del baúl
+        """
+        vault_key = recall_vault_key(cache_scope, password)
+        if vault_key is not None:
+            return vault_key
+        
+        vault_key = self.unlock(password, cache_scope)
+        if vault_key is None:
+            raise ValidationError('Contraseña maestra incorrecta')
+        return vault_key
+    
+    async def aget_vault_key(self, password: str, cache_scope: tuple = None) -> bytes:
+        """
+        Versión asíncrona de get_vault_key().
+        
+        Returns:
+            bytes: Clave del baúl
+        """
+        vault_key = recall_vault_key(cache_scope, password)
+        if vault_key is not None:
+            return vault_key
+        
+        vault_key = await self.aunlock(password, cache_scope)
+        if vault_key is None:
+            raise ValidationError('Contraseña maestra incorrecta')
+        return vault_key
+
+
+class KeyRotationJob(models.Model):
+    """
+    Progreso de la rotación de la clave maestra para una tabla.
+    Guarda el último pk procesado para poder reanudar el trabajo.
+    """
+    
+    STATUS_CHOICES = [
+        ('running', _('En ejecución')),
+        ('completed', _('Completado')),
+        ('failed', _('Fallido')),
+    ]
+    
+    target_key_id = models.CharField(
+        _('id de clave destino'),
+        max_length=64,
+        help_text=_('Id de la clave maestra activa durante la rotación')
+    )
+    model_label = models.CharField(
+        _('modelo'),
+        max_length=100,
+        help_text=_('Tabla rotada (app_label.Modelo)')
+    )
+    last_pk = models.CharField(
+        _('último pk'),
+        max_length=64,
+        blank=True,
+        help_text=_('Checkpoint: último pk confirmado')
+    )
+    rows_scanned = models.PositiveBigIntegerField(_('filas leídas'), default=0)
+    rows_rewrapped = models.PositiveBigIntegerField(_('filas re-cifradas'), default=0)
+    rows_failed = models.PositiveBigIntegerField(_('filas con error'), default=0)
+    status = models.CharField(
+        _('estado'),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='running'
+    )
+    error = models.TextField(_('error'), blank=True)
+    started_at = models.DateTimeField(_('iniciado'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('actualizado'), auto_now=True)
+    completed_at = models.DateTimeField(_('completado'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Rotación de Clave Maestra')
+        verbose_name_plural = _('Rotaciones de Clave Maestra')
+        unique_together = ['target_key_id', 'model_label']
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f'{self.model_label} -> {self.target_key_id} ({self.get_status_display()})'
@@ -0,0 +1,213 @@
+"""
+Rotación en línea de la clave maestra del servidor.
+
+Solo se vuelve a cifrar la capa que depende de la clave maestra (la capa
+externa CBC y los sobres de la clave del baúl), así que no se necesitan las
+contraseñas de los usuarios. Las filas se recorren por lotes paginados por
+clave primaria y cada lote confirma su checkpoint en la misma transacción.
+"""
+
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .crypto import get_crypto
+from .models import KeyRotationJob, MasterPasswordHash, VaultItem, VaultItemShare
+
+logger = logging.getLogger(__name__)
+
+
+class RotationTarget:
+    """
+    Tabla con datos cifrados bajo la clave maestra.
+
+    Args:
+        model: Modelo Django
+        fields (list): Campos que se escriben con bulk_update
+        read (callable): obj -> datos cifrados, o None si la fila no tiene
+        write (callable): (obj, crypto, datos) -> None; re-cifra y asigna en obj
+    """
+
+    def __init__(self, model, fields, read, write):
+        self.model = model
+        self.fields = fields
+        self.read = read
+        self.write = write
+
+    @property
+    def label(self) -> str:
+        return self.model._meta.label
+
+
+def _read_share(share):
+    data = share.encrypted_data_for_user
+    return data if isinstance(data, dict) and 'ciphertext' in data else None
+
+
+def _write_share(share, crypto, data):
+    share.encrypted_data_for_user = crypto.rewrap_master_layer(data)
+
+
+def _write_item(item, crypto, data):
+    item.set_encrypted_payload(crypto.rewrap_master_layer(data))
+
+
+def _write_vault_key(master_hash, crypto, data):
+    master_hash.encrypted_vault_key = crypto.rewrap_vault_key(data)
+
+
+DEFAULT_TARGETS = [
+    RotationTarget(
+        VaultItem, ['encrypted_blob', 'encrypted_data'],
+        VaultItem.get_encrypted_payload, _write_item
+    ),
+    RotationTarget(
+        VaultItemShare, ['encrypted_data_for_user'],
+        _read_share, _write_share
+    ),
+    RotationTarget(
+        MasterPasswordHash, ['encrypted_vault_key'],
+        lambda master_hash: master_hash.encrypted_vault_key, _write_vault_key
+    ),
+]
+
+
+class MasterKeyRotator:
+    """
+    Re-cifra la capa maestra de todas las tablas con la clave activa del llavero.
+
+    Es reanudable: el progreso se guarda en KeyRotationJob por (clave, tabla).
+    """
+
+    def __init__(self, crypto=None, batch_size: int = 500, max_rate: float = None,
+                 progress=None, targets=None):
+        """
+        Args:
+            crypto (AESCrypto, optional): Instancia con el llavero (por defecto get_crypto())
+            batch_size (int): Filas por lote; cada lote es una transacción corta
+            max_rate (float, optional): Límite de filas por segundo
+            progress (callable, optional): Se llama con (job, filas/s) tras cada lote
+            targets (list, optional): Tablas a rotar (por defecto DEFAULT_TARGETS)
+        """
+        self.crypto = crypto or get_crypto()
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.progress = progress
+        self.targets = targets or DEFAULT_TARGETS
+
+    def run(self, restart: bool = False) -> list:
+        """
+        Rota todas las tablas en orden.
+
+        Returns:
+            list: KeyRotationJob de cada tabla
+        """
+        return [self.run_target(target, restart) for target in self.targets]
+
+    def run_target(self, target: RotationTarget, restart: bool = False) -> KeyRotationJob:
+        """
+        Rota una tabla desde su último checkpoint.
+
+        Args:
+            target (RotationTarget): Tabla a rotar
+            restart (bool): Ignorar el checkpoint y empezar desde el principio
+
+        Returns:
+            KeyRotationJob: Estado final del trabajo
+        """
+        job, _ = KeyRotationJob.objects.get_or_create(
+            target_key_id=self.crypto.key_id, model_label=target.label
+        )
+        if restart:
+            job.last_pk = ''
+            job.rows_scanned = job.rows_rewrapped = job.rows_failed = 0
+            job.completed_at = None
+        elif job.status == 'completed':
+            return job
+
+        job.status = 'running'
+        job.error = ''
+        job.save()
+
+        started = time.monotonic()
+        scanned = 0
+
+        try:
+            while True:
+                batch_started = time.monotonic()
+                batch_size = self._process_batch(target, job)
+                if not batch_size:
+                    break
+
+                scanned += batch_size
+                if self.progress:
+                    self.progress(job, scanned / max(time.monotonic() - started, 1e-6))
+                self._throttle(batch_size, time.monotonic() - batch_started)
+
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            job.save(update_fields=['status', 'error', 'updated_at'])
+            logger.error(f'Master key rotation failed for {target.label}: {str(e)}')
+            raise
+
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'completed_at', 'updated_at'])
+        logger.info(
+            f'Master key rotation completed for {target.label}: '
+            f'{job.rows_rewrapped} rewrapped, {job.rows_failed} failed'
+        )
+        return job
+
+    def _process_batch(self, target: RotationTarget, job: KeyRotationJob) -> int:
+        """
+        Re-cifra un lote y guarda el checkpoint en la misma transacción.
+        Solo se bloquean las filas del lote, nunca la tabla.
+
+        Returns:
+            int: Filas leídas (0 si ya no quedan)
+        """
+        with transaction.atomic():
+            queryset = target.model.objects.order_by('pk').only('pk', *target.fields)
+            if job.last_pk:
+                queryset = queryset.filter(pk__gt=job.last_pk)
+            batch = list(queryset.select_for_update()[:self.batch_size])
+            if not batch:
+                return 0
+
+            changed = []
+            for obj in batch:
+                data = target.read(obj)
+                if not data:
+                    continue
+                try:
+                    if self.crypto.needs_rewrap(data):
+                        target.write(obj, self.crypto, data)
+                        changed.append(obj)
+                except Exception as e:
+                    # Una fila ilegible no debe detener la rotación; queda registrada
+                    job.rows_failed += 1
+                    logger.error(f'Error rewrapping {target.label} {obj.pk}: {str(e)}')
+
+            if changed:
+                target.model.objects.bulk_update(changed, target.fields)
+
+            job.last_pk = str(batch[-1].pk)
+            job.rows_scanned += len(batch)
+            job.rows_rewrapped += len(changed)
+            job.save(update_fields=[
+                'last_pk', 'rows_scanned', 'rows_rewrapped', 'rows_failed', 'updated_at'
+            ])
+
+        return len(batch)
+
+    def _throttle(self, rows: int, elapsed: float):
+        """Duerme lo necesario para no superar max_rate filas por segundo."""
+        if not self.max_rate:
+            return
+        pause = rows / self.max_rate - elapsed
+        if pause > 0:
+            time.sleep(pause)
@@ -0,0 +1,163 @@
+"""
+Signals del baúl de contraseñas.
+Gestiona la limpieza de material criptográfico asociado a la sesión.
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .breach import reset_breach_index
+from .crypto import reset_crypto
+from .file_store import file_store
+from .health import forget_item, index_password
+from .key_cache import derived_key_cache
+from .models import MasterPasswordHash, VaultFolder, VaultItem, VaultItemTombstone
+from .stats import forget_folder, invalidate_vault_stats, record_item_change
+from usuarios.models import UserProfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(user_logged_out)
+def clear_vault_keys_on_logout(sender, request, user, **kwargs):
+    """
+    Elimina las claves derivadas cacheadas cuando el usuario cierra sesión.
+    """
+    if user is None:
+        return
+    
+    removed = derived_key_cache.clear_user(user.pk)
+    if removed:
+        logger.info(f'Claves del baúl eliminadas de caché al cerrar sesión: {user.email}')
+
+
+@receiver(setting_changed)
+def reset_master_keys_on_setting_change(sender, setting, **kwargs):
+    """
+    Reconstruye el llavero de claves maestras (o reabre el índice de
+    filtraciones) si cambia su configuración (p. ej. override_settings en pruebas).
+    """
+    if setting.startswith('ENCRYPTION_'):
+        reset_crypto()
+    elif setting == 'VAULT_BREACH_INDEX_PATH':
+        reset_breach_index()
+
+
+def _deleting_user(origin) -> bool:
+    """True si el borrado en cascada empezó por el propio usuario."""
+    user_model = get_user_model()
+    return isinstance(origin, user_model) or getattr(origin, 'model', None) is user_model
+
+
+@receiver(post_delete, sender=VaultItem)
+def record_vault_item_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Deja constancia del borrado para la sincronización incremental.
+    No se registra cuando se borra el propio usuario: sus marcas también desaparecen.
+    """
+    if _deleting_user(origin):
+        return
+    
+    VaultItemTombstone.objects.create(item_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(pre_save, sender=VaultItem)
+def load_vault_item_stats_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Recupera el estado previo de una entrada que no se cargó completa
+    (p. ej. con only()), para calcular la diferencia de contadores.
+    """
+    if raw or instance._state.adding or hasattr(instance, '_stats_state'):
+        return
+    if update_fields is not None and not set(update_fields) & {'item_type', 'is_favorite', 'folder'}:
+        return
+    
+    instance._stats_state = VaultItem.objects.filter(pk=instance.pk).values_list(
+        *VaultItem.STATS_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=VaultItem)
+def update_vault_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Mantiene VaultStats en la misma transacción que el alta o el cambio."""
+    if raw:
+        return
+    
+    new_state = instance.stats_state()
+    old_state = None if created else getattr(instance, '_stats_state', new_state)
+    record_item_change(instance.user_id, old_state, new_state)
+    instance._stats_state = new_state
+
+
+@receiver(post_delete, sender=VaultItem)
+def update_vault_stats_on_delete(sender, instance, origin=None, **kwargs):
+    """Descuenta la entrada borrada (salvo al borrar el usuario, que elimina VaultStats)."""
+    if _deleting_user(origin):
+        return
+    
+    record_item_change(
+        instance.user_id, getattr(instance, '_stats_state', instance.stats_state()), None
+    )
+
+
+@receiver(post_delete, sender=VaultFolder)
+def update_vault_stats_on_folder_delete(sender, instance, origin=None, **kwargs):
+    """Las entradas de la carpeta borrada quedan sin carpeta."""
+    if _deleting_user(origin):
+        return
+    
+    forget_folder(instance.user_id, instance.pk)
+
+
+@receiver(post_save, sender=VaultItem)
+def update_password_health_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Lleva al índice de salud la contraseña que save_encrypted_data() o
+    update_encrypted_data() tenían en claro, una vez guardada la entrada.
+    """
+    pending = instance.__dict__.pop('_pending_health', None)
+    if raw or pending is None:
+        return
+    
+    password, vault_key = pending
+    try:
+        index_password(instance, password, vault_key)
+    except Exception as e:
+        # El índice se reconstruye con un análisis completo (vault_health_api)
+        logger.warning(f'Error updating password health index: {str(e)}')
+
+
+@receiver(post_delete, sender=VaultItem)
+def update_password_health_on_delete(sender, instance, origin=None, **kwargs):
+    """Anota la entrada borrada para quitarla del índice de salud."""
+    if _deleting_user(origin) or instance.item_type != 'login':
+        return
+    
+    forget_item(instance.user_id, instance.pk)
+
+
+@receiver(post_delete, sender=VaultItem)
+def delete_vault_item_file(sender, instance, **kwargs):
+    """
+    Elimina del almacén el archivo cifrado de la entrada borrada (también al
+    borrar el usuario), una vez confirmada la transacción.
+    """
+    if not instance.file_id:
+        return
+    
+    file_id = instance.file_id
+    transaction.on_commit(lambda: file_store.delete(file_id))
+
+
+@receiver(post_save, sender=VaultItem)
+@receiver(post_delete, sender=VaultItem)
+@receiver(post_save, sender=MasterPasswordHash)
+@receiver(post_delete, sender=MasterPasswordHash)
+@receiver(post_save, sender=UserProfile)
+def invalidate_vault_stats_cache(sender, instance, **kwargs):
+    """Las estadísticas del dashboard se recalculan en la siguiente consulta."""
+    invalidate_vault_stats(instance.user_id)
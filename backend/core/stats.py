@@ -0,0 +1,229 @@
+"""
+Estadísticas del baúl por usuario para el dashboard.
+
+Los recuentos viven desnormalizados en VaultStats (una fila por usuario) y se
+mantienen en la misma transacción que cada alta, cambio o baja de VaultItem
+(signals en core.signals), de modo que leerlos es una búsqueda por clave
+primaria. Las escrituras masivas que no emiten signals (QuerySet.update(),
+bulk_create) se corrigen con el comando repair_vault_stats.
+
+La lectura, junto con los datos de la puntuación de seguridad, se hace en una
+sola consulta y se guarda en la caché de Django por usuario.
+"""
+
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import MasterPasswordHash, VaultItem, VaultStats
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'vault-stats'
+
+TYPE_FIELDS = {item_type: f'{item_type}_items' for item_type, _ in VaultItem.ITEM_TYPES}
+COUNTER_FIELDS = ('total_items', *TYPE_FIELDS.values(), 'favorite_items', 'folder_items')
+
+
+def _cache_key(user_id) -> str:
+    return f'{CACHE_PREFIX}:{user_id}'
+
+
+def count_vault_items(user_id) -> dict:
+    """
+    Recuenta los contadores de VaultStats a partir de VaultItem.
+
+    Returns:
+        dict: Valores de COUNTER_FIELDS
+    """
+    items = VaultItem.objects.filter(user_id=user_id).order_by()
+    counters = items.aggregate(
+        total_items=Count('id'),
+        favorite_items=Count('id', filter=Q(is_favorite=True)),
+        **{field: Count('id', filter=Q(item_type=item_type)) for item_type, field in TYPE_FIELDS.items()}
+    )
+    counters['folder_items'] = {
+        str(folder_id): total for folder_id, total in
+        items.filter(folder__isnull=False).values_list('folder_id').annotate(total=Count('id'))
+    }
+    return counters
+
+
+def rebuild_vault_stats(user_id) -> bool:
+    """
+    Recalcula la fila de VaultStats de un usuario.
+
+    Returns:
+        bool: True si los contadores guardados no coincidían
+    """
+    counters = count_vault_items(user_id)
+    with transaction.atomic():
+        stats, created = VaultStats.objects.select_for_update().get_or_create(
+            user_id=user_id, defaults=counters
+        )
+        if not created:
+            if all(getattr(stats, field) == value for field, value in counters.items()):
+                return False
+            for field, value in counters.items():
+                setattr(stats, field, value)
+            stats.save()
+    invalidate_vault_stats(user_id)
+    return True
+
+
+def _apply(stats: VaultStats, state: tuple, sign: int):
+    item_type, is_favorite, folder_id = state
+    stats.total_items += sign
+    if item_type in TYPE_FIELDS:
+        field = TYPE_FIELDS[item_type]
+        setattr(stats, field, getattr(stats, field) + sign)
+    if is_favorite:
+        stats.favorite_items += sign
+    if folder_id is not None:
+        key = str(folder_id)
+        total = stats.folder_items.get(key, 0) + sign
+        if total > 0:
+            stats.folder_items[key] = total
+        else:
+            stats.folder_items.pop(key, None)
+
+
+def record_item_change(user_id, old_state: tuple = None, new_state: tuple = None):
+    """
+    Aplica a VaultStats el alta (sin old_state), baja (sin new_state) o cambio
+    de una entrada. La fila se bloquea con SELECT ... FOR UPDATE, así que los
+    cambios concurrentes del mismo usuario no se pisan.
+
+    Args:
+        user_id: Propietario de la entrada
+        old_state (tuple): VaultItem.stats_state() antes del cambio
+        new_state (tuple): VaultItem.stats_state() después del cambio
+    """
+    if old_state == new_state:
+        return
+
+    with transaction.atomic():
+        stats = VaultStats.objects.select_for_update().filter(pk=user_id).first()
+        if stats is None:
+            # Primera escritura del usuario: el recuento ya incluye este cambio
+            try:
+                with transaction.atomic():
+                    VaultStats.objects.create(user_id=user_id, **count_vault_items(user_id))
+                return
+            except IntegrityError:
+                stats = VaultStats.objects.select_for_update().get(pk=user_id)
+
+        if old_state is not None:
+            _apply(stats, old_state, -1)
+        if new_state is not None:
+            _apply(stats, new_state, 1)
+        stats.save()
+
+
+def forget_folder(user_id, folder_id):
+    """
+    Quita una carpeta borrada de los contadores. Sus entradas pasan a
+    folder=NULL mediante un UPDATE sin signals (on_delete=SET_NULL).
+    """
+    with transaction.atomic():
+        stats = VaultStats.objects.select_for_update().filter(pk=user_id).first()
+        if stats is not None and stats.folder_items.pop(str(folder_id), None) is not None:
+            stats.save(update_fields=['folder_items', 'updated_at'])
+    invalidate_vault_stats(user_id)
+
+
+def compute_vault_stats(user_id) -> dict:
+    """
+    Contadores de VaultStats y datos de la puntuación de seguridad en una consulta
+    (búsqueda por clave primaria del usuario).
+
+    Returns:
+        dict: total_items, <tipo>_items por cada tipo, favorite_items,
+            folder_items, has_master_password, two_factor_enabled
+    """
+    from usuarios.models import UserProfile
+
+    row = (
+        get_user_model().objects
+        .filter(pk=user_id)
+        .values(**{field: F(f'vault_stats__{field}') for field in COUNTER_FIELDS})
+        .annotate(
+            has_master_password=Exists(
+                MasterPasswordHash.objects.filter(user=OuterRef('pk'))
+            ),
+            two_factor_enabled=Coalesce(
+                Subquery(
+                    UserProfile.objects.filter(user=OuterRef('pk')).values('two_factor_enabled')[:1]
+                ),
+                Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        .first()
+    )
+
+    if row is None:
+        return {
+            **{field: 0 for field in COUNTER_FIELDS[:-1]}, 'folder_items': {},
+            'has_master_password': False, 'two_factor_enabled': False,
+        }
+
+    if row['total_items'] is None:
+        # Usuario anterior a VaultStats: se crea su fila una sola vez
+        rebuild_vault_stats(user_id)
+        return compute_vault_stats(user_id)
+    return row
+
+
+def get_vault_stats(user_id) -> dict:
+    """
+    Estadísticas del baúl desde la caché (VAULT_STATS_CACHE_TIMEOUT segundos).
+
+    Returns:
+        dict: Ver compute_vault_stats()
+    """
+    key = _cache_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_vault_stats(user_id)
+        cache.set(key, stats, getattr(settings, 'VAULT_STATS_CACHE_TIMEOUT', 300))
+    return stats
+
+
+def invalidate_vault_stats(user_id):
+    """Descarta las estadísticas cacheadas de un usuario."""
+    cache.delete(_cache_key(user_id))
+
+
+def security_score(user, stats: dict) -> int:
+    """
+    Puntuación básica de seguridad (0-100).
+
+    Args:
+        user: Usuario (solo se lee email_verified, ya cargado en la petición)
+        stats (dict): Resultado de get_vault_stats()
+    """
+    score = 0
+
+    # Email verificado: +20 puntos
+    if user.email_verified:
+        score += 20
+
+    # 2FA habilitado: +30 puntos
+    if stats['two_factor_enabled']:
+        score += 30
+
+    # Tiene entradas en el baúl: +20 puntos
+    if stats['total_items']:
+        score += 20
+
+    # Contraseña maestra configurada: +30 puntos
+    if stats['has_master_password']:
+        score += 30
+
+    return min(score, 100)
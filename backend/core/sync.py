@@ -0,0 +1,159 @@
+"""
+Listado paginado por cursor y sincronización incremental del baúl.
+
+Las entradas se recorren en orden (updated_at, id) con paginación por clave
+(keyset): cada página continúa donde terminó la anterior sin OFFSET, de modo
+que el coste no crece con la posición. El cursor de la última página sirve
+como token de sincronización: con since=<cursor> solo se devuelven las
+entradas modificadas después y los ids de las borradas (VaultItemTombstone).
+"""
+
+import base64
+import binascii
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import VaultItem, VaultItemTombstone
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Campos que necesita get_safe_preview(); nunca se cargan los datos cifrados
+PREVIEW_FIELDS = (
+    'id', 'name', 'item_type', 'is_favorite', 'folder__name',
+    'created_at', 'updated_at', 'last_accessed', 'access_count',
+)
+
+ZERO_ID = uuid.UUID(int=0)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CursorError(ValueError):
+    """Cursor mal formado."""
+
+
+class ResyncRequired(Exception):
+    """El cursor es anterior a la retención de borrados: hay que listar de cero."""
+
+
+def encode_cursor(updated_at: datetime, item_id) -> str:
+    """Cursor opaco para la posición (updated_at, id)."""
+    raw = f'{updated_at.isoformat()}|{item_id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Interpreta un cursor generado por encode_cursor().
+
+    Raises:
+        CursorError: Si el cursor no es válido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        updated_at, item_id = raw.split('|')
+        updated_at = datetime.fromisoformat(updated_at)
+        if timezone.is_naive(updated_at):
+            raise ValueError('naive timestamp')
+        return updated_at, uuid.UUID(item_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise CursorError(f'Cursor inválido: {str(e)}')
+
+
+def sync_token(page: list, position: tuple = None, now: datetime = None) -> str:
+    """
+    Token para la próxima sincronización tras la última página.
+
+    Apunta a la última entrada modificada hace más de VAULT_SYNC_SAFETY_SECONDS:
+    una transacción que confirme tarde con un updated_at anterior sigue entrando
+    en la próxima sincronización, y las entradas repetidas se sobrescriben en el
+    cliente. Solo depende de los datos, así que la respuesta (y su ETag) no cambia
+    mientras no cambie el baúl.
+    """
+    now = now or timezone.now()
+    horizon = now - timedelta(seconds=getattr(settings, 'VAULT_SYNC_SAFETY_SECONDS', 5))
+    settled = [item for item in page if item.updated_at <= horizon]
+    if settled:
+        return encode_cursor(settled[-1].updated_at, settled[-1].pk)
+    if position:
+        return encode_cursor(*position)
+    return encode_cursor(EPOCH, ZERO_ID)
+
+
+def list_items_page(user, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+                    delta: bool = False) -> dict:
+    """
+    Página de entradas del usuario (solo metadatos de get_safe_preview()).
+
+    Args:
+        user: Propietario de las entradas
+        cursor (str, optional): Posición devuelta en 'next' por la página anterior
+        limit (int): Entradas por página (máximo MAX_PAGE_SIZE)
+        delta (bool): Sincronización incremental; incluye los ids borrados desde el cursor
+
+    Returns:
+        dict: {'items', 'next', 'has_more'} y 'deleted' en modo incremental
+
+    Raises:
+        CursorError: Si el cursor no es válido
+        ResyncRequired: Si el cursor es más antiguo que las marcas de borrado
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    now = timezone.now()
+
+    items = (
+        VaultItem.objects.filter(user=user)
+        .select_related('folder')
+        .only(*PREVIEW_FIELDS)
+        .order_by('updated_at', 'id')
+    )
+    position = decode_cursor(cursor) if cursor else None
+    if delta:
+        if position is None:
+            raise CursorError('since requiere un token')
+        # El token inicial (EPOCH) no depende de marcas ya purgadas: el cliente
+        # solo tiene entradas listadas hace menos de VAULT_SYNC_SAFETY_SECONDS
+        retention = timedelta(days=getattr(settings, 'VAULT_SYNC_TOMBSTONE_DAYS', 90))
+        if position[0] != EPOCH and position[0] < now - retention:
+            raise ResyncRequired()
+
+    if position:
+        updated_at, item_id = position
+        items = items.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=item_id))
+
+    page = list(items[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if has_more:
+        next_cursor = encode_cursor(page[-1].updated_at, page[-1].pk)
+    else:
+        next_cursor = sync_token(page, position, now)
+
+    result = {
+        'items': [item.get_safe_preview() for item in page],
+        'next': next_cursor,
+        'has_more': has_more,
+    }
+
+    if delta:
+        result['deleted'] = [
+            str(item_id) for item_id in
+            VaultItemTombstone.objects.filter(user=user, deleted_at__gt=position[0])
+            .order_by().values_list('item_id', flat=True)
+        ]
+
+    return result
+
+
+def purge_tombstones(days: int = None) -> int:
+    """Elimina las marcas de borrado anteriores a la retención."""
+    if days is None:
+        days = getattr(settings, 'VAULT_SYNC_TOMBSTONE_DAYS', 90)
+    return VaultItemTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()[0]
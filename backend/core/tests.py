@@ -1,3 +1,477 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import os
+import shutil
+import statistics
+import tempfile
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from cryptography.exceptions import InvalidTag
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+
+from . import crypto as crypto_module
+from .benchmarks import _sample_entry, _str_pipeline_decrypt
+from .breach import BreachIndex, build_index
+from .crypto import (
+    ALGORITHM_CBC_DOUBLE, ALGORITHM_GCM, FIELDS_VERSION, META_SEGMENT, VAULT_KEY_VERSION,
+    AESCrypto, MasterKeyRing, generate_vault_key, get_crypto, item_associated_data,
+    pack_envelope, unpack_envelope
+)
+from .file_store import EncryptedFileStore, file_store
+from .models import MasterPasswordHash, VaultItem
+
+MASTER_PASSWORD = 'correct horse battery staple'
+
+
+class VaultTestCase(TestCase):
+    """Usuario con contraseña maestra y clave del baúl ya derivada."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='vault@example.com', username='vault', password='login-password'
+        )
+        master = MasterPasswordHash(user=cls.user)
+        master.set_password(MASTER_PASSWORD)
+        master.save()
+        cls.vault_key = master.get_vault_key(MASTER_PASSWORD)
+
+
+class FileItemDeleteTests(VaultTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        original_root = file_store.root
+        file_store.root = type(original_root)(self.root)
+        self.addCleanup(setattr, file_store, 'root', original_root)
+
+    def _file_item(self):
+        item = VaultItem(user=self.user, item_type='file', name='report.pdf')
+        item.save_encrypted_file(
+            io.BytesIO(b'%PDF' * 50000), 'report.pdf', MASTER_PASSWORD, vault_key=self.vault_key
+        )
+        item.save()
+        return item
+
+    def test_delete_removes_encrypted_file(self):
+        item = self._file_item()
+        path = file_store.path(item.file_id)
+        self.assertTrue(path.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+
+        self.assertFalse(path.exists())
+
+    def test_user_delete_removes_encrypted_files(self):
+        path = file_store.path(self._file_item().file_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertFalse(path.exists())
+
+    def test_file_kept_until_commit(self):
+        item = self._file_item()
+        path = file_store.path(item.file_id)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            item.delete()
+
+        self.assertTrue(path.exists())
+        self.assertEqual(len(callbacks), 1)
+
+
+class JSONPipelineMemoryTests(SimpleTestCase):
+    """
+    decrypt_json deserializa el texto descifrado sin decodificarlo a str. Con un
+    baúl de 1000 entradas en sobres binarios se compara con la ruta anterior
+    (bytes -> str -> json.loads): los datos deben ser idénticos y, en GCM con
+    orjson, el pico de memoria menor. Sin orjson json.loads decodifica igualmente
+    a str, así que solo se comprueba que la ruta por bytes no empeora.
+    """
+
+    ITEMS = 1000
+    PAYLOAD_SIZE = 16 * 1024
+    # Margen del pico sin orjson respecto a la ruta anterior
+    FALLBACK_TOLERANCE = 1.1
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.crypto = get_crypto()
+        vault_key = generate_vault_key()
+        aad = item_associated_data('00000000-0000-0000-0000-000000000000', 'login')
+        cls.entry = _sample_entry(cls.PAYLOAD_SIZE)
+        cls.modes = {
+            'gcm': (
+                {'algorithm': ALGORITHM_GCM, 'associated_data': aad},
+                {'vault_key': vault_key, 'associated_data': aad},
+            ),
+            'double-2.0': ({}, {'vault_key': vault_key}),
+        }
+        # Sobres binarios, como los guarda VaultItem por defecto (VAULT_BINARY_STORAGE)
+        cls.blobs = {
+            mode: [pack_envelope(cls.crypto.encrypt_json(cls.entry, vault_key=vault_key, **kwargs))
+                   for _ in range(cls.ITEMS)]
+            for mode, (kwargs, _) in cls.modes.items()
+        }
+
+    def _pipelines(self, mode):
+        decrypt_kwargs = self.modes[mode][1]
+        return (
+            partial(_str_pipeline_decrypt, self.crypto, **decrypt_kwargs),
+            partial(self.crypto.decrypt_json, **decrypt_kwargs),
+        )
+
+    def _peak(self, decrypt, blobs) -> int:
+        """Mediana del pico de memoria por entrada (buffers intermedios, sin el resultado previo)."""
+        for blob in blobs[:3]:  # Calentamiento
+            decrypt(blob)
+        peaks = []
+        tracemalloc.start()
+        try:
+            for blob in blobs:
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                decrypt(blob)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        return statistics.median(peaks)
+
+    def _assert_same_data(self):
+        for mode, blobs in self.blobs.items():
+            with self.subTest(mode=mode):
+                str_path, bytes_path = self._pipelines(mode)
+                decrypted = [bytes_path(blob) for blob in blobs]
+                self.assertEqual(decrypted, [str_path(blob) for blob in blobs])
+                self.assertEqual(decrypted[0], self.entry)
+
+    @skipIf(crypto_module.orjson is None, 'orjson no está instalado')
+    def test_bytes_path_with_orjson(self):
+        self._assert_same_data()
+
+        str_path, bytes_path = self._pipelines('gcm')
+        self.assertLess(self._peak(bytes_path, self.blobs['gcm']),
+                        self._peak(str_path, self.blobs['gcm']))
+
+    def test_bytes_path_without_orjson(self):
+        with mock.patch.object(crypto_module, 'orjson', None):
+            self._assert_same_data()
+
+            for mode, blobs in self.blobs.items():
+                with self.subTest(mode=mode):
+                    str_path, bytes_path = self._pipelines(mode)
+                    self.assertLessEqual(self._peak(bytes_path, blobs),
+                                         self._peak(str_path, blobs) * self.FALLBACK_TOLERANCE)
+
+
+def _flip(value: str) -> str:
+    """Invierte un bit del último byte de un campo en base64."""
+    data = bytearray(base64.b64decode(value))
+    data[-1] ^= 1
+    return base64.b64encode(bytes(data)).decode('utf-8')
+
+
+class CryptoFormatTests(SimpleTestCase):
+    """Ida y vuelta y manipulación de cada formato cifrado."""
+
+    def setUp(self):
+        self.legacy_key, self.active_key = os.urandom(32), os.urandom(32)
+        self.crypto = AESCrypto(keyring=MasterKeyRing(
+            {'1': self.legacy_key, '2': self.active_key}, '2', legacy_key_id='1'
+        ))
+        self.vault_key = generate_vault_key()
+        self.aad = item_associated_data('00000000-0000-0000-0000-000000000001', 'login')
+        self.entry = {'username': 'usuario@ejemplo.com', 'password': 'Contraseña!1', 'notes': 'ñ' * 100}
+
+    def _encrypt(self, algorithm):
+        if algorithm == ALGORITHM_GCM:
+            return self.crypto.encrypt_json(self.entry, vault_key=self.vault_key,
+                                            algorithm=ALGORITHM_GCM, associated_data=self.aad)
+        return self.crypto.encrypt_json(self.entry, vault_key=self.vault_key)
+
+    def _decrypt(self, encrypted, associated_data=None):
+        return self.crypto.decrypt_json(encrypted, vault_key=self.vault_key,
+                                        associated_data=associated_data or self.aad)
+
+    # Sobre de la clave del baúl
+
+    def test_vault_key_envelope_round_trip(self):
+        kek = os.urandom(32)
+        envelope = self.crypto.wrap_vault_key(self.vault_key, kek=kek)
+
+        self.assertEqual(envelope['key_id'], '2')
+        self.assertEqual(self.crypto.unwrap_vault_key(envelope, kek=kek), self.vault_key)
+
+    def test_vault_key_envelope_tampering(self):
+        kek = os.urandom(32)
+        envelope = self.crypto.wrap_vault_key(self.vault_key, kek=kek)
+        cases = {
+            'wrong kek': (envelope, os.urandom(32)),
+            'flipped wrapped key': ({**envelope, 'wrapped_key': _flip(envelope['wrapped_key'])}, kek),
+            'wrong key id': ({**envelope, 'key_id': '1'}, kek),
+            'unknown key id': ({**envelope, 'key_id': '9'}, kek),
+            'missing kek': (envelope, None),
+        }
+        for case, (tampered, tampered_kek) in cases.items():
+            with self.subTest(case):
+                with self.assertRaises(ValidationError):
+                    self.crypto.unwrap_vault_key(tampered, kek=tampered_kek)
+
+    # AES-256-GCM con metadatos autenticados
+
+    def test_gcm_round_trip(self):
+        encrypted = self._encrypt(ALGORITHM_GCM)
+
+        self.assertEqual(encrypted['algorithm'], ALGORITHM_GCM)
+        self.assertEqual(self._decrypt(encrypted), self.entry)
+
+    def test_gcm_tampering(self):
+        encrypted = self._encrypt(ALGORITHM_GCM)
+        cases = {
+            'other item': (encrypted, item_associated_data(
+                '00000000-0000-0000-0000-000000000002', 'login')),
+            'other item type': (encrypted, item_associated_data(
+                '00000000-0000-0000-0000-000000000001', 'note')),
+            'flipped ciphertext': ({**encrypted, 'ciphertext': _flip(encrypted['ciphertext'])}, self.aad),
+            'flipped nonce': ({**encrypted, 'iv': _flip(encrypted['iv'])}, self.aad),
+        }
+        for case, (tampered, aad) in cases.items():
+            with self.subTest(case):
+                with self.assertRaises(ValidationError):
+                    self._decrypt(tampered, aad)
+
+    # Sobre binario
+
+    def test_binary_envelope_round_trip(self):
+        # GCM no tiene capa de clave maestra: no guarda id de clave
+        for algorithm, key_id in ((ALGORITHM_GCM, None), (ALGORITHM_CBC_DOUBLE, '2')):
+            with self.subTest(algorithm):
+                envelope = pack_envelope(self._encrypt(algorithm))
+                parsed = unpack_envelope(envelope)
+
+                self.assertEqual((envelope[0], envelope[1]), (0xA5, 2))
+                self.assertEqual(parsed['algorithm'], algorithm)
+                self.assertEqual(parsed['version'], VAULT_KEY_VERSION)
+                self.assertEqual(parsed['key_id'], key_id)
+                self.assertEqual(self._decrypt(envelope), self.entry)
+                self.assertEqual(self._decrypt(memoryview(envelope)), self.entry)
+
+    def test_binary_envelope_v1_uses_legacy_key(self):
+        legacy_crypto = AESCrypto(keyring=MasterKeyRing({'1': self.legacy_key}, '1'))
+        v2 = pack_envelope(legacy_crypto.encrypt_json(self.entry, vault_key=self.vault_key))
+        # La versión 1 no lleva longitud ni id de clave
+        v1 = bytes([v2[0], 1, v2[2], v2[3]]) + v2[5 + v2[4]:]
+
+        self.assertIsNone(unpack_envelope(v1)['key_id'])
+        self.assertEqual(self._decrypt(v1), self.entry)
+
+    def test_binary_envelope_tampering(self):
+        envelope = pack_envelope(self._encrypt(ALGORITHM_CBC_DOUBLE))
+        key_id_end = 5 + envelope[4]
+        cases = {
+            'truncated header': envelope[:3],
+            'truncated key id': envelope[:key_id_end - 1],
+            'truncated fields': envelope[:key_id_end + 20],
+            'flipped ciphertext': envelope[:-1] + bytes([envelope[-1] ^ 1]),
+            'wrong key id': envelope[:5] + b'1' + envelope[key_id_end:],
+            'unknown key id': envelope[:5] + b'9' + envelope[key_id_end:],
+        }
+        for case, tampered in cases.items():
+            with self.subTest(case):
+                with self.assertRaises(ValidationError):
+                    self._decrypt(tampered)
+
+        gcm = pack_envelope(self._encrypt(ALGORITHM_GCM))
+        with self.assertRaises(ValidationError):
+            self._decrypt(gcm[:-1] + bytes([gcm[-1] ^ 1]))
+
+    def test_binary_envelope_invalid_header(self):
+        envelope = pack_envelope(self._encrypt(ALGORITHM_GCM))
+        for case, tampered in {
+            'empty': b'',
+            'header only': envelope[:1],
+            'bad magic': b'\x00' + envelope[1:],
+            'unknown version': envelope[:1] + b'\x09' + envelope[2:],
+            'unknown algorithm': envelope[:2] + b'\x09' + envelope[3:],
+            'unknown data version': envelope[:3] + b'\x09' + envelope[4:],
+        }.items():
+            with self.subTest(case):
+                with self.assertRaises(ValueError):
+                    unpack_envelope(tampered)
+
+    # Cifrado por campos (3.0) con manifiesto
+
+    def _fields(self):
+        return self.crypto.encrypt_fields({
+            META_SEGMENT: {'name': 'Ejemplo'},
+            'username': self.entry['username'],
+            'password': self.entry['password'],
+            'notes': self.entry['notes'],
+        }, self.vault_key, self.aad)
+
+    def _decrypt_fields(self, document, **kwargs):
+        return self.crypto.decrypt_fields(document, self.vault_key, self.aad, **kwargs)
+
+    def test_fields_round_trip(self):
+        document = self._fields()
+
+        self.assertEqual(document['version'], FIELDS_VERSION)
+        for encrypted in (document, pack_envelope(document)):
+            self.assertEqual(self._decrypt_fields(encrypted), {
+                META_SEGMENT: {'name': 'Ejemplo'}, **self.entry
+            })
+            self.assertEqual(self._decrypt_fields(encrypted, names=['password']),
+                             {'password': self.entry['password']})
+
+        updated = self.crypto.update_fields(document, self.vault_key, {'password': 'Nueva!2'}, self.aad)
+        self.assertEqual(updated['segments']['username'], document['segments']['username'])
+        self.assertEqual(self._decrypt_fields(updated)['password'], 'Nueva!2')
+
+        removed = self.crypto.update_fields(document, self.vault_key, {}, self.aad, removed=['notes'])
+        self.assertNotIn('notes', self._decrypt_fields(removed))
+
+    def test_fields_tampering(self):
+        document = self._fields()
+        segments = document['segments']
+        updated = self.crypto.update_fields(document, self.vault_key, {'password': 'Nueva!2'}, self.aad)
+
+        def with_segments(**changes):
+            tampered = {name: segment for name, segment in segments.items() if name not in changes}
+            tampered.update({name: segment for name, segment in changes.items() if segment})
+            return {**document, 'segments': tampered}
+
+        cases = {
+            'swapped segments': with_segments(username=segments['password'], password=segments['username']),
+            'missing segment': with_segments(notes=None),
+            'extra segment': with_segments(extra=segments['notes']),
+            'stale segment': {**updated, 'segments': {
+                **updated['segments'], 'password': segments['password']
+            }},
+            'stale manifest': {**updated, 'segments': {
+                **updated['segments'], META_SEGMENT: segments[META_SEGMENT]
+            }},
+            'flipped segment': with_segments(notes={
+                **segments['notes'], 'ciphertext': _flip(segments['notes']['ciphertext'])
+            }),
+        }
+        for case, tampered in cases.items():
+            with self.subTest(case):
+                with self.assertRaises(ValidationError):
+                    self._decrypt_fields(tampered)
+
+        with self.subTest('other item'):
+            with self.assertRaises(ValidationError):
+                self.crypto.decrypt_fields(document, self.vault_key, item_associated_data(
+                    '00000000-0000-0000-0000-000000000002', 'login'))
+        with self.subTest('truncated envelope'):
+            with self.assertRaises(ValidationError):
+                self._decrypt_fields(pack_envelope(document)[:-1])
+
+
+class EncryptedFileStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.store = EncryptedFileStore(root=root, chunk_size=64)
+        self.key = os.urandom(32)
+        self.content = os.urandom(64 * 4 + 10)
+        self.file_id = 'a' * 32
+        self.store.write(self.file_id, io.BytesIO(self.content), self.key)
+
+    def _read(self, file_id=None, key=None, start=0, end=None):
+        return b''.join(self.store.read_range(file_id or self.file_id, key or self.key, start, end))
+
+    def _rewrite(self, transform):
+        path = self.store.path(self.file_id)
+        path.write_bytes(transform(path.read_bytes()))
+
+    def test_round_trip(self):
+        self.assertEqual(self.store.size(self.file_id), len(self.content))
+        self.assertEqual(self._read(), self.content)
+        self.assertEqual(self._read(start=60, end=200), self.content[60:201])
+        self.assertEqual(self._read(start=len(self.content) - 1), self.content[-1:])
+
+    def test_empty_file(self):
+        self.store.write('b' * 32, io.BytesIO(b''), self.key)
+        self.assertEqual(self._read('b' * 32), b'')
+
+    def test_wrong_key(self):
+        with self.assertRaises(InvalidTag):
+            self._read(key=os.urandom(32))
+
+    def test_other_file_id(self):
+        # El id del archivo forma parte de los metadatos autenticados de cada bloque
+        other = self.store.path('c' * 32)
+        other.parent.mkdir(parents=True, exist_ok=True)
+        other.write_bytes(self.store.path(self.file_id).read_bytes())
+        with self.assertRaises(InvalidTag):
+            self._read('c' * 32)
+
+    def test_tampering(self):
+        stored_chunk = 64 + 16
+        header = 16
+        cases = {
+            'swapped chunks': lambda data: (
+                data[:header] + data[header + stored_chunk:header + 2 * stored_chunk]
+                + data[header:header + stored_chunk] + data[header + 2 * stored_chunk:]
+            ),
+            'truncated last chunk': lambda data: data[:header + 4 * stored_chunk],
+            'flipped byte': lambda data: data[:header + 5] + bytes([data[header + 5] ^ 1]) + data[header + 6:],
+        }
+        original = self.store.path(self.file_id).read_bytes()
+        for case, transform in cases.items():
+            with self.subTest(case):
+                self._rewrite(lambda data: transform(original))
+                with self.assertRaises(InvalidTag):
+                    self._read()
+
+        with self.subTest('bad header'):
+            self._rewrite(lambda data: b'XXXX' + original[4:])
+            with self.assertRaises(ValueError):
+                self._read()
+
+
+class BreachIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.path = Path(root) / 'breach.idx'
+        self.passwords = [f'filtrada-{n}' for n in range(2000)]
+        self.stats = build_index(
+            (hashlib.sha1(p.encode('utf-8')).digest() for p in self.passwords),
+            len(self.passwords), self.path
+        )
+
+    def test_round_trip(self):
+        index = BreachIndex(self.path)
+        self.addCleanup(index.close)
+
+        self.assertEqual(self.stats['count'], len(self.passwords))
+        self.assertEqual(index.count, len(self.passwords))
+        self.assertTrue(all(index.contains(p) for p in self.passwords))
+        # Probabilidad de falso positivo objetivo 0.001: ~2 de 2000
+        false_positives = sum(index.contains(f'no-filtrada-{n}') for n in range(2000))
+        self.assertLess(false_positives, 20)
+
+    def test_invalid_index(self):
+        data = self.path.read_bytes()
+        for case, tampered in {
+            'bad magic': b'XXXX' + data[4:],
+            'truncated filter': data[:len(data) // 2],
+        }.items():
+            with self.subTest(case):
+                self.path.write_bytes(tampered)
+                with self.assertRaises(ValueError):
+                    BreachIndex(self.path)
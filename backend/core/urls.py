@@ -5,6 +5,7 @@ URLs para el sistema de baúl de contraseñas cifrado.
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.http import JsonResponse
+from . import async_views, views
 
 app_name = 'core'
 
@@ -16,13 +17,33 @@ def not_implemented(request):
     })
 
 urlpatterns = [
+    # Estado y desbloqueo del baúl
+    path('vault/status/', views.vault_status_api, name='vault-status'),
+    path('vault/unlock/', views.unlock_vault_api, name='unlock-vault'),
+    path('vault/lock/', views.lock_vault_api, name='lock-vault'),
+    
+    # Variantes asíncronas para servidores ASGI
+    path('async/vault/status/', async_views.vault_status_api, name='async-vault-status'),
+    path('async/vault/unlock/', async_views.unlock_vault_api, name='async-unlock-vault'),
+    path('async/vault/items/<uuid:item_id>/', async_views.vault_item_api, name='async-vault-item'),
+    
     # Endpoints temporales
-    path('vault/status/', not_implemented, name='vault-status'),
     path('health/', lambda request: JsonResponse({'status': 'ok'}), name='health'),
     
+    # Archivos cifrados en streaming
+    path('vault/files/', views.vault_file_upload_api, name='vault-file-upload'),
+    path('vault/files/<uuid:item_id>/download/', views.vault_file_download_api, name='vault-file-download'),
+    
+    # Listado paginado por cursor y sincronización incremental
+    path('vault/items/', views.vault_items_api, name='vault-items'),
+    
+    # Análisis de salud de contraseñas (centro de seguridad)
+    path('vault/health/', views.vault_health_api, name='vault-health'),
+    
+    # Lectura parcial de un campo (autocompletado)
+    path('vault/items/<uuid:item_id>/field/<str:name>/', views.vault_item_field_api, name='vault-item-field'),
+    
     # TODO: Implementar vistas del baúl
     # path('vault/master-password/set/', views.SetMasterPasswordView.as_view(), name='set-master-password'),
     # path('vault/master-password/verify/', views.VerifyMasterPasswordView.as_view(), name='verify-master-password'),
-    # path('vault/unlock/', views.UnlockVaultView.as_view(), name='unlock-vault'),
-    # path('vault/lock/', views.LockVaultView.as_view(), name='lock-vault'),
 ]
@@ -10,19 +10,35 @@ from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Count, Q
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
+import hashlib
 import secrets
 import string
 import json
 
-from .models import VaultItem, VaultFolder, VaultActivity, MasterPasswordHash
+from .models import VaultItem, VaultFolder, VaultActivity, MasterPasswordHash, PasswordHealthReport
 from .crypto import AESCrypto, VaultEntry
+from .access_stats import access_stats
+from .activity import activity_summary
+from .stats import get_vault_stats, security_score
+from .sync import CursorError, DEFAULT_PAGE_SIZE, ResyncRequired, list_items_page
+from .audit import audit_log, audit_request
+from .health import (
+    analyze_vault, apply_pending_removals, calculate_password_strength, load_report_detail, save_report
+)
+from .kdf import KDFBusyError, kdf_executor
+from .key_cache import (
+    derived_key_cache, open_session_scope, close_session_scope, get_session_scope,
+    remember_vault_key
+)
 
 
 class DashboardView(TemplateView):
@@ -34,26 +50,21 @@ class DashboardView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         if self.request.user.is_authenticated:
-            # Estadísticas del baúl
+            # Estadísticas del baúl: una consulta agregada, cacheada por usuario
+            stats = get_vault_stats(self.request.user.pk)
             vault_stats = {
-                'total_items': VaultItem.objects.filter(user=self.request.user).count(),
-                'login_items': VaultItem.objects.filter(
-                    user=self.request.user, 
-                    item_type='login'
-                ).count(),
-                'secure_notes': VaultItem.objects.filter(
-                    user=self.request.user, 
-                    item_type='note'
-                ).count(),
+                'total_items': stats['total_items'],
+                'login_items': stats['login_items'],
+                'secure_notes': stats['note_items'],
             }
             
-            # Entradas recientes
+            # Entradas recientes (sin cargar los datos cifrados)
             recent_items = VaultItem.objects.filter(
                 user=self.request.user
-            ).order_by('-updated_at')[:5]
+            ).only('id', 'name', 'item_type', 'is_favorite', 'updated_at').order_by('-updated_at')[:5]
             
             # Puntuación de seguridad básica
-            security_score = self.calculate_security_score()
+            security_score = self.calculate_security_score(stats)
             
             context.update({
                 'vault_stats': vault_stats,
@@ -64,28 +75,11 @@ class DashboardView(TemplateView):
         
         return context
     
-    def calculate_security_score(self):
+    def calculate_security_score(self, stats: dict = None):
         """Calcula una puntuación básica de seguridad."""
-        score = 0
-        user = self.request.user
-        
-        # Email verificado: +20 puntos
-        if user.email_verified:
-            score += 20
-        
-        # 2FA habilitado: +30 puntos
-        if hasattr(user, 'profile') and user.profile.two_factor_enabled:
-            score += 30
-        
-        # Tiene entradas en el baúl: +20 puntos
-        if VaultItem.objects.filter(user=user).exists():
-            score += 20
-        
-        # Contraseña maestra configurada: +30 puntos
-        if MasterPasswordHash.objects.filter(user=user).exists():
-            score += 30
-        
-        return min(score, 100)
+        if stats is None:
+            stats = get_vault_stats(self.request.user.pk)
+        return security_score(self.request.user, stats)
 
 
 class VaultView(LoginRequiredMixin, TemplateView):
@@ -143,16 +137,21 @@ class SecurityCenterView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Análisis básico de seguridad
+        # Recuentos del índice de salud (se mantiene en cada cambio de contraseña); sin descifrar nada
+        report = PasswordHealthReport.objects.filter(user=self.request.user).first()
         security_analysis = {
-            'total_items': VaultItem.objects.filter(user=self.request.user).count(),
-            'weak_passwords': 0,  # Calcular después
-            'duplicate_passwords': 0,  # Calcular después
-            'old_passwords': 0,  # Calcular después
+            'total_items': get_vault_stats(self.request.user.pk)['total_items'],
+            'weak_passwords': report.weak_passwords if report else 0,
+            'breached_passwords': report.breached_passwords if report else 0,
+            'duplicate_passwords': report.duplicate_passwords if report else 0,
+            'old_passwords': report.old_passwords if report else 0,
+            'analyzed_at': report.analyzed_at if report else None,
         }
         
         context.update({
             'security_analysis': security_analysis,
+            # Se responde desde los resúmenes diarios, sin recorrer la auditoría
+            'activity': activity_summary(self.request.user, days=90),
         })
         
         return context
@@ -213,63 +212,30 @@ def generate_password_api(request):
     return JsonResponse({'error': 'Método no permitido'})
 
 
-def calculate_password_strength(password):
-    """Calcula la fortaleza de una contraseña."""
-    score = 0
-    feedback = []
-    
-    # Longitud
-    if len(password) >= 8:
-        score += 1
-    if len(password) >= 12:
-        score += 1
-    
-    # Complejidad
-    if any(c.islower() for c in password):
-        score += 1
-    if any(c.isupper() for c in password):
-        score += 1
-    if any(c.isdigit() for c in password):
-        score += 1
-    if any(c in '!@#$%^&*()_+-=[]{}|;:,.<>?' for c in password):
-        score += 1
-    
-    # Determinar nivel
-    if score >= 5:
-        level = 'very_strong'
-    elif score >= 4:
-        level = 'strong'
-    elif score >= 3:
-        level = 'medium'
-    elif score >= 2:
-        level = 'weak'
-    else:
-        level = 'very_weak'
-    
-    return {
-        'score': score,
-        'level': level,
-        'percentage': min(100, (score / 6) * 100)
-    }
-
-
 @login_required
 def vault_status_api(request):
     """API para obtener estado del baúl."""
     try:
-        # Verificar si el usuario tiene contraseña maestra
-        has_master_password = MasterPasswordHash.objects.filter(
-            user=request.user
-        ).exists()
+        # Contraseña maestra y número de entradas desde las estadísticas cacheadas
+        stats = get_vault_stats(request.user.pk)
         
         # Verificar si el baúl está "desbloqueado" en la sesión
         vault_unlocked = request.session.get('vault_unlocked', False)
         
-        return JsonResponse({
-            'has_master_password': has_master_password,
+        response_data = {
+            'has_master_password': stats['has_master_password'],
             'vault_unlocked': vault_unlocked,
-            'total_items': VaultItem.objects.filter(user=request.user).count(),
-        })
+            'total_items': stats['total_items'],
+        }
+        
+        # Métricas de la caché de claves, del pool de KDF y de accesos solo para staff
+        if request.user.is_staff:
+            response_data['key_cache'] = derived_key_cache.stats()
+            response_data['kdf_executor'] = kdf_executor.stats()
+            response_data['access_stats'] = access_stats.stats()
+            response_data['audit_log'] = audit_log.stats()
+        
+        return JsonResponse(response_data)
         
     except Exception as e:
         return JsonResponse({'error': f'Error al obtener estado: {str(e)}'})
@@ -289,10 +255,16 @@ def unlock_vault_api(request):
             # Verificar contraseña maestra
             try:
                 master_hash = MasterPasswordHash.objects.get(user=request.user)
-                if master_hash.verify_password(master_password):
+                # Un solo KDF: verifica la contraseña y recupera la clave del baúl
+                vault_key = master_hash.unlock(master_password)
+                if vault_key is not None:
                     # Marcar baúl como desbloqueado en la sesión
                     request.session['vault_unlocked'] = True
                     request.session['vault_unlock_time'] = timezone.now().isoformat()
+                    scope = open_session_scope(request)
+                    remember_vault_key(scope, master_password, vault_key)
+                    # Con la clave ya disponible se corrigen los recuentos de salud
+                    apply_pending_removals(request.user.pk, vault_key)
                     
                     return JsonResponse({
                         'success': True,
@@ -304,6 +276,9 @@ def unlock_vault_api(request):
             except MasterPasswordHash.DoesNotExist:
                 return JsonResponse({'error': 'Contraseña maestra no configurada'})
             
+        except KDFBusyError:
+            # Lo responde KDFBusyMiddleware con 503 y Retry-After
+            raise
         except Exception as e:
             return JsonResponse({'error': f'Error al desbloquear: {str(e)}'})
     
@@ -317,6 +292,7 @@ def lock_vault_api(request):
         # Eliminar estado de desbloqueo de la sesión
         request.session.pop('vault_unlocked', None)
         request.session.pop('vault_unlock_time', None)
+        close_session_scope(request)
         
         return JsonResponse({
             'success': True,
@@ -326,6 +302,265 @@ def lock_vault_api(request):
     return JsonResponse({'error': 'Método no permitido'})
 
 
+@login_required
+def vault_file_upload_api(request):
+    """API para subir un archivo cifrado en streaming (multipart/form-data)."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    if not request.session.get('vault_unlocked', False):
+        return JsonResponse({'error': 'El baúl está bloqueado'}, status=403)
+
+    uploaded = request.FILES.get('file')
+    master_password = request.POST.get('master_password')
+
+    if not uploaded or not master_password:
+        return JsonResponse({'error': 'Archivo y contraseña maestra requeridos'})
+
+    max_size = getattr(settings, 'VAULT_FILE_MAX_SIZE', 100 * 1024 * 1024)
+    if uploaded.size > max_size:
+        return JsonResponse({'error': f'El archivo supera el tamaño máximo ({max_size} bytes)'}, status=413)
+
+    try:
+        item = VaultItem(
+            user=request.user,
+            item_type='file',
+            name=request.POST.get('name') or uploaded.name,
+        )
+        item.save_encrypted_file(
+            uploaded, uploaded.name, master_password,
+            content_type=uploaded.content_type,
+            cache_scope=get_session_scope(request)
+        )
+        item.save()
+        audit_request(request, 'create', item, 'Archivo subido')
+
+        return JsonResponse({'success': True, 'item': item.get_safe_preview()})
+
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al subir archivo: {str(e)}'})
+
+
+def _parse_range_header(header: str, size: int):
+    """
+    Interpreta una cabecera Range de un solo rango ('bytes=inicio-fin').
+
+    Returns:
+        tuple: (inicio, fin) inclusivos, o None si no hay rango
+
+    Raises:
+        ValueError: Si el rango no es satisfacible
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        raise ValueError('Rango no soportado')
+
+    start, _, end = spec.strip().partition('-')
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # Sufijo: los últimos N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+
+    if start > end or start >= size:
+        raise ValueError('Rango no satisfacible')
+    return start, end
+
+
+@login_required
+def vault_file_download_api(request, item_id):
+    """
+    API para descargar un archivo cifrado en streaming.
+    Admite cabecera Range para descargas parciales o reanudables.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    if not request.session.get('vault_unlocked', False):
+        return JsonResponse({'error': 'El baúl está bloqueado'}, status=403)
+
+    item = get_object_or_404(VaultItem, id=item_id, user=request.user, item_type='file')
+
+    try:
+        if request.content_type == 'application/json':
+            master_password = json.loads(request.body).get('master_password')
+        else:
+            master_password = request.POST.get('master_password')
+
+        if not master_password:
+            return JsonResponse({'error': 'Contraseña maestra requerida'})
+
+        cache_scope = get_session_scope(request)
+        metadata = item.get_decrypted_data(master_password, cache_scope)['data']
+        size = metadata.get('size', 0)
+
+        try:
+            byte_range = _parse_range_header(request.headers.get('Range'), size)
+        except ValueError:
+            response = JsonResponse({'error': 'Rango no satisfacible'}, status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        stream = item.read_encrypted_file(metadata, start, end)
+        audit_request(request, 'read', item, 'Archivo descargado')
+
+        response = StreamingHttpResponse(
+            stream,
+            status=206 if byte_range else 200,
+            content_type=metadata.get('content_type', 'application/octet-stream')
+        )
+        response['Content-Length'] = str(max(end - start + 1, 0))
+        response['Accept-Ranges'] = 'bytes'
+        filename = metadata.get('filename', 'archivo').replace('"', '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al descargar archivo: {str(e)}'})
+
+
+@login_required
+def vault_item_field_api(request, item_id, name):
+    """
+    API para descifrar un único campo de una entrada (autocompletado).
+    La respuesta solo contiene el campo pedido, nunca el resto de la entrada.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    cache_scope = get_session_scope(request)
+    if cache_scope is None:
+        return JsonResponse({'error': 'El baúl está bloqueado'}, status=403)
+
+    item = get_object_or_404(VaultItem, id=item_id, user=request.user)
+
+    try:
+        master_password = json.loads(request.body).get('master_password')
+        if not master_password:
+            return JsonResponse({'error': 'Contraseña maestra requerida'})
+
+        value = item.get_decrypted_field(name, master_password, cache_scope)
+        audit_request(request, 'read', item, f'Campo leído: {name}')
+        return JsonResponse({'field': name, 'value': value})
+
+    except KeyError:
+        return JsonResponse({'error': 'La entrada no tiene ese campo'}, status=404)
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al leer campo: {str(e)}'})
+
+
+@login_required
+def vault_items_api(request):
+    """
+    API de listado de entradas (solo metadatos) paginada por cursor.
+    
+    Parámetros GET:
+        cursor: Continúa el listado desde la página anterior ('next')
+        since: Sincronización incremental desde un token 'next'; incluye 'deleted'
+        limit: Entradas por página
+    
+    Admite If-None-Match: si la página no cambió responde 304 sin cuerpo.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    cursor = request.GET.get('cursor')
+    since = request.GET.get('since')
+    if cursor and since:
+        return JsonResponse({'error': 'Use cursor o since, no ambos'}, status=400)
+
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+        page = list_items_page(request.user, since or cursor, limit, delta=bool(since))
+    except (CursorError, ValueError) as e:
+        return JsonResponse({'error': f'Parámetros inválidos: {str(e)}'}, status=400)
+    except ResyncRequired:
+        return JsonResponse(
+            {'error': 'El token de sincronización expiró', 'resync': True}, status=410
+        )
+
+    response = JsonResponse(page)
+    etag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def vault_health_api(request):
+    """
+    API del análisis de salud de contraseñas.
+    Devuelve el detalle del índice (que se mantiene con cada cambio de
+    contraseña) o, con refresh=true (o si no hay índice), analiza de nuevo
+    todas las entradas de tipo login.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'})
+
+    cache_scope = get_session_scope(request)
+    if cache_scope is None:
+        return JsonResponse({'error': 'El baúl está bloqueado'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        master_password = data.get('master_password')
+        if not master_password:
+            return JsonResponse({'error': 'Contraseña maestra requerida'})
+
+        master_hash = MasterPasswordHash.objects.get(user=request.user)
+        vault_key = master_hash.get_vault_key(master_password, cache_scope)
+
+        detail = None
+        report = PasswordHealthReport.objects.filter(user=request.user).first()
+        if report and not data.get('refresh'):
+            detail = load_report_detail(report, vault_key)
+            if detail is not None and report.pending_removals:
+                # Aplicar los borrados pendientes también a los recuentos
+                report = save_report(request.user.pk, detail, vault_key, analyzed_at=report.analyzed_at)
+        if detail is None:
+            detail = analyze_vault(request.user, master_password, vault_key, cache_scope)
+            report = PasswordHealthReport.objects.get(user=request.user)
+
+        return JsonResponse({
+            'analyzed_at': report.analyzed_at.isoformat(),
+            'updated_at': report.updated_at.isoformat(),
+            'analyzed_passwords': report.analyzed_passwords,
+            'weak': detail['weak'],
+            'breached': detail.get('breached', []),
+            'duplicates': detail['duplicates'],
+            'old': detail['old'],
+            'levels': {item_id: entry['level'] for item_id, entry in detail['entries'].items()},
+            'errors': detail['errors'],
+        })
+
+    except MasterPasswordHash.DoesNotExist:
+        return JsonResponse({'error': 'Contraseña maestra no configurada'})
+    except KDFBusyError:
+        # Lo responde KDFBusyMiddleware con 503 y Retry-After
+        raise
+    except Exception as e:
+        return JsonResponse({'error': f'Error al analizar contraseñas: {str(e)}'})
+
+
 # Vistas temporales para desarrollo
 def not_implemented_view(request):
     """Vista temporal para endpoints no implementados."""
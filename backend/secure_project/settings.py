@@ -6,8 +6,9 @@ Utiliza variables de entorno para datos sensibles.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 from datetime import timedelta
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_ratelimit.middleware.RatelimitMiddleware',
     'core.middleware.SecurityHeadersMiddleware',
+    'core.middleware.KDFBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'secure_project.urls'
@@ -260,6 +262,82 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 # Encryption Settings
 ENCRYPTION_KEY = config('ENCRYPTION_KEY', default='your-32-byte-encryption-key-here')
 
+# Llavero de claves maestras: id de la clave activa, claves anteriores ('id:clave')
+# e id de la clave con la que se cifraron las entradas sin id
+ENCRYPTION_KEY_ID = config('ENCRYPTION_KEY_ID', default='1')
+ENCRYPTION_PREVIOUS_KEYS = config('ENCRYPTION_PREVIOUS_KEYS', default='', cast=Csv())
+ENCRYPTION_LEGACY_KEY_ID = config('ENCRYPTION_LEGACY_KEY_ID', default='1')
+
+# KDF de la contraseña maestra (pbkdf2-sha256, scrypt o argon2id con argon2-cffi).
+# Los parámetros se obtienen con `python manage.py calibrate_kdf`; los usuarios
+# se actualizan en su siguiente desbloqueo.
+VAULT_KDF_ALGORITHM = config('VAULT_KDF_ALGORITHM', default='pbkdf2-sha256')
+VAULT_KDF_PARAMS = config('VAULT_KDF_PARAMS', default='{}', cast=json.loads)
+
+# Pool acotado de derivaciones: con workers + pendientes ocupados se responde 503
+VAULT_KDF_WORKERS = config('VAULT_KDF_WORKERS', default=os.cpu_count() or 1, cast=int)
+VAULT_KDF_MAX_PENDING = config('VAULT_KDF_MAX_PENDING', default=32, cast=int)
+
+# Caché de claves derivadas mientras el baúl está desbloqueado
+VAULT_KEY_CACHE_MAX_ENTRIES = config('VAULT_KEY_CACHE_MAX_ENTRIES', default=1024, cast=int)
+VAULT_KEY_CACHE_TTL = config('VAULT_KEY_CACHE_TTL', default=900, cast=int)  # 15 minutos
+
+# Algoritmo para entradas nuevas con clave del baúl: 'AES-256-GCM' o 'AES-256-CBC-DOUBLE'
+VAULT_ENCRYPTION_ALGORITHM = config('VAULT_ENCRYPTION_ALGORITHM', default='AES-256-GCM')
+
+# Con AES-256-GCM, sellar cada campo de la entrada por separado (formato 3.0)
+VAULT_FIELD_ENCRYPTION = config('VAULT_FIELD_ENCRYPTION', default=True, cast=bool)
+
+# Almacenar entradas nuevas como sobre binario (BinaryField) en lugar de JSON con base64
+VAULT_BINARY_STORAGE = config('VAULT_BINARY_STORAGE', default=True, cast=bool)
+
+# Migración perezosa de entradas 1.0 al formato con clave del baúl
+VAULT_LAZY_MIGRATION = config('VAULT_LAZY_MIGRATION', default=True, cast=bool)
+VAULT_MIGRATION_QUEUE_SIZE = config('VAULT_MIGRATION_QUEUE_SIZE', default=1000, cast=int)
+
+# Estadísticas de acceso acumuladas en memoria y volcadas en lote (segundos / entradas pendientes)
+VAULT_ACCESS_STATS_BUFFER = config('VAULT_ACCESS_STATS_BUFFER', default=True, cast=bool)
+VAULT_ACCESS_FLUSH_INTERVAL = config('VAULT_ACCESS_FLUSH_INTERVAL', default=30, cast=int)
+VAULT_ACCESS_MAX_PENDING = config('VAULT_ACCESS_MAX_PENDING', default=1000, cast=int)
+
+# Auditoría (VaultActivity) por lotes: bulk_create cada N eventos o T milisegundos
+VAULT_AUDIT_ENABLED = config('VAULT_AUDIT_ENABLED', default=True, cast=bool)
+VAULT_AUDIT_BATCH_SIZE = config('VAULT_AUDIT_BATCH_SIZE', default=200, cast=int)
+VAULT_AUDIT_FLUSH_MS = config('VAULT_AUDIT_FLUSH_MS', default=500, cast=int)
+VAULT_AUDIT_BUFFER_SIZE = config('VAULT_AUDIT_BUFFER_SIZE', default=10000, cast=int)
+# Si el volcado tarda más de VAULT_AUDIT_LAG_MS, las lecturas se muestrean a VAULT_AUDIT_SAMPLE_RATE
+VAULT_AUDIT_LAG_MS = config('VAULT_AUDIT_LAG_MS', default=1000, cast=int)
+VAULT_AUDIT_SAMPLE_RATE = config('VAULT_AUDIT_SAMPLE_RATE', default=0.1, cast=float)
+VAULT_AUDIT_BLOCK_MS = config('VAULT_AUDIT_BLOCK_MS', default=50, cast=int)
+# Spool en disco para no perder eventos si el proceso cae (vacío para desactivarlo)
+VAULT_AUDIT_SPOOL_DIR = config('VAULT_AUDIT_SPOOL_DIR', default=str(BASE_DIR / 'audit_spool'))
+
+# Retención de la auditoría: particiones mensuales (PostgreSQL) y resúmenes diarios
+VAULT_ACTIVITY_RETENTION_MONTHS = config('VAULT_ACTIVITY_RETENTION_MONTHS', default=12, cast=int)
+VAULT_ACTIVITY_PARTITIONS_AHEAD = config('VAULT_ACTIVITY_PARTITIONS_AHEAD', default=3, cast=int)
+
+# Sincronización incremental: retención de borrados (días) y margen para commits tardíos (segundos)
+VAULT_SYNC_TOMBSTONE_DAYS = config('VAULT_SYNC_TOMBSTONE_DAYS', default=90, cast=int)
+VAULT_SYNC_SAFETY_SECONDS = config('VAULT_SYNC_SAFETY_SECONDS', default=5, cast=int)
+
+# Estadísticas del dashboard cacheadas por usuario (segundos)
+VAULT_STATS_CACHE_TIMEOUT = config('VAULT_STATS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Antigüedad (días desde updated_at) a partir de la que una contraseña se marca como antigua
+VAULT_PASSWORD_MAX_AGE_DAYS = config('VAULT_PASSWORD_MAX_AGE_DAYS', default=180, cast=int)
+
+# Índice local de contraseñas filtradas (build_breach_index; vacío para desactivarlo)
+VAULT_BREACH_INDEX_PATH = config('VAULT_BREACH_INDEX_PATH', default=str(BASE_DIR / 'breach_index' / 'pwned.bloom'))
+VAULT_BREACH_FP_RATE = config('VAULT_BREACH_FP_RATE', default=0.001, cast=float)
+
+# Hilos para el descifrado por lotes (VaultEntry.decrypt_many)
+VAULT_DECRYPT_WORKERS = config('VAULT_DECRYPT_WORKERS', default=min(8, os.cpu_count() or 1), cast=int)
+
+# Archivos cifrados por bloques (fuera de MEDIA_ROOT para que nunca se sirvan directamente)
+VAULT_FILE_STORE_ROOT = config('VAULT_FILE_STORE_ROOT', default=str(BASE_DIR / 'vault_files'))
+VAULT_FILE_CHUNK_SIZE = config('VAULT_FILE_CHUNK_SIZE', default=64 * 1024, cast=int)
+VAULT_FILE_MAX_SIZE = config('VAULT_FILE_MAX_SIZE', default=100 * 1024 * 1024, cast=int)  # 100 MB
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -0,0 +1,13 @@
+"""
+Configuración de pytest para los benchmarks de la capa de cifrado.
+
+Los benchmarks no usan la base de datos: basta con cargar la configuración de
+Django (DJANGO_SETTINGS_MODULE, por defecto la del proyecto).
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'secure_project.settings')
+django.setup()
@@ -0,0 +1,145 @@
+"""
+Benchmarks de la capa de cifrado con pytest-benchmark.
+
+Mismos casos que core.benchmarks.bench_suite, parametrizados por tamaño de
+payload y número de entradas por operación:
+
+    pytest tests/test_crypto_bench.py --benchmark-autosave
+    pytest tests/test_crypto_bench.py --benchmark-compare --benchmark-compare-fail=mean:20%
+
+Los casos dominados por el KDF (modo doble 1.0 y verify_password) se miden con
+pocas rondas.
+"""
+
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from core.benchmarks import _sample_entry
+from core.crypto import (
+    ALGORITHM_GCM, VaultEntry, generate_vault_key, get_crypto, item_associated_data
+)
+from core.models import MasterPasswordHash
+
+PAYLOAD_SIZES = (1024, 64 * 1024)
+ITEM_COUNTS = (1, 10, 100)
+KDF_ROUNDS = 3
+PASSWORD = 'benchmark-master-password'
+
+
+@pytest.fixture(scope='module')
+def crypto():
+    return get_crypto()
+
+
+@pytest.fixture(scope='module')
+def vault_key():
+    return generate_vault_key()
+
+
+@pytest.fixture(scope='module')
+def aad():
+    return item_associated_data('00000000-0000-0000-0000-000000000000', 'login')
+
+
+@pytest.fixture(params=PAYLOAD_SIZES, ids=lambda size: f'{size}B')
+def payload_size(request):
+    return request.param
+
+
+def _modes(vault_key, aad):
+    """Modos de cifrado: (kwargs de encrypt, con KDF por entrada)."""
+    return {
+        'single': ({}, False),
+        'double-1.0': ({'user_password': PASSWORD}, True),
+        'double-2.0': ({'vault_key': vault_key}, False),
+        'gcm': ({'vault_key': vault_key, 'algorithm': ALGORITHM_GCM, 'associated_data': aad}, False),
+    }
+
+
+def _run(benchmark, func, slow: bool):
+    if slow:
+        return benchmark.pedantic(func, rounds=KDF_ROUNDS, iterations=1, warmup_rounds=1)
+    return benchmark(func)
+
+
+@pytest.mark.parametrize('mode', ['single', 'double-1.0', 'double-2.0', 'gcm'])
+def test_encrypt(benchmark, crypto, vault_key, aad, payload_size, mode):
+    kwargs, slow = _modes(vault_key, aad)[mode]
+    payload = os.urandom(payload_size)
+    benchmark.extra_info['payload_size'] = payload_size
+
+    blob = _run(benchmark, lambda: crypto.encrypt(payload, **kwargs), slow)
+
+    decrypt_kwargs = {k: v for k, v in kwargs.items() if k != 'algorithm'}
+    assert crypto.decrypt_bytes(blob, **decrypt_kwargs) == payload
+
+
+@pytest.mark.parametrize('mode', ['single', 'double-1.0', 'double-2.0', 'gcm'])
+def test_decrypt(benchmark, crypto, vault_key, aad, payload_size, mode):
+    kwargs, slow = _modes(vault_key, aad)[mode]
+    payload = os.urandom(payload_size)
+    blob = crypto.encrypt(payload, **kwargs)
+    decrypt_kwargs = {k: v for k, v in kwargs.items() if k != 'algorithm'}
+    benchmark.extra_info['payload_size'] = payload_size
+
+    assert _run(benchmark, lambda: crypto.decrypt_bytes(blob, **decrypt_kwargs), slow) == payload
+
+
+def test_encrypt_json(benchmark, crypto, vault_key, aad, payload_size):
+    entry = _sample_entry(payload_size)
+    benchmark.extra_info['payload_size'] = payload_size
+
+    blob = benchmark(lambda: crypto.encrypt_json(
+        entry, vault_key=vault_key, algorithm=ALGORITHM_GCM, associated_data=aad
+    ))
+
+    assert crypto.decrypt_json(blob, vault_key=vault_key, associated_data=aad) == entry
+
+
+def test_decrypt_json(benchmark, crypto, vault_key, aad, payload_size):
+    entry = _sample_entry(payload_size)
+    blob = crypto.encrypt_json(entry, vault_key=vault_key, algorithm=ALGORITHM_GCM,
+                               associated_data=aad)
+    benchmark.extra_info['payload_size'] = payload_size
+
+    assert benchmark(lambda: crypto.decrypt_json(
+        blob, vault_key=vault_key, associated_data=aad
+    )) == entry
+
+
+@pytest.mark.parametrize('items', ITEM_COUNTS)
+def test_entry_create(benchmark, crypto, vault_key, aad, payload_size, items):
+    vault = VaultEntry(crypto, vault_key=vault_key)
+    entries = [_sample_entry(payload_size) for _ in range(items)]
+    benchmark.extra_info.update({'payload_size': payload_size, 'items': items})
+
+    encrypted = benchmark(lambda: [vault.create_entry(PASSWORD, e, aad) for e in entries])
+
+    assert len(encrypted) == items
+
+
+@pytest.mark.parametrize('items', ITEM_COUNTS)
+def test_entry_update(benchmark, crypto, vault_key, aad, payload_size, items):
+    vault = VaultEntry(crypto, vault_key=vault_key)
+    encrypted = [vault.create_entry(PASSWORD, _sample_entry(payload_size), aad)
+                 for _ in range(items)]
+    benchmark.extra_info.update({'payload_size': payload_size, 'items': items})
+
+    updated = benchmark(lambda: [
+        vault.update_entry(e, PASSWORD, {'data': {'username': 'otro'}}, aad) for e in encrypted
+    ])
+
+    assert len(updated) == items
+
+
+def test_verify_password(benchmark):
+    master_hash = MasterPasswordHash(user=get_user_model()(email='benchmark@localhost'))
+    master_hash.set_password(PASSWORD)
+    benchmark.extra_info['kdf'] = master_hash.kdf_algorithm
+
+    assert benchmark.pedantic(
+        master_hash.verify_password, args=(PASSWORD,), rounds=KDF_ROUNDS, iterations=1,
+        warmup_rounds=1
+    )